@@ -31,10 +31,13 @@ class MainWindow(QtWidgets.QMainWindow):
     self.setWindowTitle(WINDOW_TITLE)
 
     config = ConfigWidget()
+    dump = DumpWidget(config)
+    fast_pak = FastPakWidget(config)
+    dump.indexChanged.connect(fast_pak.setAssetIndex)
     self.tabs = [
       ("Config", config),
-      ("Dump From Game", DumpWidget(config)),
-      ("Fast Package Blender", FastPakWidget(config)),
+      ("Dump From Game", dump),
+      ("Fast Package Blender", fast_pak),
     ]
 
     if False:
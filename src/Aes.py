@@ -0,0 +1,120 @@
+""" AES-256 ECB as used by Unreal pak files
+
+pycryptodome is used when it is installed, otherwise a table driven pure Python
+implementation takes over. The fallback is correct but far slower, so paks with
+large encrypted indexes should be read with pycryptodome present.
+"""
+import struct
+
+try:
+  from Crypto.Cipher import AES as _NativeAES
+except ImportError:
+  _NativeAES = None
+
+BLOCK_SIZE = 16
+
+def parseKey(aes:str) -> bytes:
+  """ '0x' prefixed hex as entered in the config """
+  key = bytes.fromhex(aes[2:] if aes[0:2].lower() == "0x" else aes)
+  if len(key) != 32:
+    raise ValueError("AES key must be 32 bytes (64 hex digits)")
+  return key
+
+# ----- Pure Python Fallback -----
+def _xtime(value:int) -> int:
+  value <<= 1
+  return (value ^ 0x11B) if value & 0x100 else value
+
+def _mul(a:int, b:int) -> int:
+  result = 0
+  while b:
+    if b & 1: result ^= a
+    a, b = _xtime(a), b >> 1
+  return result
+
+def _buildTables():
+  sbox, inv_sbox = [0]*256, [0]*256
+  p = q = 1
+  while True:
+    p = _mul(p, 3)
+    q = _mul(q, 0xF6) # inverse of 3
+    x = q ^ ((q << 1 | q >> 7) & 0xFF) ^ ((q << 2 | q >> 6) & 0xFF) ^ ((q << 3 | q >> 5) & 0xFF) ^ ((q << 4 | q >> 4) & 0xFF)
+    sbox[p] = x ^ 0x63
+    if p == 1: break
+  sbox[0] = 0x63
+  for idx, value in enumerate(sbox):
+    inv_sbox[value] = idx
+
+  te, td = [[0]*256 for _ in range(4)], [[0]*256 for _ in range(4)]
+  for idx in range(256):
+    s, i = sbox[idx], inv_sbox[idx]
+    enc = (_mul(s,2) << 24) | (s << 16) | (s << 8) | _mul(s,3)
+    dec = (_mul(i,14) << 24) | (_mul(i,9) << 16) | (_mul(i,13) << 8) | _mul(i,11)
+    for rot in range(4):
+      te[rot][idx] = ((enc >> (8*rot)) | (enc << (32 - 8*rot))) & 0xFFFFFFFF
+      td[rot][idx] = ((dec >> (8*rot)) | (dec << (32 - 8*rot))) & 0xFFFFFFFF
+  return sbox, inv_sbox, te, td
+
+SBOX, INV_SBOX, TE, TD = _buildTables()
+ROUNDS = 14
+
+def _subWord(word:int) -> int:
+  return (SBOX[word >> 24] << 24) | (SBOX[(word >> 16) & 255] << 16) | (SBOX[(word >> 8) & 255] << 8) | SBOX[word & 255]
+
+def _expandKey(key:bytes):
+  words = list(struct.unpack(">8I", key))
+  rcon = 1
+  for idx in range(8, 4 * (ROUNDS + 1)):
+    temp = words[idx - 1]
+    if idx % 8 == 0:
+      temp = _subWord(((temp << 8) | (temp >> 24)) & 0xFFFFFFFF) ^ (rcon << 24)
+      rcon = _xtime(rcon)
+    elif idx % 8 == 4:
+      temp = _subWord(temp)
+    words.append(words[idx - 8] ^ temp)
+
+  # equivalent inverse cipher: reversed rounds with InvMixColumns applied to the inner ones
+  dec_words = []
+  for rnd in range(ROUNDS, -1, -1):
+    for word in words[4*rnd:4*rnd+4]:
+      if 0 < rnd < ROUNDS:
+        word = TD[0][SBOX[word >> 24]] ^ TD[1][SBOX[(word >> 16) & 255]] ^ TD[2][SBOX[(word >> 8) & 255]] ^ TD[3][SBOX[word & 255]]
+      dec_words.append(word)
+  return words, dec_words
+
+def _cryptBlocks(data:bytes, keys, tables, final_box, order) -> bytes:
+  t0, t1, t2, t3 = tables
+  a, b, c = order
+  out = bytearray(len(data))
+  for pos in range(0, len(data), BLOCK_SIZE):
+    s = [w ^ k for w, k in zip(struct.unpack_from(">4I", data, pos), keys[0:4])]
+    for rnd in range(1, ROUNDS):
+      rk = keys[4*rnd:4*rnd+4]
+      s = [
+        t0[s[col] >> 24] ^ t1[(s[(col + a) % 4] >> 16) & 255] ^ t2[(s[(col + b) % 4] >> 8) & 255] ^ t3[s[(col + c) % 4] & 255] ^ rk[col]
+        for col in range(4)
+      ]
+    rk = keys[4*ROUNDS:4*ROUNDS+4]
+    struct.pack_into(">4I", out, pos, *[
+      ((final_box[s[col] >> 24] << 24) | (final_box[(s[(col + a) % 4] >> 16) & 255] << 16) |
+       (final_box[(s[(col + b) % 4] >> 8) & 255] << 8) | final_box[s[(col + c) % 4] & 255]) ^ rk[col]
+      for col in range(4)
+    ])
+  return bytes(out)
+
+# ----- Public Interface -----
+def decryptECB(key:bytes, data:bytes) -> bytes:
+  if len(data) % BLOCK_SIZE != 0:
+    raise ValueError("AES data must be a multiple of the block size")
+  if _NativeAES is not None:
+    return _NativeAES.new(key, _NativeAES.MODE_ECB).decrypt(data)
+  _, dec_words = _expandKey(key)
+  return _cryptBlocks(data, dec_words, TD, INV_SBOX, (3, 2, 1))
+
+def encryptECB(key:bytes, data:bytes) -> bytes:
+  if len(data) % BLOCK_SIZE != 0:
+    raise ValueError("AES data must be a multiple of the block size")
+  if _NativeAES is not None:
+    return _NativeAES.new(key, _NativeAES.MODE_ECB).encrypt(data)
+  enc_words, _ = _expandKey(key)
+  return _cryptBlocks(data, enc_words, TE, SBOX, (1, 2, 3))
@@ -0,0 +1,104 @@
+from pathlib import Path
+from typing import Optional, List, Any, Iterator, Tuple
+from contextlib import contextmanager
+import sqlite3, hashlib, json, zlib, logging, threading, time
+
+logger = logging.getLogger(__name__)
+
+LISTING_MAX_AGE_DAYS = 30
+LISTING_MAX_MB = 256
+
+def pakFingerprint(pak_dir:Path, aes:str) -> str:
+  """ Changes whenever the game patches, mods change or the key changes """
+  digest = hashlib.sha1(hashlib.sha256(aes.encode()).digest())
+  for pak in sorted(pak_dir.rglob("*.pak")):
+    stat = pak.stat()
+    digest.update(f"{pak.relative_to(pak_dir).as_posix()}:{stat.st_size}:{stat.st_mtime_ns}\n".encode())
+  return digest.hexdigest()
+
+@contextmanager
+def connectDatabase(path:Path) -> Iterator[sqlite3.Connection]:
+  db = sqlite3.connect(path.as_posix(), timeout=30)
+  try:
+    with db:
+      yield db
+  finally:
+    db.close()
+
+class ListingCache:
+  """ Parsed umodel listings persisted in sqlite, keyed by the pak fingerprint so other pak sets' rows just miss
+
+  Working dirs or game installs sharing the file keep each other's rows, which are only
+  pruned once unused for LISTING_MAX_AGE_DAYS or, least recently used first, past LISTING_MAX_MB.
+  """
+  def __init__(self, path:Path, fingerprint:str):
+    self.path, self.fingerprint = path, fingerprint
+    with self.connect() as db:
+      # the old table dropped every other fingerprint's rows, its rows carry no use time
+      db.execute("DROP TABLE IF EXISTS listings")
+      db.execute(
+        "CREATE TABLE IF NOT EXISTS package_listings (fingerprint TEXT, query TEXT, used REAL, data BLOB, PRIMARY KEY (fingerprint, query))"
+      )
+      pruned = self.prune(db)
+    if pruned > 0:
+      logger.info(f"Pruned {pruned} unused listings from {path}")
+
+  def connect(self):
+    return connectDatabase(self.path)
+
+  def prune(self, db:sqlite3.Connection) -> int:
+    pruned = db.execute("DELETE FROM package_listings WHERE used < ?", (time.time() - LISTING_MAX_AGE_DAYS * 86400,)).rowcount
+    budget = LISTING_MAX_MB * 1024 * 1024
+    if (db.execute("SELECT sum(length(data)) FROM package_listings").fetchone()[0] or 0) <= budget:
+      return pruned
+    rows = db.execute("SELECT fingerprint, query, length(data) FROM package_listings ORDER BY used DESC").fetchall()
+    for fingerprint, query, size in rows:
+      budget -= size
+      if budget < 0:
+        db.execute("DELETE FROM package_listings WHERE fingerprint = ? AND query = ?", (fingerprint, query))
+        pruned += 1
+    return pruned
+
+  def get(self, query:str) -> Optional[List[Any]]:
+    with self.connect() as db:
+      row = db.execute("SELECT data FROM package_listings WHERE fingerprint = ? AND query = ?", (self.fingerprint, query)).fetchone()
+      if row is not None:
+        db.execute("UPDATE package_listings SET used = ? WHERE fingerprint = ? AND query = ?", (time.time(), self.fingerprint, query))
+    if row is None:
+      return None
+    return json.loads(zlib.decompress(row[0]))
+
+  def put(self, query:str, records:List[Any]):
+    data = zlib.compress(json.dumps(records, separators=(',',':')).encode())
+    with self.connect() as db:
+      db.execute("INSERT OR REPLACE INTO package_listings VALUES (?, ?, ?, ?)", (self.fingerprint, query, time.time(), data))
+
+class AssetInfoCache:
+  """ Material slot names and outline slot types per game asset, valid while the asset's pak data is unchanged """
+  hits = 0
+  misses = 0
+  stats_lock = threading.Lock()
+
+  def __init__(self, path:Path):
+    self.path = path
+    with connectDatabase(path) as db:
+      db.execute("CREATE TABLE IF NOT EXISTS asset_info (asset TEXT PRIMARY KEY, fingerprint TEXT, data TEXT)")
+
+  def get(self, asset:str, fingerprint:str) -> Optional[Tuple[List[str], List[int]]]:
+    with connectDatabase(self.path) as db:
+      row = db.execute("SELECT data FROM asset_info WHERE asset = ? AND fingerprint = ?", (asset, fingerprint)).fetchone()
+    with AssetInfoCache.stats_lock:
+      if row is None:
+        AssetInfoCache.misses += 1
+      else:
+        AssetInfoCache.hits += 1
+      logger.info(f"Asset info cache {'miss' if row is None else 'hit'} for {asset}, {AssetInfoCache.hits} hits / {AssetInfoCache.misses} misses this session")
+    if row is None:
+      return None
+    data = json.loads(row[0])
+    return data["slots"], data["types"]
+
+  def put(self, asset:str, fingerprint:str, slot_names:List[str], slot_types:List[int]):
+    data = json.dumps({ "slots": slot_names, "types": slot_types })
+    with connectDatabase(self.path) as db:
+      db.execute("INSERT OR REPLACE INTO asset_info VALUES (?, ?, ?)", (asset, fingerprint, data))
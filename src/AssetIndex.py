@@ -0,0 +1,103 @@
+""" In memory index of everything a scan learned about the game files """
+from typing import Optional, List, Dict, Set, Tuple, Iterable
+import bisect, threading
+
+from . import Constants
+from .AssetListing import AssetListing
+
+UASSET_SFX = ".uasset"
+CONTENT_ROOT = "/RED/Content/"
+
+def pathParts(path:str) -> Tuple[Optional[str], Optional[str]]:
+  """ (character, costume) of a /RED/Content/Chara/<char>/<costume>/... path """
+  if not path.startswith(Constants.PAK_TOP):
+    return None, None
+  parts = path.split("/")
+  return parts[4], (parts[5] if len(parts) > 6 else None)
+
+def assetName(path:str) -> str:
+  """ The Target Asset form of a path, e.g. Chara/RAM/Costume01/Mesh/ram_body """
+  if path.startswith(CONTENT_ROOT): path = path[len(CONTENT_ROOT):]
+  if path.endswith(UASSET_SFX): path = path[:-len(UASSET_SFX)]
+  return path
+
+class AssetIndex:
+  """ Sorted paths for prefix search plus inverted indexes by export type, character and costume
+
+  Paths may come from the pak indexes alone (no types known) or from umodel listings.
+  References are only known for assets that have been exported at least once.
+  """
+  def __init__(self):
+    self.paths:List[str] = []
+    self.known:Set[str] = set()
+    self.by_type:Dict[str, Set[str]] = {}
+    self.by_char:Dict[str, Set[str]] = {}
+    self.by_costume:Dict[str, Set[str]] = {}
+    self.references:Dict[str, List[Tuple[str,str]]] = {}
+    self.lock = threading.Lock()
+
+  def __len__(self) -> int:
+    return len(self.paths)
+
+  # ----- Building -----
+  def addPaths(self, paths:Iterable[str]):
+    with self.lock:
+      fresh = [path for path in paths if path not in self.known]
+      if len(fresh) == 0: return
+      self.known.update(fresh)
+      # one sort beats thousands of insorts for whole game listings
+      self.paths = sorted(self.paths + fresh)
+      for path in fresh:
+        char, costume = pathParts(path)
+        if char is not None: self.by_char.setdefault(char, set()).add(path)
+        if costume is not None: self.by_costume.setdefault(costume, set()).add(path)
+
+  def addListing(self, listing:AssetListing):
+    self.addPaths(listing.paths)
+    with self.lock:
+      for asset_file in listing:
+        for type_name in asset_file.types():
+          self.by_type.setdefault(type_name, set()).add(asset_file.path)
+
+  def addReferences(self, path:str, references:List[Tuple[str,str]]):
+    """ (type, name) of every object umodel exported alongside path """
+    with self.lock:
+      self.references[path] = references
+
+  # ----- Queries -----
+  def withPrefix(self, prefix:str) -> List[str]:
+    with self.lock:
+      start = bisect.bisect_left(self.paths, prefix)
+      end = bisect.bisect_left(self.paths, prefix + "\uffff", start)
+      return self.paths[start:end]
+
+  def query(self, prefix:Optional[str]=None, type_name:Optional[str]=None, char:Optional[str]=None, costume:Optional[str]=None) -> List[str]:
+    """ Paths matching every given filter, e.g. query(Constants.PAK_TOP + "RAM/", "SkeletalMesh") """
+    with self.lock:
+      found:Optional[Set[str]] = None
+      for key, table in ((type_name, self.by_type), (char, self.by_char), (costume, self.by_costume)):
+        if key is None: continue
+        matches = table.get(key, set())
+        found = set(matches) if found is None else found & matches
+    if prefix is not None:
+      in_prefix = self.withPrefix(prefix)
+      return in_prefix if found is None else [path for path in in_prefix if path in found]
+    if found is None:
+      with self.lock:
+        return list(self.paths)
+    return sorted(found)
+
+  def referencedBy(self, path:str, type_name:Optional[str]=None) -> List[str]:
+    """ Names of objects exported with path, e.g. its textures, empty until it has been exported """
+    with self.lock:
+      references = self.references.get(path, [])
+    return [name for ref_type, name in references if type_name is None or ref_type == type_name]
+
+  def characters(self) -> List[str]:
+    with self.lock:
+      return sorted(self.by_char)
+
+  def assetNames(self) -> List[str]:
+    """ Every indexed uasset in Target Asset form, sorted case insensitively for completion """
+    with self.lock:
+      return sorted((assetName(path) for path in self.paths if path.endswith(UASSET_SFX)), key=str.lower)
@@ -0,0 +1,174 @@
+""" Columnar storage and a streaming parser for umodel -list output """
+from array import array
+from typing import Optional, List, Dict, Any, Iterable, Iterator
+import sys, threading
+
+LISTING_PREFIX = "/RED/"
+
+class TypeTable:
+  """ Export class names interned to small ids, each id is also a bit in the per file type masks """
+  def __init__(self):
+    self.ids:Dict[str,int] = {}
+    self.names:List[str] = []
+    self.lock = threading.Lock()
+
+  def intern(self, name:str) -> int:
+    type_id = self.ids.get(name)
+    if type_id is not None:
+      return type_id
+    with self.lock:
+      if name not in self.ids:
+        self.ids[name] = len(self.names)
+        self.names.append(sys.intern(name))
+      return self.ids[name]
+
+  def lookup(self, name:str) -> Optional[int]:
+    return self.ids.get(name)
+
+TYPES = TypeTable()
+
+class Asset:
+  """ One export row, only built on demand from the columns """
+  __slots__ = ("index", "offset", "size", "type", "name")
+  def __init__(self, index:int, offset:int, size:int, type:str, name:str):
+    self.index, self.offset, self.size, self.type, self.name = index, offset, size, type, name
+  def toRecord(self) -> List[Any]:
+    return [self.index, self.offset, self.size, self.type, self.name]
+
+class AssetFile:
+  """ A view onto one file of an AssetListing """
+  __slots__ = ("listing", "row")
+  def __init__(self, listing:'AssetListing', row:int):
+    self.listing, self.row = listing, row
+  @property
+  def path(self) -> str:
+    return self.listing.paths[self.row]
+  @property
+  def contents(self) -> List[Asset]:
+    return self.listing.exports(self.row)
+  def contains(self, desired_type:str) -> bool:
+    return self.listing.contains(self.row, desired_type)
+  def types(self) -> List[str]:
+    mask = self.listing.masks[self.row]
+    return [name for type_id, name in enumerate(TYPES.names[:mask.bit_length()]) if mask >> type_id & 1]
+  def toRecord(self) -> List[Any]:
+    return [self.path, [child.toRecord() for child in self.contents]]
+
+class AssetListing:
+  """ Every file and export of a listing held column wise
+
+  Exports of file n occupy rows starts[n] up to starts[n+1] (or the end) of the
+  export columns. masks[n] has bit t set when file n has an export of type id t.
+  """
+  __slots__ = ("paths", "starts", "masks", "indices", "offsets", "sizes", "types", "names")
+  def __init__(self):
+    self.paths:List[str] = []
+    self.starts = array('q')
+    self.masks:List[int] = []
+    self.indices = array('q')
+    self.offsets = array('q')
+    self.sizes = array('q')
+    self.types = array('L')
+    self.names:List[str] = []
+
+  def __len__(self) -> int:
+    return len(self.paths)
+
+  def __iter__(self) -> Iterator[AssetFile]:
+    return (AssetFile(self, row) for row in range(len(self.paths)))
+
+  def addFile(self, path:str):
+    self.paths.append(path)
+    self.starts.append(len(self.names))
+    self.masks.append(0)
+
+  def addExport(self, index:int, offset:int, size:int, type_name:str, name:str):
+    type_id = TYPES.ids.get(type_name)
+    if type_id is None:
+      type_id = TYPES.intern(type_name)
+    self.indices.append(index)
+    self.offsets.append(offset)
+    self.sizes.append(size)
+    self.types.append(type_id)
+    self.names.append(sys.intern(name))
+    self.masks[-1] |= 1 << type_id
+
+  def exportRange(self, row:int) -> range:
+    end = self.starts[row + 1] if row + 1 < len(self.starts) else len(self.names)
+    return range(self.starts[row], end)
+
+  def exports(self, row:int) -> List[Asset]:
+    return [
+      Asset(self.indices[idx], self.offsets[idx], self.sizes[idx], TYPES.names[self.types[idx]], self.names[idx])
+      for idx in self.exportRange(row)
+    ]
+
+  def contains(self, row:int, desired_type:str) -> bool:
+    type_id = TYPES.lookup(desired_type)
+    return type_id is not None and bool(self.masks[row] >> type_id & 1)
+
+  def withType(self, desired_type:str) -> List[str]:
+    """ Paths of every file holding at least one export of desired_type """
+    type_id = TYPES.lookup(desired_type)
+    if type_id is None:
+      return []
+    bit = 1 << type_id
+    return [path for path, mask in zip(self.paths, self.masks) if mask & bit]
+
+  # ----- Cache Records -----
+  def toRecords(self) -> List[Any]:
+    return [asset_file.toRecord() for asset_file in self]
+
+  @staticmethod
+  def fromRecords(records:List[Any]) -> 'AssetListing':
+    listing = AssetListing()
+    for path, children in records:
+      listing.addFile(path)
+      for index, offset, size, type_name, name in children:
+        listing.addExport(index, offset, size, type_name, name)
+    return listing
+
+class ListingParser:
+  """ Push parser for umodel -list output, fed one line at a time as the process writes it
+
+  A block starting with a /RED/ path opens a file, its export rows follow as
+  'index offset size type name' with hex offset and size, a blank line closes it.
+  Other blocks (the umodel banner, summaries) are skipped.
+  """
+  def __init__(self, prefix:str=LISTING_PREFIX):
+    self.prefix = prefix
+    self.listing = AssetListing()
+    self.in_file = False
+    self.block_start = True
+    self.malformed = 0
+
+  def feed(self, line:str):
+    if not line or line.isspace():
+      self.in_file, self.block_start = False, True
+      return
+    if self.block_start:
+      self.block_start = False
+      if line.startswith(self.prefix):
+        self.listing.addFile(line.rstrip())
+        self.in_file = True
+      return
+    if not self.in_file:
+      return
+    parts = line.split()
+    if len(parts) < 5:
+      self.malformed += 1
+      return
+    try:
+      self.listing.addExport(int(parts[0]), int(parts[1],16), int(parts[2],16), parts[3], parts[4])
+    except ValueError:
+      self.malformed += 1
+
+  def result(self) -> AssetListing:
+    return self.listing
+
+def parseListing(lines:Iterable[str]) -> AssetListing:
+  """ Parses any iterable of lines, e.g. a generator over a saved listing """
+  parser = ListingParser()
+  for line in lines:
+    parser.feed(line)
+  return parser.result()
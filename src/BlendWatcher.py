@@ -0,0 +1,102 @@
+""" Notices saves of watched .blend files, for rebuilding a mod whenever its projects change """
+from PySide6 import QtCore
+from pathlib import Path
+from typing import List, Dict, Optional, Tuple
+import logging
+
+logger = logging.getLogger(__name__)
+
+# a save is a burst of writes and renames, this long without another marks it done
+DEBOUNCE_MS = 1500
+# change notifications get lost (network drives, the watch dropped on rename), polling backs them up
+POLL_MS = 2000
+
+FileStamp = Optional[Tuple[int, int]]
+
+def fileStamp(path:Path) -> FileStamp:
+  try:
+    stat = path.stat()
+  except OSError:
+    return None
+  return (stat.st_mtime_ns, stat.st_size)
+
+class BlendWatcher(QtCore.QObject):
+  """ Emits saved once the watched files settle after changing
+
+  Blender saves to a temporary file and renames it over the project, which drops
+  a filesystem watch, so paths are added back whenever they reappear.
+  """
+  saved = QtCore.Signal()
+
+  def __init__(self, parent:Optional[QtCore.QObject]=None):
+    super().__init__(parent)
+    self.paths:List[Path] = []
+    # stamps as of the last build, and as of the last change seen while settling
+    self.stamps:Dict[Path, FileStamp] = {}
+    self.pending:Dict[Path, FileStamp] = {}
+    self.watcher = QtCore.QFileSystemWatcher(self)
+    self.watcher.fileChanged.connect(self.onChange)
+    self.debounce = QtCore.QTimer(self)
+    self.debounce.setSingleShot(True)
+    self.debounce.setInterval(DEBOUNCE_MS)
+    self.debounce.timeout.connect(self.settle)
+    self.poll = QtCore.QTimer(self)
+    self.poll.setInterval(POLL_MS)
+    self.poll.timeout.connect(self.checkStamps)
+
+  def watch(self, paths:List[Path]):
+    self.stop()
+    self.paths = list(paths)
+    self.stamps = { path: fileStamp(path) for path in self.paths }
+    self.rewatch()
+    self.poll.start()
+
+  def stop(self):
+    self.poll.stop()
+    self.debounce.stop()
+    if len(self.watcher.files()) > 0:
+      self.watcher.removePaths(self.watcher.files())
+    self.paths = []
+    self.stamps = {}
+    self.pending = {}
+
+  def watching(self) -> bool:
+    return len(self.paths) > 0
+
+  def rewatch(self):
+    watched = set(self.watcher.files())
+    for path in self.paths:
+      if path.as_posix() not in watched and path.exists():
+        if not self.watcher.addPath(path.as_posix()):
+          logger.info(f"Can't watch {path}, relying on polling")
+
+  def currentStamps(self) -> Dict[Path, FileStamp]:
+    return { path: fileStamp(path) for path in self.paths }
+
+  def startSettling(self):
+    self.pending = self.currentStamps()
+    self.debounce.start()
+
+  @QtCore.Slot()
+  def onChange(self, _path:str):
+    self.startSettling()
+
+  @QtCore.Slot()
+  def checkStamps(self):
+    self.rewatch()
+    if not self.debounce.isActive() and self.currentStamps() != self.stamps:
+      self.startSettling()
+
+  @QtCore.Slot()
+  def settle(self):
+    self.rewatch()
+    current = self.currentStamps()
+    # still being written, or mid save with the project missing until the rename lands
+    if current != self.pending or any(stamp is None for stamp in current.values()):
+      self.startSettling()
+      return
+    if current == self.stamps:
+      return
+    self.stamps = current
+    logger.info(f"Watched projects saved: {', '.join(path.name for path in self.paths)}")
+    self.saved.emit()
@@ -0,0 +1,91 @@
+""" Fast Package stage outputs stored by a hash of everything that went into them """
+from pathlib import Path
+from typing import Optional, List, Dict, Any
+import json, hashlib, os, shutil, tempfile, threading, logging
+
+logger = logging.getLogger(__name__)
+
+META_FILE = "meta.json"
+DEFAULT_BUILD_CACHE_MB = 4096
+
+def toolStamp(path:Path) -> str:
+  """ Stands in for a tool's version, any reinstall or update changes it """
+  stat = path.stat()
+  return f"{path.as_posix()}:{stat.st_size}:{stat.st_mtime_ns}"
+
+def stageKey(*parts:Any) -> str:
+  return hashlib.sha256(json.dumps(parts, default=str).encode()).hexdigest()
+
+class BuildEntry:
+  def __init__(self, path:Path, meta:Dict[str, Any]):
+    self.path, self.meta = path, meta
+
+  def restore(self, name:str, dest:Path):
+    """ Copies a stored output out, the cache's copy must never be moved or edited """
+    dest.parent.mkdir(parents=True, exist_ok=True)
+    shutil.copyfile(self.path.joinpath(name), dest)
+
+class BuildCache:
+  """ One directory per (stage, key) holding the stage's output files and a meta.json
+
+  The mtime of meta.json is the entry's last use. Past max_bytes the least recently
+  used entries are evicted.
+  """
+  def __init__(self, root:Path, max_bytes:int):
+    self.root, self.max_bytes = root, max_bytes
+    self.lock = threading.Lock()
+
+  def get(self, stage:str, key:str) -> Optional[BuildEntry]:
+    entry_dir = self.root.joinpath(stage, key)
+    meta_path = entry_dir.joinpath(META_FILE)
+    try:
+      with open(meta_path) as handle:
+        meta = json.load(handle)
+      if not all(entry_dir.joinpath(name).is_file() for name in meta["files"]):
+        raise ValueError("missing outputs")
+    except (OSError, ValueError, KeyError):
+      logger.info(f"Build cache miss for {stage} {key[:12]}")
+      return None
+    os.utime(meta_path)
+    logger.info(f"Build cache hit for {stage} {key[:12]}")
+    return BuildEntry(entry_dir, meta["meta"])
+
+  def put(self, stage:str, key:str, files:Dict[str, Path], meta:Optional[Dict[str, Any]]=None):
+    """ Stores copies of files under their (relative path) names, built aside and renamed in so readers never see half an entry """
+    stage_dir = self.root.joinpath(stage)
+    stage_dir.mkdir(parents=True, exist_ok=True)
+    temp = Path(tempfile.mkdtemp(prefix=".new_", dir=stage_dir))
+    try:
+      for name, src in files.items():
+        temp.joinpath(name).parent.mkdir(parents=True, exist_ok=True)
+        shutil.copyfile(src, temp.joinpath(name))
+      with open(temp.joinpath(META_FILE), 'w') as handle:
+        json.dump({ "files": list(files), "meta": meta or {} }, handle)
+      entry_dir = stage_dir.joinpath(key)
+      with self.lock:
+        if entry_dir.exists(): shutil.rmtree(entry_dir)
+        os.replace(temp, entry_dir)
+    except OSError as error:
+      logger.error(f"Failed to store {stage} output in the build cache: {error}")
+      shutil.rmtree(temp, ignore_errors=True)
+      return
+    self.evict()
+
+  def entries(self) -> List[Path]:
+    return [entry for entry in self.root.glob("*/*") if entry.is_dir() and not entry.name.startswith(".")]
+
+  def evict(self):
+    with self.lock:
+      sized = []
+      for entry in self.entries():
+        try:
+          last_used = entry.joinpath(META_FILE).stat().st_mtime
+        except OSError:
+          last_used = 0
+        sized.append((last_used, sum(file.stat().st_size for file in entry.rglob("*") if file.is_file()), entry))
+      total = sum(size for _, size, _ in sized)
+      for _, size, entry in sorted(sized, key=lambda item: item[0]):
+        if total <= self.max_bytes: break
+        shutil.rmtree(entry, ignore_errors=True)
+        total -= size
+        logger.info(f"Build cache evicted {entry.parent.name} {entry.name[:12]}, {size} bytes")
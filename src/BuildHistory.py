@@ -0,0 +1,148 @@
+""" Every Fast Package build with its stage timings and inputs, for spotting builds that got slower """
+from pathlib import Path
+from typing import List, Dict, Any
+import json, time, sys, logging
+
+from .AssetCache import connectDatabase
+
+logger = logging.getLogger(__name__)
+
+# recent builds a report covers, and earlier runs of a stage its latest run is compared to
+REPORT_BUILDS = 100
+BASELINE_RUNS = 10
+# slower than the baseline median by this factor and this many seconds counts as a regression
+REGRESSION_RATIO = 1.5
+REGRESSION_MIN_SECONDS = 2.0
+
+def stageKind(stage:str) -> str:
+  """ Per target stages like info:<asset> are compared across targets """
+  return stage.split(":")[0]
+
+def percentile(values:List[float], pct:float) -> float:
+  """ Linear interpolation between the closest ranks """
+  ordered = sorted(values)
+  pos = (len(ordered) - 1) * pct / 100
+  low = int(pos)
+  high = min(low + 1, len(ordered) - 1)
+  return ordered[low] + (ordered[high] - ordered[low]) * (pos - low)
+
+class StageRecord:
+  def __init__(self, stage:str, seconds:float, state:str, cached:bool):
+    self.stage, self.seconds, self.state, self.cached = stage, seconds, state, cached
+
+class Regression:
+  def __init__(self, stage:str, seconds:float, baseline:float, runs:int):
+    self.stage, self.seconds, self.baseline, self.runs = stage, seconds, baseline, runs
+
+  def __str__(self):
+    return f"{self.seconds:.1f}s, usually {self.baseline:.1f}s (median of the last {self.runs} runs)"
+
+class BuildHistory:
+  """ builds holds one row per build with its inputs and tool stamps as json, stages one row per stage run """
+  def __init__(self, path:Path):
+    self.path = path
+    with connectDatabase(path) as db:
+      db.execute("CREATE TABLE IF NOT EXISTS builds (id INTEGER PRIMARY KEY, started REAL, mod TEXT, status TEXT, seconds REAL, data TEXT)")
+      db.execute("CREATE TABLE IF NOT EXISTS stages (build INTEGER, stage TEXT, kind TEXT, seconds REAL, state TEXT, cached INTEGER)")
+      db.execute("CREATE INDEX IF NOT EXISTS stages_kind ON stages (kind, build)")
+
+  def record(self, started:float, mod:str, status:str, seconds:float, stages:List[StageRecord], data:Dict[str, Any]) -> int:
+    with connectDatabase(self.path) as db:
+      build_id = db.execute(
+        "INSERT INTO builds (started, mod, status, seconds, data) VALUES (?, ?, ?, ?, ?)",
+        (started, mod, status, seconds, json.dumps(data))
+      ).lastrowid
+      db.executemany(
+        "INSERT INTO stages VALUES (?, ?, ?, ?, ?, ?)",
+        [(build_id, record.stage, stageKind(record.stage), record.seconds, record.state, int(record.cached)) for record in stages]
+      )
+    return build_id
+
+  def baseline(self, db, kind:str, before:int) -> List[float]:
+    """ The kind's latest uncached, successful runs before a build, a cache hit says nothing about speed """
+    rows = db.execute(
+      "SELECT seconds FROM stages WHERE kind = ? AND build < ? AND state = 'done' AND cached = 0 ORDER BY build DESC LIMIT ?",
+      (kind, before, BASELINE_RUNS)
+    ).fetchall()
+    return [row[0] for row in rows]
+
+  def findRegressions(self, db, build_id:int) -> List[Regression]:
+    """ Stages of a build that ran well past their baseline, needs a full baseline to judge """
+    found:List[Regression] = []
+    rows = db.execute("SELECT stage, kind, seconds FROM stages WHERE build = ? AND state = 'done' AND cached = 0", (build_id,)).fetchall()
+    for stage, kind, seconds in rows:
+      runs = self.baseline(db, kind, build_id)
+      if len(runs) < BASELINE_RUNS: continue
+      median = percentile(runs, 50)
+      if seconds > median * REGRESSION_RATIO and seconds - median > REGRESSION_MIN_SECONDS:
+        found.append(Regression(stage, seconds, median, len(runs)))
+    return found
+
+  def regressions(self, build_id:int) -> List[Regression]:
+    with connectDatabase(self.path) as db:
+      return self.findRegressions(db, build_id)
+
+  def report(self, builds:int=REPORT_BUILDS) -> str:
+    with connectDatabase(self.path) as db:
+      recent = db.execute("SELECT id, started, mod, status, seconds, data FROM builds ORDER BY id DESC LIMIT ?", (builds,)).fetchall()
+      if len(recent) == 0:
+        return "No builds recorded yet."
+      first_id = recent[-1][0]
+      stage_rows = db.execute(
+        "SELECT kind, seconds FROM stages WHERE build >= ? AND state = 'done' AND cached = 0 ORDER BY build",
+        (first_id,)
+      ).fetchall()
+      cache_rows = db.execute("SELECT kind, SUM(cached), COUNT(*) FROM stages WHERE build >= ? AND state = 'done' GROUP BY kind", (first_id,)).fetchall()
+      latest_regressions = self.findRegressions(db, recent[0][0])
+
+    lines = [f"Last {len(recent)} builds, {sum(1 for row in recent if row[3] == 'done')} succeeded", ""]
+
+    # ----- Stage Percentiles -----
+    by_kind:Dict[str, List[float]] = {}
+    for kind, seconds in stage_rows:
+      by_kind.setdefault(kind, []).append(seconds)
+    cached = { kind: (hits, total) for kind, hits, total in cache_rows }
+    lines.append(f"{'stage':<16}{'runs':>6}{'p50':>9}{'p90':>9}{'p95':>9}{'max':>9}{'trend':>9}{'cached':>9}")
+    for kind, times in sorted(by_kind.items()):
+      # median of the newest runs against the ones before them
+      trend = ""
+      if len(times) >= 2 * BASELINE_RUNS:
+        older, newer = percentile(times[-2*BASELINE_RUNS:-BASELINE_RUNS], 50), percentile(times[-BASELINE_RUNS:], 50)
+        trend = f"{(newer - older) / older:+.0%}" if older > 0 else ""
+      hits, total = cached.get(kind, (0, 0))
+      lines.append(
+        f"{kind:<16}{len(times):>6}{percentile(times, 50):>8.1f}s{percentile(times, 90):>8.1f}s{percentile(times, 95):>8.1f}s"
+        f"{max(times):>8.1f}s{trend:>9}{f'{hits}/{total}':>9}"
+      )
+
+    # ----- Latest Build -----
+    build_id, started, mod, status, seconds, raw_data = recent[0]
+    data = json.loads(raw_data)
+    lines += ["", f"Latest: #{build_id} {mod} {status} in {seconds:.1f}s at {time.strftime('%Y-%m-%d %H:%M', time.localtime(started))}"]
+    for target in data.get("targets", []):
+      lines.append(
+        f"  {target['asset']}: {target.get('fbx_bytes', 0) / (1024*1024):.1f} MB FBX, "
+        f"{target.get('vertices', '?')} vertices, {target.get('bones', '?')} bones, {target.get('chunks', '?')} chunks"
+      )
+    if len(latest_regressions) == 0:
+      lines.append("  No stage slower than its baseline")
+    for regression in latest_regressions:
+      lines.append(f"  SLOWER {regression.stage}: {regression}")
+    if len(latest_regressions) > 0 and (changed := self.toolChanges(recent)):
+      lines.append(f"  Changed since the build before: {', '.join(changed)}")
+    return "\n".join(lines)
+
+  @staticmethod
+  def toolChanges(recent:List[tuple]) -> List[str]:
+    """ Tools and hooks whose stamp differs between the latest build and the one before it """
+    if len(recent) < 2: return []
+    latest, previous = json.loads(recent[0][5]).get("tools", {}), json.loads(recent[1][5]).get("tools", {})
+    return sorted(name for name in latest if latest[name] != previous.get(name))
+
+if __name__ == "__main__":
+  # python -m src.BuildHistory <working dir>
+  from .Constants import BUILD_HISTORY
+  if len(sys.argv) != 2:
+    print("usage: python -m src.BuildHistory <working dir>")
+    sys.exit(1)
+  print(BuildHistory(Path(sys.argv[1]).joinpath(BUILD_HISTORY)).report())
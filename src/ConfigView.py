@@ -3,7 +3,10 @@ from pathlib import Path
 from typing import List, Union
 
 from .Widgets import PathWidget, TextWidget, showWarning
-from .Process import runProcess, ReturnCode
+from .Process import runProcess, ReturnCode, setMetricsFile
+from .Scheduler import getScheduler, DEFAULT_MIN_FREE_MB
+from .BuildCache import DEFAULT_BUILD_CACHE_MB
+from .DerivedData import DEFAULT_DDC_MB
 from . import Constants
 
 GGST_EXE="GGST.exe"
@@ -51,6 +54,15 @@ def validateUnreal(value:Path) -> ReturnCode[str]:
 def validateAES(value:str) -> ReturnCode[str]:
   return ReturnCode(value[0:2] == "0x", "AES must start with '0x'")
 
+def validateRAM(value:str) -> ReturnCode[str]:
+  return ReturnCode(value.isdigit(), "Free RAM threshold must be a whole number of MB")
+
+def validateCacheSize(value:str) -> ReturnCode[str]:
+  return ReturnCode(value.isdigit(), "Build cache size must be a whole number of MB")
+
+def validateDDCSize(value:str) -> ReturnCode[str]:
+  return ReturnCode(value.isdigit(), "Derived data cache size must be a whole number of MB")
+
 field_list = List[Union[PathWidget,TextWidget]]
 
 class ConfigWidget(QtWidgets.QWidget):
@@ -67,11 +79,14 @@ class ConfigWidget(QtWidgets.QWidget):
     self.work_field = PathWidget("Working_Dir", is_dir=True)
 
     self.aes_field = TextWidget("AES_Key", validator=validateAES)
+    self.ram_field = TextWidget("Min_Free_RAM_MB", str(DEFAULT_MIN_FREE_MB), validateRAM)
+    self.cache_field = TextWidget("Build_Cache_MB", str(DEFAULT_BUILD_CACHE_MB), validateCacheSize)
+    self.ddc_field = TextWidget("DDC_MB", str(DEFAULT_DDC_MB), validateDDCSize)
 
     self.all_fields:field_list = [
       self.ggst_field, self.umodel_field, self.noesis_field, self.ue4exp_field, 
       self.blender_field, self.unreal_field, self.packer_field, self.unverum_field,
-      self.work_field, self.aes_field
+      self.work_field, self.aes_field, self.ram_field, self.cache_field, self.ddc_field
     ]
 
     layout = QtWidgets.QVBoxLayout(self)
@@ -85,6 +100,9 @@ class ConfigWidget(QtWidgets.QWidget):
     safe = True
     for field in self.all_fields:
       safe = field.updateValue().success and safe
+    if safe:
+      getScheduler().setMinFreeMemory(self.minFreeRam())
+      setMetricsFile(self.work().joinpath(Constants.METRICS_LOG))
     return safe
 
   # Direct accesors
@@ -108,20 +126,16 @@ class ConfigWidget(QtWidgets.QWidget):
     return self.work_field.value
   def aes(self) -> str:
     return self.aes_field.value
+  def minFreeRam(self) -> int:
+    return int(self.ram_field.value)
+  def buildCacheMB(self) -> int:
+    return int(self.cache_field.value)
+  def ddcMB(self) -> int:
+    return int(self.ddc_field.value)
 
   # Faked accessors, these are derived from Constants or multiple fields
   def pak(self) -> Path:
     return self.ggst().parent.joinpath(Constants.PAK_LOC)
-  def fastBlenderRoot(self) -> Path:
-    return self.work().joinpath(Constants.FAST_BLENDER_OUT)
-  def fastUnrealRoot(self) -> Path:
-    return self.work().joinpath(Constants.FAST_UE_OUT)
-  def fastUnrealUproj(self) -> Path:
-    return self.work().joinpath(Constants.FAST_UE_OUT, f"{Constants.FAST_UE_OUT}.uproject")
-  def fastUnrealContent(self) -> Path:
-    return self.work().joinpath(Constants.FAST_UE_OUT, "Content")
-  def fastUnrealCooked(self) -> Path:
-    return self.work().joinpath(Constants.FAST_UE_OUT, "Saved/Cooked/WindowsNoEditor/Unreal_Fast_Build/Content")
   
   def stashMods(self):
     game_mods = self.pak().joinpath("~mods")
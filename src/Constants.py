@@ -11,6 +11,15 @@ DUMP_SUBDIR = "dump/"
 INFO_SFX="_details.txt"
 
 MOD_STASH="moved_mods"
+METRICS_LOG="process_metrics.jsonl"
+LISTING_CACHE="asset_cache.sqlite"
+EXPORT_MANIFEST="export_manifest.jsonl"
+EXPORT_STAGING="export_staging"
+CONTENT_STORE="cas"
+BUILD_CACHE="build_cache"
+WORKSPACES="workspaces"
+DDC="ddc"
+BUILD_HISTORY="build_history.sqlite"
 
 FAST_BLENDER_OUT="Blender_Fast_Build"
 FAST_UE_OUT="Unreal_Fast_Build"
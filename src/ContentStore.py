@@ -0,0 +1,106 @@
+""" Content addressed file store, identical exports share one copy through hardlinks """
+from pathlib import Path
+from typing import Tuple
+import os, errno, threading, logging
+
+from .ExportManifest import hashFile
+
+logger = logging.getLogger(__name__)
+
+# os.link errors meaning the working dir's filesystem has no hardlinks at all
+LINK_UNSUPPORTED = { errno.EPERM, errno.EXDEV, errno.EOPNOTSUPP, errno.ENOTSUP, errno.EINVAL }
+
+class StoreReport:
+  def __init__(self, objects:int=0, stored_bytes:int=0, linked_bytes:int=0):
+    self.objects, self.stored_bytes, self.linked_bytes = objects, stored_bytes, linked_bytes
+
+  @property
+  def saved_bytes(self) -> int:
+    return self.linked_bytes - self.stored_bytes
+
+  def __str__(self) -> str:
+    mb = 1024 * 1024
+    return f"{self.objects} shared files, {self.linked_bytes/mb:.1f} MB in dump stored as {self.stored_bytes/mb:.1f} MB, {self.saved_bytes/mb:.1f} MB saved"
+
+class ContentStore:
+  """ Objects live under root by sha1, every user of one is a hardlink to it
+
+  Files are only ever swapped into place with os.replace, never written through a
+  link, so a later export can't change an object other paths still point at. An
+  object whose only remaining link is the store's own is garbage.
+  """
+  def __init__(self, root:Path):
+    self.root = root
+    self.lock = threading.Lock()
+    self.linkable = True
+
+  def objectPath(self, digest:str) -> Path:
+    return self.root.joinpath(digest[:2], digest[2:])
+
+  def link(self, src:Path, link:Path) -> bool:
+    """ Hardlinks src to link, False if this one link failed and the file should be moved instead """
+    try:
+      os.link(src, link)
+      return True
+    except OSError as error:
+      # only a filesystem that can't link at all turns the store off, e.g. too many links to one object doesn't
+      if error.errno in LINK_UNSUPPORTED:
+        logger.error(f"Content store disabled, hardlinking failed: {error}")
+        self.linkable = False
+      else:
+        logger.warning(f"Hardlinking {link.name} failed, it is stored unshared: {error}")
+      return False
+
+  def place(self, src:Path, dest:Path):
+    """ Moves src to dest, sharing storage with any identical file placed before """
+    dest.parent.mkdir(parents=True, exist_ok=True)
+    if not self.linkable:
+      os.replace(src, dest)
+      return
+
+    obj = self.objectPath(hashFile(src))
+    with self.lock:
+      if not obj.exists():
+        obj.parent.mkdir(parents=True, exist_ok=True)
+        self.link(src, obj)
+        os.replace(src, dest)
+        return
+
+      # renaming over a link to the same file is a no-op that would leave temp behind
+      if dest.exists() and os.path.samefile(obj, dest):
+        src.unlink()
+        return
+      temp = dest.with_name(dest.name + ".link")
+      temp.unlink(missing_ok=True)
+      if not self.link(obj, temp):
+        os.replace(src, dest)
+        return
+      try:
+        os.replace(temp, dest)
+      finally:
+        temp.unlink(missing_ok=True)
+      src.unlink()
+
+  def collect(self) -> Tuple[int,int]:
+    """ Removes objects nothing links to anymore, returning (objects, bytes) freed """
+    freed, freed_bytes = 0, 0
+    with self.lock:
+      for obj in self.root.glob("*/*"):
+        stat = obj.stat()
+        if stat.st_nlink <= 1:
+          obj.unlink()
+          freed += 1
+          freed_bytes += stat.st_size
+    if freed > 0:
+      logger.info(f"Content store freed {freed} unreferenced objects, {freed_bytes} bytes")
+    return freed, freed_bytes
+
+  def report(self) -> StoreReport:
+    report = StoreReport()
+    with self.lock:
+      for obj in self.root.glob("*/*"):
+        stat = obj.stat()
+        report.objects += 1
+        report.stored_bytes += stat.st_size
+        report.linked_bytes += stat.st_size * max(0, stat.st_nlink - 1)
+    return report
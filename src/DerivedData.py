@@ -0,0 +1,94 @@
+""" One derived data cache shared by every Fast Build Unreal project, so mesh builds survive between builds and workspaces """
+from pathlib import Path
+from typing import Dict
+import os, logging
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_DDC_MB = 8192
+# Unreal removes files it has not touched in this many days on its own, trimDDC handles the size
+DDC_UNUSED_DAYS = 30
+
+# the launcher editor reads the Installed graph, a source build the plain one. Neither gets the
+# user's or the environment's DDC path overrides, every build must land in the shared folder
+DDC_GRAPH = """Root=(Type=KeyLength, Length=120, Inner=AsyncPut)
+AsyncPut=(Type=AsyncPut, Inner=Hierarchy)
+Hierarchy=(Type=Hierarchical, Inner=Boot, Inner=Local)
+Boot=(Type=Boot, Filename="%GAMEDIR%DerivedDataCache/Boot.ddc", MaxCacheSize=512)
+Local=(Type=FileSystem, ReadOnly=false, Clean=false, Flush=false, Touch=true, PurgeTransient=true, DeleteUnused=true, UnusedFileAge={days}, FoldersToClean=-1, Path="{path}")
+"""
+
+def ddcConfig(ddc_root:Path) -> str:
+  graph = DDC_GRAPH.format(days=DDC_UNUSED_DAYS, path=ddc_root.as_posix())
+  return f"[DerivedDataBackendGraph]\n{graph}\n[InstalledDerivedDataBackendGraph]\n{graph}"
+
+def writeDDCConfig(project_root:Path, ddc_root:Path):
+  """ Points the project at ddc_root, leaving the file alone when it already does so running editors don't see a change """
+  ini_path = project_root.joinpath("Config", "DefaultEngine.ini")
+  config = ddcConfig(ddc_root)
+  try:
+    with open(ini_path) as ini_file:
+      if ini_file.read() == config: return
+  except OSError:
+    pass
+  ini_path.parent.mkdir(parents=True, exist_ok=True)
+  with open(ini_path, 'w') as ini_file:
+    ini_file.write(config)
+
+def fileSnapshot(root:Path) -> Dict[str, int]:
+  """ Every file under root and its mtime, Unreal touches a cache file on each hit """
+  snapshot:Dict[str, int] = {}
+  pending = [root.as_posix()]
+  while pending:
+    try:
+      with os.scandir(pending.pop()) as scan:
+        for entry in scan:
+          if entry.is_dir(follow_symlinks=False):
+            pending.append(entry.path)
+          elif entry.is_file(follow_symlinks=False):
+            snapshot[entry.path] = entry.stat().st_mtime_ns
+    except OSError:
+      continue
+  return snapshot
+
+class DDCUsage:
+  """ Lookups between two snapshots, touched files were hits and new files misses
+
+  Only an estimate, builds cooking at the same time share the folder and lookups of
+  data that is never stored count as neither.
+  """
+  def __init__(self, before:Dict[str, int], after:Dict[str, int]):
+    self.hits = sum(1 for path, mtime in after.items() if path in before and before[path] != mtime)
+    self.misses = sum(1 for path in after if path not in before)
+
+  def lookups(self) -> int:
+    return self.hits + self.misses
+
+  def __str__(self):
+    if self.lookups() == 0:
+      return "no DDC lookups"
+    return f"DDC hit rate {self.hits / self.lookups():.0%} ({self.hits}/{self.lookups()})"
+
+def trimDDC(ddc_root:Path, max_bytes:int):
+  """ Removes the least recently used cache files until the folder fits in max_bytes """
+  sized = []
+  for path in fileSnapshot(ddc_root):
+    try:
+      stat = os.stat(path)
+    except OSError:
+      continue
+    sized.append((stat.st_mtime_ns, stat.st_size, path))
+  total = sum(size for _, size, _ in sized)
+  if total <= max_bytes: return
+
+  removed = 0
+  for _, size, path in sorted(sized):
+    if total <= max_bytes: break
+    try:
+      os.unlink(path)
+    except OSError:
+      # a cook elsewhere may have it open, it is just kept until the next trim
+      continue
+    total -= size
+    removed += 1
+  logger.info(f"Trimmed {removed} files from the derived data cache, {total} bytes left")
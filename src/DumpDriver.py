@@ -0,0 +1,225 @@
+from PySide6 import QtCore
+from concurrent.futures import ThreadPoolExecutor, as_completed, Future
+from typing import List, Dict, Optional
+from pathlib import Path
+import threading, logging, queue
+
+from . import Constants
+from .ConfigView import ConfigWidget
+from .UModelDriver import PackageManager, exportedMesh, EXPORT_OPTIONS
+from .ExportManifest import ExportManifest, settingsHash
+from .ContentStore import StoreReport
+from .AssetIndex import AssetIndex
+from .Scheduler import getScheduler, TOOL_UMODEL, TOOL_NOESIS
+
+logger = logging.getLogger(__name__)
+
+class ScanSignals(QtCore.QObject):
+  character = QtCore.Signal(object)
+  progress = QtCore.Signal(int, int)
+  error = QtCore.Signal(str)
+  finished = QtCore.Signal(bool)
+
+class ScanSession(QtCore.QRunnable):
+  """ Scans game files one character directory per umodel shard, reporting each shard as it lands """
+  def __init__(self, config:ConfigWidget):
+    super().__init__()
+    self.manager = PackageManager(config)
+    self.index = AssetIndex()
+    self.cancelled = threading.Event()
+    self.failed = 0
+    self.signals = ScanSignals()
+
+  def cancel(self):
+    self.cancelled.set()
+
+  def run(self):
+    try:
+      chars = self.manager.getCharacterNames(self.cancelled)
+    except Exception as error:
+      logger.error(f"Scan discovery failed: {error}")
+      if not self.cancelled.is_set():
+        self.signals.error.emit("An issue occured while scanning, check error.log for details.")
+      self.signals.finished.emit(self.cancelled.is_set())
+      return
+
+    # every character file, not just meshes, so the index can complete any target asset
+    entries = self.manager.getPackageEntries(f"{Constants.PAK_TOP}*")
+    if entries is not None:
+      self.index.addPaths(entries)
+
+    self.signals.progress.emit(0, len(chars))
+    workers = max(1, min(len(chars), getScheduler().slots[TOOL_UMODEL]))
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+      shards = { pool.submit(self.manager.getCharacterManifest, char, self.cancelled, self.index): char for char in chars }
+      for done, shard in enumerate(as_completed(shards)):
+        if self.cancelled.is_set():
+          for pending in shards: pending.cancel()
+          break
+        try:
+          self.signals.character.emit(shard.result())
+        except Exception as error:
+          logger.error(f"Scan of {shards[shard]} failed: {error}")
+          self.failed += 1
+        self.signals.progress.emit(done + 1, len(chars))
+
+    if self.failed > 0 and not self.cancelled.is_set():
+      self.signals.error.emit(f"{self.failed} character(s) failed to scan, check error.log for details.")
+    self.signals.finished.emit(self.cancelled.is_set())
+
+# ----- Export Pipeline -----
+NOESIS_OPTIONS = ["?cmode", "{psk}", "{fbx}", "-fbxnewexport", "-rotate 90 0 0"]
+EXPORT_QUEUE_DEPTH = 64
+QUEUE_POLL = 0.25
+SUMMARY_LINES = 20
+
+class ExportSummary:
+  def __init__(self, total:int):
+    self.total = total
+    self.converted:List[str] = []
+    self.skipped:List[str] = []
+    self.failed:Dict[str,str] = {}
+    self.cancelled = False
+    self.store:Optional[StoreReport] = None
+    self.lock = threading.Lock()
+
+  def done(self) -> int:
+    with self.lock:
+      return len(self.converted) + len(self.skipped) + len(self.failed)
+
+  def skip(self, target:str):
+    with self.lock:
+      self.skipped.append(target)
+
+  def succeed(self, target:str):
+    with self.lock:
+      self.converted.append(target)
+
+  def fail(self, target:str, reason:str):
+    with self.lock:
+      self.failed[target] = reason
+
+  def __str__(self) -> str:
+    lines = [f"Converted {len(self.converted)} of {self.total} meshes."]
+    if len(self.skipped) > 0:
+      lines.append(f"{len(self.skipped)} were already up to date and skipped.")
+    if self.cancelled:
+      lines.append("The export was cancelled.")
+    if len(self.failed) > 0:
+      lines.append(f"{len(self.failed)} failed, check error.log for details:")
+      lines += [f"{target.split('/')[-1]}: {reason}" for target, reason in sorted(self.failed.items())[:SUMMARY_LINES]]
+      if len(self.failed) > SUMMARY_LINES:
+        lines.append(f"... and {len(self.failed) - SUMMARY_LINES} more")
+    if self.store is not None and self.store.objects > 0:
+      lines.append(f"Texture store: {self.store}")
+    return "\n".join(lines)
+
+class ExportSignals(QtCore.QObject):
+  progress = QtCore.Signal(int, int, str)
+  finished = QtCore.Signal(object)
+
+class DumpExportSession(QtCore.QRunnable):
+  """ umodel exports on a producer thread while a pool of Noesis workers converts each psk as it lands
+
+  The hand off queue is bounded and so is the work in flight, when Noesis falls
+  behind umodel blocks on its output until a worker frees up.
+  """
+  def __init__(self, config:ConfigWidget, targets:List[str], index:Optional[AssetIndex]=None):
+    super().__init__()
+    self.manager = PackageManager(config)
+    self.noesis = config.noesis()
+    self.dump_dir = config.work().joinpath("dump")
+    self.targets, self.index = targets, index
+    self.manifest = ExportManifest(config.work().joinpath(Constants.EXPORT_MANIFEST))
+    self.settings = settingsHash(config.umodel(), EXPORT_OPTIONS, self.noesis, NOESIS_OPTIONS)
+    self.sources:Dict[str,str] = {}
+    self.summary = ExportSummary(len(targets))
+    self.landed:'queue.Queue[Optional[str]]' = queue.Queue(EXPORT_QUEUE_DEPTH)
+    self.exported = 0
+    self.cancelled = threading.Event()
+    self.signals = ExportSignals()
+
+  def cancel(self):
+    self.cancelled.set()
+
+  def reportProgress(self):
+    done = self.summary.done()
+    self.signals.progress.emit(done, self.summary.total, f"Exported {self.exported}, converted {done} of {self.summary.total}")
+
+  def onExported(self, target:str):
+    self.exported += 1
+    while not self.cancelled.is_set():
+      try:
+        self.landed.put(target, timeout=QUEUE_POLL)
+        break
+      except queue.Full:
+        continue
+    self.reportProgress()
+
+  def outputs(self, target:str) -> List[Path]:
+    psk_path = exportedMesh(self.dump_dir, target)
+    return [psk_path, psk_path.with_suffix(".fbx")]
+
+  def produce(self):
+    pending:List[str] = []
+    status:Dict[str,bool] = {}
+    try:
+      # targets finished by an earlier run, from the same pak data and settings, are left alone
+      self.sources = self.manager.sourceFingerprints(self.targets)
+      for target in self.targets:
+        if self.manifest.isValid(target, self.sources[target], self.settings):
+          self.summary.skip(target)
+        else:
+          pending.append(target)
+      self.reportProgress()
+
+      status = self.manager.exportTargets(self.dump_dir, pending, self.index, self.cancelled, self.onExported)
+    except Exception as error:
+      logger.error(f"umodel export failed: {error}")
+    finally:
+      if not self.cancelled.is_set():
+        for target in pending:
+          if not status.get(target, False):
+            self.summary.fail(target, "umodel export failed")
+      self.landed.put(None)
+
+  def convert(self, target:str) -> bool:
+    psk_path, fbx_path = self.outputs(target)
+    options = [f'"{self.noesis.as_posix()}"'] + [option.format(psk=f'"{psk_path.as_posix()}"', fbx=f'"{fbx_path.as_posix()}"') for option in NOESIS_OPTIONS]
+    return bool(getScheduler().run(TOOL_NOESIS, " ".join(options), False, cancel=self.cancelled))
+
+  def converted(self, target:str, future:'Future[bool]', in_flight:threading.Semaphore):
+    in_flight.release()
+    try:
+      if future.result():
+        self.manifest.record(target, self.sources[target], self.settings, self.outputs(target))
+        self.summary.succeed(target)
+      elif not self.cancelled.is_set():
+        self.summary.fail(target, "Noesis conversion failed")
+    except Exception as error:
+      logger.error(f"Noesis conversion of {target} failed: {error}")
+      self.summary.fail(target, "Noesis conversion failed")
+    self.reportProgress()
+
+  def run(self):
+    producer = threading.Thread(target=self.produce, daemon=True)
+    producer.start()
+
+    workers = max(1, getScheduler().slots[TOOL_NOESIS])
+    in_flight = threading.Semaphore(2 * workers)
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+      # drained to the end even when cancelled so the producer never blocks on a full queue
+      while (target := self.landed.get()) is not None:
+        if self.cancelled.is_set(): continue
+        in_flight.acquire()
+        future = pool.submit(self.convert, target)
+        future.add_done_callback(lambda future, target=target: self.converted(target, future, in_flight))
+    producer.join()
+
+    self.summary.cancelled = self.cancelled.is_set()
+    try:
+      self.manager.store.collect()
+      self.summary.store = self.manager.store.report()
+    except OSError as error:
+      logger.error(f"Content store cleanup failed: {error}")
+    self.signals.finished.emit(self.summary)
@@ -1,48 +1,138 @@
 from PySide6 import QtCore, QtWidgets
-from typing import List, Dict
+from typing import List, Dict, Optional, Iterable
 from pathlib import Path
 
 from . import Constants
 from .Widgets import showWarning, CheckBox
 from .ConfigView import ConfigWidget
-from .UModelDriver import PackageManager, CharManifest
-from .Process import runProcess
+from .UModelDriver import CharManifest, MESH_KINDS, MESH_BODY, MESH_HIGH, MESH_LOW, MESH_WEAPON, MESH_OTHER
+from .DumpDriver import ScanSession, DumpExportSession, ExportSummary
+from .AssetIndex import AssetIndex
 
 CheckState = QtCore.Qt.CheckState
 ItemFlag = QtCore.Qt.ItemFlag
-
-EXPORT_MSG = "Failed to export with Noesis"
-
-def invertCheckState(old: CheckState) -> CheckState:
-  assert old != CheckState.PartiallyChecked
-  return CheckState.Unchecked if old == CheckState.Checked else CheckState.Checked
-
-def makeTableItem(label:str, checkable:bool=False) -> QtWidgets.QTableWidgetItem:
-  item = QtWidgets.QTableWidgetItem(label)
-  if checkable:
-    item.setFlags(item.flags() | ItemFlag.ItemIsUserCheckable | ItemFlag.ItemIsEnabled)
-    item.setCheckState(QtCore.Qt.CheckState.Unchecked)
-  else:
-    item.setFlags(item.flags() ^ ItemFlag.ItemIsUserCheckable)
-  item.setFlags(item.flags() ^ ItemFlag.ItemIsEditable)
-  return item
+ItemRole = QtCore.Qt.ItemDataRole
+SORT_ROLE = ItemRole.UserRole
 
 class ExportTarget:
   def __init__(self, name:str, file:str):
     self.name, self.file = name, file
 
-class CharList(QtWidgets.QTableWidget):
+class CharModel(QtCore.QAbstractTableModel):
+  """ Scanned characters and their check state, with per mesh kind totals over the checked rows
+
+  Totals move by each row's own counts as it is (un)checked, so export counts never
+  need a pass over the table.
+  """
+  countsChanged = QtCore.Signal()
+  HEADERS = ["Character", "Weapon Meshes", "Misc Meshes"]
+
   def __init__(self):
     super().__init__()
-    self.itemPressed.connect(self.handleSelect)
+    self.chars:List[CharManifest] = []
+    self.checked:List[bool] = []
+    self.totals = { kind: 0 for kind in MESH_KINDS }
+
+  def rowCount(self, parent=QtCore.QModelIndex()) -> int:
+    return 0 if parent.isValid() else len(self.chars)
+
+  def columnCount(self, parent=QtCore.QModelIndex()) -> int:
+    return 0 if parent.isValid() else len(self.HEADERS)
+
+  def headerData(self, section:int, orientation:QtCore.Qt.Orientation, role:int=ItemRole.DisplayRole):
+    if role == ItemRole.DisplayRole and orientation == QtCore.Qt.Orientation.Horizontal:
+      return self.HEADERS[section]
+    return None
+
+  def flags(self, index:QtCore.QModelIndex):
+    # toggled by the view on press, not through the check indicator
+    return ItemFlag.ItemIsEnabled | ItemFlag.ItemIsSelectable
+
+  def data(self, index:QtCore.QModelIndex, role:int=ItemRole.DisplayRole):
+    if not index.isValid(): return None
+    char, column = self.chars[index.row()], index.column()
+    if role == ItemRole.CheckStateRole and column == 0:
+      return CheckState.Checked if self.checked[index.row()] else CheckState.Unchecked
+    if role in (ItemRole.DisplayRole, SORT_ROLE):
+      if column == 0: return char.name
+      value = len(char.weapon_meshes) if column == 1 else len(char.other_meshes)
+      return value if role == SORT_ROLE else str(value)
+    return None
+
+  def clear(self):
+    self.beginResetModel()
+    self.chars, self.checked = [], []
+    self.totals = { kind: 0 for kind in MESH_KINDS }
+    self.endResetModel()
+    self.countsChanged.emit()
+
+  def addCharacter(self, char:CharManifest):
+    row = len(self.chars)
+    self.beginInsertRows(QtCore.QModelIndex(), row, row)
+    self.chars.append(char)
+    self.checked.append(False)
+    self.endInsertRows()
+
+  def setChecked(self, rows:Iterable[int], state:bool):
+    changed = [row for row in rows if self.checked[row] != state]
+    if len(changed) == 0: return
+    sign = 1 if state else -1
+    for row in changed:
+      self.checked[row] = state
+      for kind in MESH_KINDS:
+        self.totals[kind] += sign * len(self.chars[row].meshes(kind))
+    self.dataChanged.emit(self.index(min(changed), 0), self.index(max(changed), 0), [ItemRole.CheckStateRole])
+    self.countsChanged.emit()
+
+  def toggle(self, row:int):
+    self.setChecked([row], not self.checked[row])
+
+  def checkedCount(self, kinds:List[str]) -> int:
+    return sum(self.totals[kind] for kind in kinds)
+
+  def targets(self, kinds:List[str]) -> List[ExportTarget]:
+    return [
+      ExportTarget(char.name, mesh)
+      for char, checked in zip(self.chars, self.checked) if checked
+      for kind in kinds for mesh in char.meshes(kind)
+    ]
+
+class CharList(QtWidgets.QTableView):
+  def __init__(self, model:CharModel):
+    super().__init__()
+    self.char_model = model
+    self.proxy = QtCore.QSortFilterProxyModel(self)
+    self.proxy.setSourceModel(model)
+    self.proxy.setSortRole(SORT_ROLE)
+    self.proxy.setFilterKeyColumn(0)
+    self.proxy.setFilterCaseSensitivity(QtCore.Qt.CaseSensitivity.CaseInsensitive)
+    # re-sorting on every check change costs a pass over all rows, sorts happen on demand instead
+    self.proxy.setDynamicSortFilter(False)
+    self.setModel(self.proxy)
+    self.setSortingEnabled(True)
+    self.sortByColumn(0, QtCore.Qt.SortOrder.AscendingOrder)
+    self.verticalHeader().hide()
+    self.verticalHeader().setSectionResizeMode(QtWidgets.QHeaderView.ResizeMode.Fixed)
+    self.pressed.connect(self.handleSelect)
 
   @QtCore.Slot()
-  def handleSelect(self, item:QtWidgets.QTableWidgetItem):
-    if bool(item.flags() & ItemFlag.ItemIsUserCheckable):
-      #this is a hell of a fucking line
-      item.setCheckState( invertCheckState(item.checkState()) )
+  def handleSelect(self, index:QtCore.QModelIndex):
+    if index.column() == 0:
+      self.char_model.toggle(self.proxy.mapToSource(index).row())
+
+  def resort(self):
+    header = self.horizontalHeader()
+    self.proxy.sort(header.sortIndicatorSection(), header.sortIndicatorOrder())
+
+  def visibleRows(self) -> List[int]:
+    """ Model rows that pass the current filter """
+    if len(self.proxy.filterRegularExpression().pattern()) == 0:
+      return list(range(self.char_model.rowCount()))
+    return [self.proxy.mapToSource(self.proxy.index(row, 0)).row() for row in range(self.proxy.rowCount())]
 
 class DumpWidget(QtWidgets.QWidget):
+  indexChanged = QtCore.Signal(object)
+
   def makeCheckBox(self, label:str, layout:QtWidgets.QVBoxLayout):
     widget = CheckBox(label)
     widget.toggled.connect(self.updateCounts)
@@ -54,20 +144,38 @@ class DumpWidget(QtWidgets.QWidget):
 
     self.config = config
     self.char_info: Dict[str, CharManifest] = {}
+    self.index = AssetIndex()
+    self.scan_session:Optional[ScanSession] = None
+    self.export_session:Optional[DumpExportSession] = None
 
     top_layout = QtWidgets.QVBoxLayout(self)
     
-    scan_game = QtWidgets.QPushButton("Scan Game Files")
-    scan_game.clicked.connect(self.scanChars)
-    top_layout.addWidget(scan_game)
+    self.scan_game = QtWidgets.QPushButton("Scan Game Files")
+    self.scan_game.clicked.connect(self.scanChars)
+    top_layout.addWidget(self.scan_game)
+
+    self.scan_state = QtWidgets.QLabel()
+    self.scan_state.setVisible(False)
+    top_layout.addWidget(self.scan_state)
 
     select_widget = QtWidgets.QWidget()
     select_layout = QtWidgets.QHBoxLayout(select_widget)
 
     # ---- Left Side, Character filtering table -----
-    self.character_list = CharList()
-    self.character_list.itemChanged.connect(self.updateCounts)
-    select_layout.addWidget(self.character_list)
+    list_widget = QtWidgets.QWidget()
+    list_layout = QtWidgets.QVBoxLayout(list_widget)
+    list_layout.setContentsMargins(0, 0, 0, 0)
+
+    self.char_filter = QtWidgets.QLineEdit()
+    self.char_filter.setPlaceholderText("Filter characters")
+    list_layout.addWidget(self.char_filter)
+
+    self.char_model = CharModel()
+    self.char_model.countsChanged.connect(self.updateCounts)
+    self.character_list = CharList(self.char_model)
+    self.char_filter.textChanged.connect(self.character_list.proxy.setFilterFixedString)
+    list_layout.addWidget(self.character_list)
+    select_layout.addWidget(list_widget)
 
     # ---- Right Side, Mesh filtering options -----
     mesh_widget = QtWidgets.QWidget()
@@ -91,20 +199,31 @@ class DumpWidget(QtWidgets.QWidget):
     self.export.setEnabled(False)
     mesh_layout.addWidget(self.export)
 
+    self.export_progress = QtWidgets.QProgressBar()
+    self.export_progress.setVisible(False)
+    mesh_layout.addWidget(self.export_progress)
+    self.export_state = QtWidgets.QLabel()
+    self.export_state.setVisible(False)
+    mesh_layout.addWidget(self.export_state)
+
     # ----- Connect Up Layouts -----
     select_layout.addWidget(mesh_widget)
     top_layout.addWidget(select_widget)
 
   @QtCore.Slot()
   def selectAllChars(self):
-    for row in range(0,self.character_list.rowCount()):
-      button = self.character_list.item(row,0)
-      button.setCheckState(QtCore.Qt.CheckState.Checked)
-
+    self.char_model.setChecked(self.character_list.visibleRows(), True)
 
   @QtCore.Slot()
   def scanChars(self):
-    self.character_list.clear()
+    if self.scan_session is not None:
+      self.scan_session.cancel()
+      self.scan_game.setEnabled(False)
+      self.scan_state.setText("Cancelling scan...")
+      return
+
+    self.char_model.clear()
+    self.char_info = {}
     self.export.setEnabled(False)
     self.targets:List[ExportTarget] = []
     self.counts.setText("Exporting: 0")
@@ -114,104 +233,105 @@ class DumpWidget(QtWidgets.QWidget):
       return
 
     self.config.stashMods()
-    
-    manager = PackageManager(self.config)
-    try:
-      self.char_info = manager.getCharacterInfo()
-      self.config.restoreMods()
-    except:
-      showWarning("Scan Issue", "An issue occured while scanning, check error.log for details.", False)
-      self.config.restoreMods()
-      return
-    
-    self.character_list.setRowCount(len(self.char_info))
-    self.character_list.setColumnCount(3)
-    self.character_list.setHorizontalHeaderLabels(["Character", "Weapon Meshes", "Misc Meshes"])
-    self.character_list.verticalHeader().hide()
-    for row, char in enumerate(self.char_info.values()):
-      name = makeTableItem(char.name, True)
-      self.character_list.setItem(row, 0, name)
 
-      wep = makeTableItem( str(len(char.weapon_meshes)) )
-      self.character_list.setItem(row, 1, wep)
+    self.scan_session = ScanSession(self.config)
+    self.scan_session.signals.character.connect(self.handleScanCharacter)
+    self.scan_session.signals.progress.connect(self.handleScanProgress)
+    self.scan_session.signals.error.connect(self.handleScanError)
+    self.scan_session.signals.finished.connect(self.handleScanFinished)
+    self.scan_game.setText("Cancel Scan")
+    self.scan_state.setText("Discovering characters...")
+    self.scan_state.setVisible(True)
+    QtCore.QThreadPool.globalInstance().start(self.scan_session)
 
-      misc = makeTableItem( str(len(char.other_meshes)) )
-      self.character_list.setItem(row, 2, misc)
+  @QtCore.Slot()
+  def handleScanCharacter(self, char:CharManifest):
+    self.char_info[char.name] = char
+    self.char_model.addCharacter(char)
 
-    self.export.setEnabled(True)
+  @QtCore.Slot()
+  def handleScanProgress(self, done:int, total:int):
+    self.scan_state.setText(f"Scanning: {done}/{total} characters")
+
+  @QtCore.Slot()
+  def handleScanError(self, msg:str):
+    showWarning("Scan Issue", msg, False)
+
+  @QtCore.Slot()
+  def handleScanFinished(self, cancelled:bool):
+    self.index = self.scan_session.index
+    self.indexChanged.emit(self.index)
+    self.scan_session = None
+    self.config.restoreMods()
+    self.scan_game.setText("Scan Game Files")
+    self.scan_game.setEnabled(True)
+    self.scan_state.setVisible(False)
+
+    self.character_list.resort()
+    self.export.setEnabled(self.char_model.rowCount() > 0)
     self.updateCounts()
 
-  def calculateTargets(self):
-    self.targets:List[ExportTarget] = []
+  def selectedKinds(self) -> List[str]:
+    boxes = [(MESH_BODY, self.body_mesh), (MESH_HIGH, self.high_mesh), (MESH_LOW, self.lower_mesh), (MESH_WEAPON, self.weapon_mesh), (MESH_OTHER, self.other_mesh)]
+    return [kind for kind, box in boxes if box.isChecked()]
 
-    body = self.body_mesh.isChecked()
-    high = self.high_mesh.isChecked()
-    lower = self.lower_mesh.isChecked()
-    weps = self.weapon_mesh.isChecked()
-    other = self.other_mesh.isChecked()
-
-    for row in range(0,self.character_list.rowCount()):
-      button = self.character_list.item(row,0)
-      if button.checkState() != CheckState.Checked: continue
-
-      char_name = button.text()
-      info = self.char_info[char_name]
-      if body and info.body_mesh is not None: self.targets.append( ExportTarget(char_name, info.body_mesh) )
-      if high and info.high_mesh is not None: self.targets.append( ExportTarget(char_name, info.high_mesh) )
-      if lower and info.low_mesh is not None: self.targets.append( ExportTarget(char_name, info.low_mesh) )
-      if weps: 
-        self.targets += [ ExportTarget(char_name, file) for file in info.weapon_meshes ]
-      if other: 
-        self.targets += [ ExportTarget(char_name, file) for file in info.other_meshes ]
+  def calculateTargets(self):
+    self.targets:List[ExportTarget] = self.char_model.targets(self.selectedKinds())
 
   @QtCore.Slot()
   def updateCounts(self):
     if not self.export.isEnabled(): return
 
-    self.calculateTargets()
-    self.counts.setText(f"Exporting: {len(self.targets)}")
-
+    self.counts.setText(f"Exporting: {self.char_model.checkedCount(self.selectedKinds())}")
 
   @QtCore.Slot()
   def doExport(self):
+    if self.export_session is not None:
+      self.export_session.cancel()
+      self.export.setEnabled(False)
+      self.export_state.setText("Cancelling export...")
+      return
+
     if not self.config.validate():
       showWarning("Bad Config", "Please verify your paths and aes key first", False)
       return
 
+    self.calculateTargets()
     if len(self.targets) == 0:
       showWarning("Nothing to Export", "You haven't selected any meshes to export", False)
       return
 
-    noesis_path = self.config.noesis()
-    work_path = self.config.work()
-    
     self.config.stashMods()
 
-    dump_dir = work_path.joinpath("dump")
-
-    manager = PackageManager(self.config)
-
-    for target in self.targets:
-      success = manager.exportTarget(dump_dir, target.file)
-      if not success:
-        stop = showWarning("Export Issue", "An issue occured while exporting, check error.log for details.\nContinue Exporting?", True)
-        if not stop:
-          break
-        continue
+    self.export_session = DumpExportSession(self.config, [target.file for target in self.targets], self.index)
+    self.export_session.signals.progress.connect(self.handleExportProgress)
+    self.export_session.signals.finished.connect(self.handleExportFinished)
+    self.scan_game.setEnabled(False)
+    self.export.setText("Cancel Export")
+    self.export_progress.setMaximum(len(self.targets))
+    self.export_progress.setValue(0)
+    self.export_progress.setVisible(True)
+    self.export_state.setText("Starting umodel...")
+    self.export_state.setVisible(True)
+    QtCore.QThreadPool.globalInstance().start(self.export_session)
 
-      stub_name = dump_dir.joinpath("/".join(target.file.split("/")[3:])).as_posix()[:-7]
-      psk_path = stub_name + ".psk"
-      fbx_path = stub_name + ".fbx"
-
-      options = [f'"{noesis_path.as_posix()}"', "?cmode", f'"{psk_path}"', f'"{fbx_path}"', "-fbxnewexport", "-rotate 90 0 0"]
-      
-      success = runProcess(" ".join(options))
-      if not success:
-        stop = showWarning("Export Issue", "An issue occured while exporting, check error.log for details.\nContinue Exporting?", True)
-        if not stop:
-          break
+  @QtCore.Slot()
+  def handleExportProgress(self, done:int, total:int, msg:str):
+    self.export_progress.setValue(done)
+    self.export_state.setText(msg)
 
+  @QtCore.Slot()
+  def handleExportFinished(self, summary:ExportSummary):
+    self.export_session = None
     self.config.restoreMods()
+    self.export.setText("Export")
+    self.export.setEnabled(True)
+    self.scan_game.setEnabled(True)
+    self.export_progress.setVisible(False)
+    self.export_state.setVisible(False)
+
+    title = "Export Finished" if len(summary.failed) == 0 else "Export Issue"
+    showWarning(title, str(summary), False)
 
   def loadSettings(self, settings):
     self.body_mesh.loadSettings(settings)
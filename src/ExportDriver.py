@@ -2,15 +2,54 @@ from PySide6 import QtCore
 from pathlib import Path
 import shutil
 import json
-from typing import Tuple, List
+import os
+import tempfile
+import time
+import zlib
+import threading
+from functools import partial
+import logging
+from typing import Tuple, List, Optional, Set, Dict
+import sqlite3
 
 from .ConfigView import ConfigWidget
 from .Widgets import PathWidget, TextWidget
-from .Constants import UNREAL_HOOK, BLENDER_HOOK, UNREAL_TEMPLATE, INFO_SFX, DUMP_SUBDIR
-from .Process import runProcess
-
+from .Constants import UNREAL_HOOK, BLENDER_HOOK, UNREAL_TEMPLATE, INFO_SFX, DUMP_SUBDIR, LISTING_CACHE, BUILD_CACHE, DDC, BUILD_HISTORY
+from .UModelDriver import PackageManager
+from .AssetIndex import CONTENT_ROOT
+from .AssetCache import AssetInfoCache
+from .ExportManifest import hashFile
+from .BuildCache import BuildCache, stageKey, toolStamp
+from .Scheduler import getScheduler, TOOL_UE4EXP, TOOL_BLENDER, TOOL_UNREAL, TOOL_PAK
+from .Worker import getWorker, HookWorker, WorkerError
+from .StageGraph import StageGraph, STAGE_RUNNING, STAGE_DONE, STAGE_FAILED
+from .PakReader import PakFile, PakError
+from .PakWriter import writePak, checkPak, MOUNT_POINT, PAK_WRITER_VERSION
+from .Workspace import Workspace, getWorkspacePool
+from .DerivedData import writeDDCConfig, fileSnapshot, trimDDC, DDCUsage
+from .BuildHistory import BuildHistory, StageRecord
+from .JsonStream import extractPaths, WILDCARD
+
+logger = logging.getLogger(__name__)
 
 UASSET_SFX=".uasset"
+UEXP_SFX=".uexp"
+
+# only the targets are cooked, and only when changed since the workspace's last cook
+# the cook commandlet reads packages to cook from -map, which takes any package name, '+' separated.
+# -cooksinglepackage then drops the default maps, always cook packages and dependencies
+COOK_OPTIONS = ["-run=cook", "-nullrhi", "-unattended", "-nopause", "-silent", "-nosplash", "-targetplatform=WindowsNoEditor", "-iterate", "-cooksinglepackage"]
+PAK_OPTIONS = ["-compress"]
+
+JOBS_FILE="build_jobs.json"
+STAGE_CACHED="cached"
+BUILD_CANCELLED="cancelled"
+JOB_RESULT_TAG="JOB_RESULT:"
+
+# the parts of a Ue4Export mesh dump that material slots are read from
+MATERIAL_NAMES = ("Materials", WILDCARD, "ObjectName")
+OUTLINE_INDICES = ("Properties", "LODInfo", 0, "OutlineMaterialIndex")
+SECTION_MATERIALS = ("LODModels", 0, "Sections", WILDCARD, "MaterialIndex")
 
 def rm_tree(pth:Path):
   for child in pth.glob('*'):
@@ -20,10 +59,22 @@ def rm_tree(pth:Path):
       rm_tree(child)
   pth.rmdir()
 
-def moveReplace(src:Path,dest:Path):
+def copyReplace(src:Path,dest:Path):
+  """ Copies rather than moves, an iterative cook must find its earlier output where it left it """
   dest = dest.joinpath(src.name)
   dest.unlink(True)
-  src.rename(dest)
+  shutil.copyfile(src, dest)
+
+def publishFile(src:Path, dest:Path):
+  """ Copies src over dest with one rename, builds publishing the same file at once never leave it half written """
+  dest.parent.mkdir(parents=True, exist_ok=True)
+  handle, temp = tempfile.mkstemp(prefix=dest.name + ".", dir=dest.parent)
+  os.close(handle)
+  try:
+    shutil.copyfile(src, temp)
+    os.replace(temp, dest)
+  finally:
+    Path(temp).unlink(missing_ok=True)
 
 def breakAssetPath(src: str):
   delim_idx = src.rfind("/")
@@ -38,212 +89,614 @@ def cleanAsset(value:str):
     return None
   return value
 
+class BuildTarget:
+  """ One blender project and the game asset it replaces, filled in as the stages run """
+  def __init__(self, blend:Path, asset_path:str):
+    self.blend, self.asset_path = blend, asset_path
+    self.asset_stub, self.asset_name = breakAssetPath(asset_path)
+    self.info_path:Optional[Path] = None
+    self.fbx_src:Optional[Path] = None
+    self.chunks = ""
+    # vertex and bone counts from the Blender hook, for the build history
+    self.mesh_stats:Dict[str, int] = {}
+    self.uasset_src:Optional[Path] = None
+    self.uexp_src:Optional[Path] = None
+
+  def cookedName(self, suffix:str) -> str:
+    return f"{self.asset_stub}/{self.asset_name}{suffix}"
+
+def singleTarget(blender_target:PathWidget, asset_target:TextWidget) -> List[BuildTarget]:
+  if not (rcode := blender_target.updateValue()):
+    raise Exception(f"Bad Target. Please verify your target blender project:\n{rcode.value}")
+  if not (rcode := asset_target.updateValue()):
+    raise Exception(f"Bad Target. Please verify your target asset:\n{rcode.value}")
+  asset_path = cleanAsset(asset_target.value)
+  if asset_path is None:
+    raise Exception("Bad Target. Something is wrong with your target asset. How the hell did you get here!?")
+  return [BuildTarget(blender_target.value, asset_path)]
+
+def loadBatchSpec(spec_path:Path) -> List[BuildTarget]:
+  """ A json list of {"blend": ..., "asset": ...} pairs, blend paths may be relative to the spec """
+  try:
+    with open(spec_path) as spec_file:
+      pairs = json.load(spec_file)
+    raw_targets = [(spec_path.parent.joinpath(pair["blend"]), pair["asset"]) for pair in pairs]
+  except (OSError, ValueError, KeyError, TypeError) as error:
+    raise Exception(f"Bad Batch Spec. Failed to read {spec_path}:\n{error}")
+
+  targets:List[BuildTarget] = []
+  for blend, asset in raw_targets:
+    if blend.suffix != ".blend" or not blend.exists():
+      raise Exception(f"Bad Batch Spec. Blender project {blend} does not exist")
+    asset_path = cleanAsset(asset)
+    if asset_path is None:
+      raise Exception(f"Bad Batch Spec. Target asset {asset} must be relative to Pak Content e.g. Chara/RAM/Costume01/Mesh/ram_body")
+    # Blender exports every FBX to <asset name>.fbx, so names must differ as well as paths
+    target = BuildTarget(blend, asset_path)
+    if any(other.asset_name == target.asset_name for other in targets):
+      raise Exception(f"Bad Batch Spec. Target asset {target.asset_name} is listed more than once")
+    targets.append(target)
+
+  if len(targets) == 0:
+    raise Exception("Bad Batch Spec. The spec lists no targets")
+  return targets
+
+BLENDER_SUBSTAGES = [
+  ("Starting Python Export Hook", "Validating project"),
+  ("Old Materials:", "Reordering materials"),
+  ("Calculating Chunks", "Calculating chunks"),
+  ("CHUNKING:", "Writing FBX"),
+]
+UNREAL_IMPORT_SUBSTAGES = [
+  ("LogPython", "Running import hook"),
+  ("LogFbx", "Importing FBX"),
+  ("Successfully exported", "Saving imported asset"),
+]
+UNREAL_COOK_SUBSTAGES = [
+  ("LogCook", "Cooking packages"),
+  ("Cooked packages", "Saving cooked packages"),
+]
+
+class HookOutput:
+  """ Picks job results out of a streamed hook and relays sub-stage progress of the job in flight """
+  def __init__(self, session:'FastExportSession', stage:str, substages:List[Tuple[str,str]], total:int=1):
+    self.session, self.stage, self.substages, self.total = session, stage, substages, total
+    self.substage = -1
+    self.results:List[dict] = []
+
+  def addResult(self, result:dict):
+    self.results.append(result)
+    self.substage = -1
+
+  def __call__(self, line:str):
+    # tools may prefix their log lines, so the tag can appear anywhere
+    if (tag_idx := line.find(JOB_RESULT_TAG)) > -1:
+      try:
+        self.addResult(json.loads(line[tag_idx+len(JOB_RESULT_TAG):]))
+      except ValueError as error:
+        logger.error(f"Unreadable hook result: {error}")
+      return
+
+    for substage_idx in range(self.substage + 1, len(self.substages)):
+      marker, msg = self.substages[substage_idx]
+      if line.find(marker) > -1:
+        self.substage = substage_idx
+        count = "" if self.total == 1 else f" ({min(len(self.results) + 1, self.total)}/{self.total})"
+        self.session.signals.progress.emit(self.stage, f"{msg}{count}")
+        break
+
 class FastExportSignals(QtCore.QObject):
   error = QtCore.Signal(str)
-  progress = QtCore.Signal(int, str)
+  stages = QtCore.Signal(list)
+  progress = QtCore.Signal(str, str)
   finished = QtCore.Signal(Path)
+  cancelled = QtCore.Signal()
+  # stage name and a line of detail to show next to its status, e.g. timings
+  note = QtCore.Signal(str, str)
 
 
 class FastExportSession(QtCore.QRunnable):
-  def dumpAssetInfo(self) -> Path:
-    asset_dump = self.config.work().joinpath(DUMP_SUBDIR, self.asset_stub)
-    json_path = asset_dump.joinpath(self.asset_name + ".json")
-    info_path = asset_dump.joinpath(self.asset_name + INFO_SFX)
-
+  def readAssetInfo(self, target:BuildTarget, json_path:Path) -> Tuple[List[str], List[int]]:
+    """ Material slot names and their outline types, from a full Ue4Export dump of the target """
     options = [ 
       self.config.ue4exp().as_posix(), 
       self.config.pak().as_posix(),
-      "RED/Content/"+self.asset_path,
+      "RED/Content/"+target.asset_path,
       json_path.as_posix(),
       self.config.aes()
     ]
 
-    dump_result = runProcess(options)
+    dump_result = getScheduler().run(TOOL_UE4EXP, options, cancel=self.cancelled)
     if not dump_result or not json_path.exists():
-      raise Exception("Bad Target. Failed to dump info for the target asset, it may not exist.")
+      raise Exception(f"Bad Target. Failed to dump info for the target asset {target.asset_name}, it may not exist.")
 
-    raw_json = json.load(open(json_path.as_posix()))
-    slot_names = [ mat["ObjectName"].split("'")[1] for mat in raw_json["Materials"] ]
+    # the dump is mostly vertex data, only the slot paths are parsed
+    found = extractPaths(json_path, [MATERIAL_NAMES, OUTLINE_INDICES, SECTION_MATERIALS])
+    if len(found[MATERIAL_NAMES]) == 0 or len(found[OUTLINE_INDICES]) == 0:
+      raise Exception(f"Bad Target. The info dump of {target.asset_name} has no material slots")
+    slot_names = [ name.split("'")[1] for name in found[MATERIAL_NAMES] ]
 
     slot_types = [-1 for _ in slot_names]
-    omis = raw_json["Properties"]["LODInfo"][0]["OutlineMaterialIndex"]
-    sections = raw_json["LODModels"][0]["Sections"]
-    for section_type, section in zip(omis, sections):
-      mat_idx = int(section["MaterialIndex"])
-      slot_types[mat_idx] = int(section_type)
-
-    info_file = open(info_path.as_posix(),'w')
-    info_file.write( ",".join(slot_names) + "\n")
-    info_file.write( ",".join(f"{name}:{idx}" for name,idx in zip(slot_names, slot_types)))
-    
+    omis = found[OUTLINE_INDICES][0]
+    for section_type, mat_idx in zip(omis, found[SECTION_MATERIALS]):
+      slot_types[int(mat_idx)] = int(section_type)
+    return slot_names, slot_types
+
+  def dumpAssetInfo(self, target:BuildTarget) -> Path:
+    """ The info file is published to the dump where the hooks read it, the Ue4Export dump stays in the workspace """
+    asset_dump = self.config.work().joinpath(DUMP_SUBDIR, target.asset_stub)
+    info_path = asset_dump.joinpath(target.asset_name + INFO_SFX)
+    json_path = self.workspace.infoRoot().joinpath(target.asset_name + ".json")
+    json_path.parent.mkdir(parents=True, exist_ok=True)
+
+    # the game asset rarely changes between builds, Ue4Export only runs when its pak data does
+    game_path = f"{CONTENT_ROOT}{target.asset_path}{UASSET_SFX}"
+    source = PackageManager(self.config).sourceFingerprints([game_path])[game_path]
+    cache = AssetInfoCache(self.config.work().joinpath(LISTING_CACHE))
+    cached = cache.get(target.asset_path, source)
+    if cached is None:
+      slot_names, slot_types = self.readAssetInfo(target, json_path)
+      cache.put(target.asset_path, source, slot_names, slot_types)
+    else:
+      slot_names, slot_types = cached
+
+    # builds of the same target write the same info, publishing it whole keeps either from reading it half written
+    staged_info = json_path.with_name(info_path.name)
+    with open(staged_info.as_posix(),'w') as info_file:
+      info_file.write( ",".join(slot_names) + "\n")
+      info_file.write( ",".join(f"{name}:{idx}" for name,idx in zip(slot_names, slot_types)))
+    publishFile(staged_info, info_path)
 
     return info_path
 
-  def exportBlender(self, target_project:Path) -> Tuple[Path,str]:
-    fbx_src = self.config.fastBlenderRoot().joinpath(f"{self.asset_name}.fbx")
-    if fbx_src.exists(): fbx_src.unlink() # delete pre-existing
-    
+  def blenderWorker(self) -> HookWorker:
+    options = [
+      self.config.blender().as_posix(),
+      "--background", "--factory-startup",
+      "--python", BLENDER_HOOK, "--", "--worker"
+    ]
+    return getWorker("Blender", TOOL_BLENDER, options)
+
+  def exportBlenderWarm(self, jobs:List[dict], hook:HookOutput) -> bool:
+    """ Runs the exports on the resident Blender worker, False if the worker is unusable """
+    worker = self.blenderWorker()
+    try:
+      for job in jobs:
+        hook.addResult(worker.request(job, hook, self.cancelled))
+    except WorkerError as error:
+      if self.cancelled.is_set(): raise
+      logger.error(f"Blender worker unavailable, falling back to a cold launch: {error}")
+      hook.results = []
+      return False
+    return True
+
+  def exportBlenderCold(self, jobs:List[dict], hook:HookOutput):
+    """ Runs the exports in one fresh Blender, the hook reads the jobs from a file """
+    jobs_path = self.workspace.blenderRoot().joinpath(JOBS_FILE)
+    jobs_path.parent.mkdir(parents=True, exist_ok=True)
+    with open(jobs_path, 'w') as jobs_file:
+      json.dump(jobs, jobs_file)
+
     options = [ 
       self.config.blender().as_posix(), 
       "--background", "--factory-startup", 
-      target_project.as_posix(), 
       "--python", BLENDER_HOOK, "--", 
-      self.config.work().as_posix(), 
-      self.asset_path
+      "--jobs", jobs_path.as_posix()
     ]
-
-    blender_result = runProcess(options, True)
-    blender_stdout = blender_result()
-    if not blender_result or blender_stdout is None:
+    blender_result = getScheduler().run(TOOL_BLENDER, options, True, onStdout=hook, cancel=self.cancelled)
+    if not blender_result or len(hook.results) != len(jobs):
       raise Exception(f"Blender FBX Export Failed. An unexpected error occured while trying to run Blender, check the error log for details.")
-    
-    fails = [line[6:] for line in blender_stdout.split("\n") if line[:6] == "FAIL: "]
-    if len(fails) > 0:
-      fails = '\n'.join(fails)
-      raise Exception(f"Blender FBX Export Failed. Blender project failed validation, please address the following issues before continuing:\n{fails}")
-    
-    if not fbx_src.exists():
-      raise Exception(f"Blender FBX Export Failed. Blender appeared to run correctly, but the exported FBX was not found")
 
-    chunks_raw = [line[9:] for line in blender_stdout.split("\n") if line[:9] == "CHUNKING:"]
-    print(chunks_raw)
-    assert len(chunks_raw) == 1
-    print("Chunks:", [int(x) for x in chunks_raw[0].split(",")])
-    
-    return fbx_src, chunks_raw[0]
+  def exportBlender(self, targets:List[BuildTarget]):
+    """ Exports the FBX of every target in one Blender session """
+    for target in targets:
+      target.fbx_src = self.workspace.blenderRoot().joinpath(f"{target.asset_name}.fbx")
+      if target.fbx_src.exists(): target.fbx_src.unlink() # delete pre-existing
+
+    jobs = [
+      { "blend": target.blend.as_posix(), "work": self.config.work().as_posix(), "asset": target.asset_path, "out": self.workspace.blenderRoot().as_posix() }
+      for target in targets
+    ]
+    hook = HookOutput(self, "blender", BLENDER_SUBSTAGES, len(targets))
+    if TOOL_BLENDER in self.cold_tools or not self.exportBlenderWarm(jobs, hook):
+      self.exportBlenderCold(jobs, hook)
+
+    fails = [f"{target.asset_name}: {fail}" for target, result in zip(targets, hook.results) for fail in result["fails"]]
+    if len(fails) > 0:
+      fails_msg = '\n'.join(fails)
+      raise Exception(f"Blender FBX Export Failed. Blender project failed validation, please address the following issues before continuing:\n{fails_msg}")
+
+    for target, result in zip(targets, hook.results):
+      if not target.fbx_src.exists() or result["chunks"] is None:
+        raise Exception(f"Blender FBX Export Failed. Blender appeared to run correctly, but the exported FBX for {target.asset_name} was not found")
+      target.chunks = result["chunks"]
+      target.mesh_stats = result.get("stats", {})
+      logger.info(f"Chunks for {target.asset_name}: {target.chunks}")
   
   def setupUnreal(self):
-    ue_proj = self.config.fastUnrealUproj()
+    ue_proj = self.workspace.unrealUproj()
+    # written before the editor boots, it only reads the DDC config on startup
+    writeDDCConfig(self.workspace.unrealRoot(), self.ddcRoot())
     if ue_proj.exists(): return
     
-    ue_proj.parent.mkdir(exist_ok=True)
-    src = UNREAL_TEMPLATE
+    ue_proj.parent.mkdir(parents=True, exist_ok=True)
     shutil.copy(UNREAL_TEMPLATE, ue_proj)
 
-  def importUnreal(self, fbx_src:Path, info_path:Path, chunks:str):
-    ue_content = self.config.fastUnrealContent()
+  def ddcRoot(self) -> Path:
+    return self.config.work().joinpath(DDC)
+
+  def unrealWorker(self) -> HookWorker:
+    options = ' '.join([
+      self.config.unreal().as_posix(),
+      self.workspace.unrealUproj().as_posix(),
+      "-stdout", "-nullrhi", "-unattended", "-nopause", "-nosplash",
+      f'-ExecutePythonScript="{UNREAL_HOOK} --worker"'
+    ])
+    return getWorker("Unreal", TOOL_UNREAL, options)
+
+  def importUnrealWarm(self, jobs:List[dict], hook:HookOutput) -> bool:
+    """ Runs the imports on the resident editor of the fast build project, False if it is unusable """
+    worker = self.unrealWorker()
+    try:
+      for job_idx, job in enumerate(jobs):
+        # prepareUnreal cleaned already unless the worker was restarted since, then this is cheap
+        clean = { "clean": "/Game/Chara" } if job_idx == 0 else {}
+        hook.addResult(worker.request({ **job, **clean }, hook, self.cancelled))
+    except WorkerError as error:
+      if self.cancelled.is_set(): raise
+      logger.error(f"Unreal worker unavailable, falling back to a cold launch: {error}")
+      hook.results = []
+      return False
+    return True
+
+  def importUnrealCold(self, targets:List[BuildTarget], jobs:List[dict], hook:HookOutput):
+    ue_content = self.workspace.unrealContent()
     ue_chara = ue_content.joinpath("Chara")
     if ue_chara.exists(): rm_tree(ue_chara)
-    ue_precooked = ue_content.joinpath(self.asset_stub)
-    ue_precooked.mkdir(parents=True,exist_ok=True)
+    for target in targets:
+      ue_content.joinpath(target.asset_stub).mkdir(parents=True, exist_ok=True)
+
+    jobs_path = self.workspace.unrealRoot().joinpath(JOBS_FILE)
+    with open(jobs_path, 'w') as jobs_file:
+      json.dump(jobs, jobs_file)
 
     options = ' '.join([ 
       self.config.unreal().as_posix(), 
-      self.config.fastUnrealUproj().as_posix(), 
+      self.workspace.unrealUproj().as_posix(), 
       "-stdout", "-nullrhi", "-unattended", "-nopause", "-nosplash", 
-      f'-ExecutePythonScript="{UNREAL_HOOK} {fbx_src.as_posix()} {self.asset_stub} {info_path.as_posix()} {chunks}"' 
+      f'-ExecutePythonScript="{UNREAL_HOOK} --jobs {jobs_path.as_posix()}"' 
     ])
-    unreal_result = runProcess(options, True)
-    unreal_stdout = unreal_result()
-    if not unreal_result or unreal_stdout is None:
+    unreal_result = getScheduler().run(TOOL_UNREAL, options, True, onStdout=hook, cancel=self.cancelled)
+    if not unreal_result or len(hook.results) != len(jobs):
       raise Exception(f"Unreal Import Failed. An unexpected error occured while trying to run Unreal, check the error log for details.")
-    
-    if unreal_stdout.find("Successfully exported") < 0:
-      raise Exception(f"Unreal Import Failed. Unreal did not appear to correctly import the fbx.")
-
-    if not ue_precooked.joinpath(f"{self.asset_name}.uasset").exists():
-      raise Exception(f"Unreal Import Failed. Unreal appeared to run correctly, but the imported uasset was not found")
 
-  def cookUnreal(self):
-    ue_cooked = self.config.fastUnrealCooked()
-    uasset_src = ue_cooked.joinpath(self.asset_stub, f"{self.asset_name}.uasset")
-    uexp_src = ue_cooked.joinpath(self.asset_stub, f"{self.asset_name}.uexp")
-    if uasset_src.exists(): uasset_src.unlink()
-    if uexp_src.exists(): uexp_src.unlink()
+  def importUnreal(self, targets:List[BuildTarget]):
+    """ Imports the FBX of every target in one Unreal session """
+    jobs = [
+      { "fbx": target.fbx_src.as_posix(), "stub": target.asset_stub, "info": target.info_path.as_posix(), "chunks": target.chunks }
+      for target in targets
+    ]
+    hook = HookOutput(self, "unreal", UNREAL_IMPORT_SUBSTAGES, len(targets))
+    if TOOL_UNREAL in self.cold_tools or not self.importUnrealWarm(jobs, hook):
+      self.importUnrealCold(targets, jobs, hook)
+
+    fails = [f"{target.asset_name}: {fail}" for target, result in zip(targets, hook.results) if not result["success"] for fail in result["fails"]]
+    if not all(result["success"] for result in hook.results):
+      fails_msg = '\n'.join(fails)
+      raise Exception(f"Unreal Import Failed. Unreal did not appear to correctly import the fbx.\n{fails_msg}")
+
+    for target in targets:
+      if not self.workspace.unrealContent().joinpath(target.cookedName(UASSET_SFX)).exists():
+        raise Exception(f"Unreal Import Failed. Unreal appeared to run correctly, but the imported uasset for {target.asset_name} was not found")
+
+  def cookUnreal(self, targets:List[BuildTarget]):
+    """ One cook of the fast build project covers every imported target, earlier cooked files are kept for -iterate """
+    ue_cooked = self.workspace.unrealCooked()
+    for target in targets:
+      target.uasset_src = ue_cooked.joinpath(target.cookedName(UASSET_SFX))
+      target.uexp_src = ue_cooked.joinpath(target.cookedName(UEXP_SFX))
 
     options = [ 
       self.config.unreal().as_posix(), 
-      self.config.fastUnrealUproj().as_posix(), 
-      "-run=cook", "-nullrhi", "-unattended", "-nopause", "-silent", "-nosplash", "-targetplatform=WindowsNoEditor" 
+      self.workspace.unrealUproj().as_posix(), 
+      *COOK_OPTIONS,
+      "-map=" + "+".join(f"/Game/{target.asset_path}" for target in targets)
     ]
 
-    cook_result = runProcess(options)
+    ddc_before = fileSnapshot(self.ddcRoot())
+    cooked_before = fileSnapshot(ue_cooked)
+    cook_start = time.monotonic()
+    cook_result = getScheduler().run(TOOL_UNREAL, options, onStdout=HookOutput(self, "unreal", UNREAL_COOK_SUBSTAGES), cancel=self.cancelled)
+    cook_time = time.monotonic() - cook_start
     if not cook_result:
       raise Exception(f"Unreal Cook Failed. An unexpected error occured while trying to run Unreal, check the error log for details.")
 
-    if not uasset_src.exists() or not uexp_src.exists():
-      raise Exception("Unreal Cook Failed. Unreal appeared to cook correctly, but the cooked uasset was not found")
-
-    return uasset_src, uexp_src
-
-  def pak(self, uasset_src:Path, uexp_src:Path, mod_name:str):
-    mod_dir = self.config.work().joinpath("paks",mod_name)
-    pak_src = self.config.work().joinpath("paks", f"{mod_name}.pak")
-    if Path(pak_src).exists(): Path(pak_src).unlink()
-
-    build_home = mod_dir.joinpath("RED/Content").joinpath(self.asset_stub)
-    build_home.mkdir(parents=True, exist_ok=True)
-    moveReplace(uasset_src, build_home)
-    moveReplace(uexp_src, build_home)
-    
-    with open(self.config.packer().parent.joinpath('filelist.txt'),'w') as filelist:
+    # the time includes waiting for a scheduler slot, that is part of what the build waited on
+    report = f"Cooked in {cook_time:.1f}s, {DDCUsage(ddc_before, fileSnapshot(self.ddcRoot()))}"
+    others = self.otherCookedPackages(targets, cooked_before, fileSnapshot(ue_cooked))
+    if others:
+      logger.warning(f"{self.mod_name}: the cook also wrote {', '.join(others)}")
+      report += f", non-target packages cooked: {len(others)}"
+    logger.info(f"{self.mod_name}: {report}")
+    self.noteStage("unreal", report)
+    trimDDC(self.ddcRoot(), self.config.ddcMB() * 1024 * 1024)
+
+    for target in targets:
+      if not target.uasset_src.exists() or not target.uexp_src.exists():
+        raise Exception(f"Unreal Cook Failed. Unreal appeared to cook correctly, but the cooked uasset for {target.asset_name} was not found")
+
+  def otherCookedPackages(self, targets:List[BuildTarget], before:Dict[str, int], after:Dict[str, int]) -> List[str]:
+    """ Packages written by the cook that aren't targets, nothing should be when the cook honoured -cooksinglepackage """
+    ue_cooked = self.workspace.unrealCooked()
+    stubs = { target.cookedName("") for target in targets }
+    others = set()
+    for path, mtime in after.items():
+      if before.get(path) == mtime: continue
+      # .uasset, .uexp and .ubulk all belong to the package of the same name
+      package = Path(path).relative_to(ue_cooked).with_suffix("").as_posix()
+      if package not in stubs:
+        others.add(package)
+    return sorted(others)
+
+  def pakUnreal(self, mod_dir:Path, pak_src:Path):
+    """ UnrealPak, for when the in-process writer's pak fails its read back """
+    with open(self.workspace.filelist(),'w') as filelist:
       filelist.write( '"' + mod_dir.as_posix() + r'\*.*" "..\..\..\*.*"' )
 
-    options = [ self.config.packer().as_posix(), pak_src, "-create=filelist.txt", "-compress"]
-    pak_result = runProcess(options)
+    options = [ self.config.packer().as_posix(), pak_src, f"-create={self.workspace.filelist().as_posix()}", *PAK_OPTIONS]
+    pak_result = getScheduler().run(TOOL_PAK, options, cancel=self.cancelled)
     if not pak_result:
       raise Exception(f"Unreal PAK Failed. An unexpected error occured while trying to run Unreal PAK, check the error log for details.")
 
     if not Path(pak_src).exists():
       raise Exception(f"Unreal PAK Failed. Unreal PAK appeared to run correctly, but the pak was not found")
+
+  def pak(self, targets:List[BuildTarget], mod_name:str) -> Path:
+    mod_dir = self.workspace.pakRoot().joinpath(mod_name)
+    pak_src = self.workspace.pakRoot().joinpath(f"{mod_name}.pak")
+    if Path(pak_src).exists(): Path(pak_src).unlink()
+
+    # only this build's assets belong in the pak, not whatever an earlier build of the mod left
+    if mod_dir.exists(): rm_tree(mod_dir)
+    for target in targets:
+      build_home = mod_dir.joinpath("RED/Content").joinpath(target.asset_stub)
+      build_home.mkdir(parents=True, exist_ok=True)
+      copyReplace(target.uasset_src, build_home)
+      copyReplace(target.uexp_src, build_home)
+
+    pak_src.parent.mkdir(parents=True, exist_ok=True)
+    try:
+      writePak(mod_dir, pak_src, MOUNT_POINT)
+      checkPak(mod_dir, pak_src)
+    except (OSError, PakError, zlib.error, UnicodeError) as error:
+      logger.error(f"Pak writer failed, falling back to Unreal PAK: {error}")
+      pak_src.unlink(missing_ok=True)
+      self.pakUnreal(mod_dir, pak_src)
     return pak_src
+
+  # ----- Stages -----
+  def validateTarget(self, target:BuildTarget):
+    target.info_path = self.dumpAssetInfo(target)
+
+  def lookupBlender(self):
+    """ Restores every target's FBX the cache has, the rest are left for exportBlenderMisses
+
+    The hook reorders material slots by the dumped info, so a game patch that changes them must miss.
+    """
+    for target in self.targets:
+      target.fbx_src = self.workspace.blenderRoot().joinpath(f"{target.asset_name}.fbx")
+      key = stageKey(hashFile(target.blend), hashFile(target.info_path), toolStamp(self.config.blender()), hashFile(Path(BLENDER_HOOK)), target.asset_path)
+      if (entry := self.cache.get("blender", key)) is not None:
+        entry.restore(target.fbx_src.name, target.fbx_src)
+        target.chunks = entry.meta["chunks"]
+        target.mesh_stats = entry.meta.get("stats", {})
+      else:
+        self.blender_misses.append((target, key))
+
+  def bootBlender(self):
+    """ Starts Blender alongside the Unreal editor, only when something needs exporting """
+    if len(self.blender_misses) == 0:
+      return
+    try:
+      self.blenderWorker().warm(self.cancelled)
+    except (OSError, WorkerError) as error:
+      if self.cancelled.is_set(): raise
+      logger.error(f"Blender worker unavailable, the export will fall back to a cold launch: {error}")
+      self.cold_tools.add(TOOL_BLENDER)
+
+  def exportBlenderMisses(self):
+    if len(self.blender_misses) == 0:
+      self.cached_stages.add("blender")
+      return
+    self.exportBlender([target for target, _ in self.blender_misses])
+    for target, key in self.blender_misses:
+      self.cache.put("blender", key, { target.fbx_src.name: target.fbx_src }, { "chunks": target.chunks, "stats": target.mesh_stats })
+
+  def prepareUnreal(self):
+    """ Project setup, editor boot and Chara cleanup, none of which needs the FBXs """
+    self.setupUnreal()
+    # with every FBX cached the cook almost certainly is too, so don't boot an editor for it
+    if len(self.blender_misses) == 0:
+      return
+    try:
+      # the editor has Chara loaded, so it must clean it itself rather than us deleting files under it
+      self.unrealWorker().request({ "clean": "/Game/Chara" }, cancel=self.cancelled)
+    except WorkerError as error:
+      if self.cancelled.is_set(): raise
+      logger.error(f"Unreal worker unavailable, the import will fall back to a cold launch: {error}")
+      self.cold_tools.add(TOOL_UNREAL)
+
+  def cookUnrealCached(self):
+    """ Import and cook share one entry, the cooked files are all a later stage reads from either """
+    key = stageKey(
+      [(hashFile(target.fbx_src), hashFile(target.info_path), target.chunks, target.asset_path) for target in self.targets],
+      toolStamp(self.config.unreal()), hashFile(Path(UNREAL_HOOK)), hashFile(UNREAL_TEMPLATE), COOK_OPTIONS
+    )
+    if (entry := self.cache.get("unreal", key)) is not None:
+      ue_cooked = self.workspace.restoredRoot()
+      for target in self.targets:
+        target.uasset_src = ue_cooked.joinpath(target.cookedName(UASSET_SFX))
+        target.uexp_src = ue_cooked.joinpath(target.cookedName(UEXP_SFX))
+        entry.restore(target.cookedName(UASSET_SFX), target.uasset_src)
+        entry.restore(target.cookedName(UEXP_SFX), target.uexp_src)
+      self.cached_stages.add("unreal")
+      return
+
+    self.importUnreal(self.targets)
+    self.cookUnreal(self.targets)
+    cooked = {}
+    for target in self.targets:
+      cooked[target.cookedName(UASSET_SFX)] = target.uasset_src
+      cooked[target.cookedName(UEXP_SFX)] = target.uexp_src
+    self.cache.put("unreal", key, cooked)
+
+  def pakCached(self):
+    """ The pak mounts the same whatever the mod is called, so the name is not part of the key """
+    pak_src = self.workspace.pakRoot().joinpath(f"{self.mod_name}.pak")
+    key = stageKey(
+      [(target.asset_stub, target.asset_name, hashFile(target.uasset_src), hashFile(target.uexp_src)) for target in self.targets],
+      PAK_WRITER_VERSION, MOUNT_POINT
+    )
+    if (entry := self.cache.get("pak", key)) is not None:
+      entry.restore("mod.pak", pak_src)
+      self.cached_stages.add("pak")
+    else:
+      pak_src = self.pak(self.targets, self.mod_name)
+      self.cache.put("pak", key, { "mod.pak": pak_src })
+    self.output = pak_src
+
+  def verifyPak(self):
+    """ Every target must be in the pak index, under the path the game will look for it """
+    try:
+      entries = set(entry.path for entry in PakFile(self.output).entries)
+    except (OSError, PakError) as error:
+      raise Exception(f"Pak Verification Failed. The built pak could not be read: {error}")
+    missing = [
+      name for target in self.targets for name in (target.cookedName(UASSET_SFX), target.cookedName(UEXP_SFX))
+      if f"{CONTENT_ROOT}{name}" not in entries
+    ]
+    if len(missing) > 0:
+      missing_msg = '\n'.join(missing)
+      raise Exception(f"Pak Verification Failed. The built pak is missing:\n{missing_msg}")
   
-  def setupUnverumMod(self, pak_src:Path):
+  def setupUnverumMod(self):
+    """ Only runs once the pak is verified, the one installed stays until the new one replaces it in a single rename """
     mod_dir = self.config.unverum().parent.joinpath("Mods/Guilty Gear -Strive-/",self.mod_name)
-    pak_dst = mod_dir.joinpath(self.mod_name + ".pak")
-    if pak_dst.exists(): pak_dst.unlink()
-    mod_dir.mkdir(parents=True,exist_ok=True)
-    pak_src.rename(pak_dst)
+    publishFile(self.output, mod_dir.joinpath(self.mod_name + ".pak"))
+
+  def buildGraph(self) -> StageGraph:
+    """ Stage outputs: info:<asset> per target, fbx_cached, blender_worker, fbx, uproject, cooked, pak and verified """
+    graph = StageGraph()
+    infos = []
+    for target in self.targets:
+      name = f"info:{target.asset_name}"
+      label = "Validating Asset Info" if len(self.targets) == 1 else f"Validating Asset Info: {target.asset_name}"
+      graph.add(name, label, partial(self.validateTarget, target), outputs=[name])
+      infos.append(name)
+    graph.add("blender_cache", "Checking build cache", self.lookupBlender, inputs=infos, outputs=["fbx_cached"])
+    graph.add("blender_boot", "Starting Blender", self.bootBlender, inputs=["fbx_cached"], outputs=["blender_worker"])
+    graph.add("blender", "Exporting Blender Project to FBX", self.exportBlenderMisses, inputs=["blender_worker", *infos], outputs=["fbx"])
+    graph.add("unreal_setup", "Preparing Unreal project", self.prepareUnreal, inputs=["fbx_cached"], outputs=["uproject"])
+    graph.add("unreal", "Importing and cooking in Unreal Engine", self.cookUnrealCached, inputs=["fbx", "uproject", *infos], outputs=["cooked"])
+    graph.add("pak", "Packing mod", self.pakCached, inputs=["cooked"], outputs=["pak"])
+    graph.add("verify", "Verifying pak", self.verifyPak, inputs=["pak"], outputs=["verified"])
+    graph.add("deploy", "Deploying to Unverum", self.setupUnverumMod, inputs=["verified"])
+    return graph
+
+  def noteStage(self, name:str, msg:str):
+    self.notes[name] = f"{self.notes[name]}; {msg}" if name in self.notes else msg
+    self.signals.note.emit(name, self.notes[name])
+
+  def onStageState(self, name:str, state:str):
+    if state == STAGE_RUNNING:
+      self.stage_started[name] = time.monotonic()
+    elif state in (STAGE_DONE, STAGE_FAILED) and name in self.stage_started:
+      seconds = time.monotonic() - self.stage_started[name]
+      self.stage_records.append(StageRecord(name, seconds, state, name in self.cached_stages))
+
+    if state == STAGE_DONE and name in self.cached_stages:
+      self.signals.progress.emit(name, STAGE_CACHED)
+    else:
+      self.signals.progress.emit(name, state)
 
-  def __init__(self, config:ConfigWidget, blender_target:PathWidget, asset_target:TextWidget, mod_name:TextWidget):
+  def __init__(self, config:ConfigWidget, targets:List[BuildTarget], mod_name:str):
     super().__init__()
-    # ----- Config and Target Validation -----
+    # ----- Config Validation -----
     if not config.validate():
       raise Exception("Bad Config. Please verify your install paths and aes key.")
-    if not (rcode := blender_target.updateValue()):
-      raise Exception(f"Bad Target. Please verify your target blender project:\n{rcode.value}")
-    if not (rcode := asset_target.updateValue()):
-      raise Exception(f"Bad Target. Please verify your target asset:\n{rcode.value}")
-    asset_path = cleanAsset(asset_target.value)
-    if asset_path is None:
-      raise Exception("Bad Target. Something is wrong with your target asset. How the hell did you get here!?")
-    if not (rcode := mod_name.updateValue()):
-      raise Exception(f"Bad Target. Please verify your target mod name:\n{rcode.value}")
     
     self.config = config
     self.output = None
-    self.asset_path = asset_path
-    self.asset_stub, self.asset_name = breakAssetPath(self.asset_path)
-    self.blender_target = blender_target.value
-    self.mod_name = mod_name.value
+    self.targets = targets
+    self.mod_name = mod_name
+    # running tools are killed and no further stages start, the build then reports cancelled
+    self.cancelled = threading.Event()
+    self.notes:Dict[str, str] = {}
+    self.stage_started:Dict[str, float] = {}
+    self.stage_records:List[StageRecord] = []
+    self.cache = BuildCache(config.work().joinpath(BUILD_CACHE), config.buildCacheMB() * 1024 * 1024)
+    self.workspace:Optional[Workspace] = None
+    self.blender_misses:List[Tuple[BuildTarget,str]] = []
+    self.cached_stages:Set[str] = set()
+    # tools whose worker already failed this build, they go straight to a cold launch
+    self.cold_tools:Set[str] = set()
     self.signals = FastExportSignals()
 
+  def cancel(self):
+    self.cancelled.set()
+
+  def historyData(self) -> dict:
+    targets = []
+    for target in self.targets:
+      fbx_bytes = target.fbx_src.stat().st_size if target.fbx_src is not None and target.fbx_src.exists() else 0
+      chunks = sum(int(count) for count in target.chunks.split(",") if count.strip().isdigit())
+      targets.append({ "asset": target.asset_path, "fbx_bytes": fbx_bytes, "chunks": chunks, **target.mesh_stats })
+    tools = {
+      "blender": toolStamp(self.config.blender()), "unreal": toolStamp(self.config.unreal()),
+      "blender_hook": hashFile(Path(BLENDER_HOOK)), "unreal_hook": hashFile(Path(UNREAL_HOOK)),
+      "pak_writer": PAK_WRITER_VERSION,
+    }
+    return { "targets": targets, "tools": tools, "cached": sorted(self.cached_stages) }
+
+  def recordHistory(self, started:float, status:str):
+    """ Stores the build and flags its stages that got slower, history problems never fail the build """
+    try:
+      history = BuildHistory(self.config.work().joinpath(BUILD_HISTORY))
+      build_id = history.record(started, self.mod_name, status, time.time() - started, self.stage_records, self.historyData())
+      if status != STAGE_DONE: return
+      for regression in history.regressions(build_id):
+        logger.warning(f"{self.mod_name}: stage {regression.stage} took {regression}")
+        self.noteStage(regression.stage, f"slower than usual: {regression}")
+    except (OSError, sqlite3.Error) as error:
+      logger.error(f"Failed to record the build history: {error}")
+
   def run(self):
+    pool = getWorkspacePool(self.config.work())
+    started = time.time()
     try:
-      self.signals.progress.emit(0, "Validating Asset Info")
-      info_path = self.dumpAssetInfo()
-      self.signals.progress.emit(1, "Exporting Blender Project to FBX")
-      fbx_src, chunks = self.exportBlender(self.blender_target)
-      self.signals.progress.emit(2, "Importing FBX into Unreal Engine")
-      self.setupUnreal()
-      self.importUnreal(fbx_src, info_path, chunks)
-      self.signals.progress.emit(3, "Cooking Unreal project")
-      uasset_src, uexp_src = self.cookUnreal()
-      self.signals.progress.emit(4, "Packing mod")
-      self.output = self.pak(uasset_src, uexp_src, self.mod_name)
-      self.setupUnverumMod(self.output)
-      self.signals.progress.emit(5, "Finished")
+      graph = self.buildGraph()
+      self.signals.stages.emit([(stage.name, stage.label) for stage in graph.order()])
+      self.workspace = pool.acquire(self.cancelled)
+      if self.workspace is not None:
+        graph.run(self.onStageState, cancel=self.cancelled)
+      if self.cancelled.is_set():
+        raise Exception("Build Cancelled.")
+      # the workspace pak is gone once another build takes the workspace
+      published = self.config.work().joinpath("paks", f"{self.mod_name}.pak")
+      publishFile(self.output, published)
+      self.output = published
     except Exception as error:
-      self.signals.error.emit(str(error))
+      # killed tools fail their stage, that is the cancel and not an error
+      if self.cancelled.is_set():
+        self.recordHistory(started, BUILD_CANCELLED)
+        self.signals.cancelled.emit()
+      else:
+        self.recordHistory(started, STAGE_FAILED)
+        self.signals.error.emit(str(error))
       return
+    finally:
+      if self.workspace is not None:
+        pool.release(self.workspace)
 
+    self.recordHistory(started, STAGE_DONE)
     self.signals.finished.emit(self.output)
-
-
-
-
-    
-    
-
-
-    
@@ -0,0 +1,105 @@
+""" Record of finished dump exports, so unchanged targets are skipped on the next run """
+from pathlib import Path
+from typing import Optional, List, Dict, Any
+import json, hashlib, os, threading, logging
+
+logger = logging.getLogger(__name__)
+
+MANIFEST_VERSION = 2
+HASH_CHUNK = 1024 * 1024
+
+def hashFile(path:Path) -> str:
+  digest = hashlib.sha1()
+  with open(path, 'rb') as handle:
+    while chunk := handle.read(HASH_CHUNK):
+      digest.update(chunk)
+  return digest.hexdigest()
+
+def settingsHash(*parts:Any) -> str:
+  """ Anything that changes what a target exports to, e.g. tool paths and their arguments """
+  return hashlib.sha1(json.dumps(parts, default=str).encode()).hexdigest()
+
+class ExportManifest:
+  """ Per target source fingerprint, settings hash and output file hashes, saved as json lines
+
+  Each finished target appends one line, so a crashed or cancelled export resumes
+  from the first target it didn't finish. Later lines override earlier ones, the
+  file is rewritten with one line per target whenever it is loaded.
+  """
+  def __init__(self, path:Path):
+    self.path = path
+    self.lock = threading.Lock()
+    self.targets:Dict[str, Dict[str, Any]] = {}
+    try:
+      self.load()
+      self.compact()
+    except FileNotFoundError:
+      pass
+    except (OSError, ValueError, KeyError) as error:
+      logger.error(f"Ignoring unreadable export manifest {path}: {error}")
+      self.targets = {}
+
+  def load(self):
+    with open(self.path) as handle:
+      header = json.loads(handle.readline())
+      if header.get("version") != MANIFEST_VERSION: return
+      for line in handle:
+        try:
+          record = json.loads(line)
+        except ValueError:
+          # the last line of a crashed run may be cut short
+          continue
+        if record.get("entry") is None:
+          self.targets.pop(record["target"], None)
+        else:
+          self.targets[record["target"]] = record["entry"]
+
+  def compact(self):
+    """ Written to a temp file and swapped in so a crash never leaves half a manifest """
+    temp = self.path.with_suffix(".tmp")
+    with open(temp, 'w') as handle:
+      handle.write(json.dumps({ "version": MANIFEST_VERSION }) + "\n")
+      for target, entry in self.targets.items():
+        handle.write(json.dumps({ "target": target, "entry": entry }) + "\n")
+    os.replace(temp, self.path)
+
+  def append(self, target:str, entry:Optional[Dict[str, Any]]):
+    """ None records the target as forgotten """
+    if not self.path.exists():
+      self.compact()
+      return
+    with open(self.path, 'a') as handle:
+      handle.write(json.dumps({ "target": target, "entry": entry }) + "\n")
+
+  def isValid(self, target:str, source:str, settings:str) -> bool:
+    """ True when target was exported from the same source with the same settings and its outputs are untouched """
+    with self.lock:
+      entry = self.targets.get(target)
+    if entry is None or entry["source"] != source or entry["settings"] != settings:
+      return False
+
+    for file, (size, mtime, digest) in entry["outputs"].items():
+      try:
+        stat = os.stat(file)
+      except OSError:
+        return False
+      if stat.st_size != size:
+        return False
+      # an unchanged stat is trusted, otherwise the content decides
+      if stat.st_mtime_ns != mtime and hashFile(Path(file)) != digest:
+        return False
+    return True
+
+  def record(self, target:str, source:str, settings:str, outputs:List[Path]):
+    entry = { "source": source, "settings": settings, "outputs": {} }
+    for output in outputs:
+      stat = output.stat()
+      entry["outputs"][output.as_posix()] = [stat.st_size, stat.st_mtime_ns, hashFile(output)]
+    with self.lock:
+      self.targets[target] = entry
+      self.append(target, entry)
+
+  def forget(self, target:str):
+    with self.lock:
+      if self.targets.pop(target, None) is not None:
+        self.append(target, None)
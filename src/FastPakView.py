@@ -1,10 +1,18 @@
-from PySide6 import QtCore, QtWidgets
+from PySide6 import QtCore, QtWidgets, QtGui
 from pathlib import Path
+from typing import List, Tuple, Dict, Optional
 
 from .ConfigView import ConfigWidget
 from .Widgets import showWarning, PathWidget, TextWidget
-from .ExportDriver import FastExportSession, cleanAsset
+from .ExportDriver import FastExportSession, BuildTarget, STAGE_CACHED, BUILD_CANCELLED, cleanAsset, singleTarget, loadBatchSpec
 from .Process import ReturnCode
+from .AssetIndex import AssetIndex
+from .StageGraph import STAGE_DONE, STAGE_FAILED, STAGE_SKIPPED
+from .BlendWatcher import BlendWatcher
+from .BuildHistory import BuildHistory
+from .Constants import BUILD_HISTORY
+
+FINISHED_STATES = { STAGE_DONE, STAGE_FAILED, STAGE_SKIPPED, STAGE_CACHED }
 
 BAD_SYMBOLS=["..", "*", "?", ",", "'", "\""]
 BAD_SYMBOLS_STR = ' '.join(BAD_SYMBOLS)
@@ -20,6 +28,16 @@ def validateAsset(value:str) -> ReturnCode[str]:
       ReturnCode(False, f"Target Asset contains a '{symbol}', it and the following characters are prohibited:\n {BAD_SYMBOLS_STR}")
   return ReturnCode(True)
 
+class BuildRow:
+  """ One build's entry in the build list, its stages are the child rows """
+  def __init__(self, session:FastExportSession, item:QtWidgets.QTreeWidgetItem, quiet:bool):
+    # watch mode rebuilds are quiet, they only report success in the list
+    self.session, self.item, self.quiet = session, item, quiet
+    self.stage_items:Dict[str, QtWidgets.QTreeWidgetItem] = {}
+
+  def finishedStages(self) -> int:
+    return sum(1 for item in self.stage_items.values() if item.text(1) in FINISHED_STATES)
+
 class FastPakWidget(QtWidgets.QWidget):
   def __init__(self, config:ConfigWidget):
     super().__init__()
@@ -28,21 +46,47 @@ class FastPakWidget(QtWidgets.QWidget):
     
     self.target_field = PathWidget("Target_File", "*.blend")
     self.char_field = TextWidget("Target_Asset", validator=validateAsset)
+    self.asset_names = QtCore.QStringListModel()
+    completer = QtWidgets.QCompleter(self.asset_names, self)
+    completer.setCaseSensitivity(QtCore.Qt.CaseSensitivity.CaseInsensitive)
+    completer.setModelSorting(QtWidgets.QCompleter.ModelSorting.CaseInsensitivelySortedModel)
+    self.char_field.text_field.setCompleter(completer)
     self.mod_field = TextWidget("Target_Mod")
     self.export_FBX = QtWidgets.QPushButton("One-Click Convert: Blender to PAK")
     self.export_FBX.clicked.connect(self.export)
+    self.batch_field = PathWidget("Batch_Spec", "*.json")
+    self.export_batch = QtWidgets.QPushButton("Batch Convert: Every Spec Target to one PAK")
+    self.export_batch.clicked.connect(self.exportBatch)
+    self.watch_box = QtWidgets.QCheckBox("Watch: rebuild the last build whenever one of its .blend files is saved")
+    self.watch_box.toggled.connect(self.toggleWatch)
+    self.show_history = QtWidgets.QPushButton("Build History: stage timings and slowdowns")
+    self.show_history.clicked.connect(self.showHistory)
+    self.watcher = BlendWatcher(self)
+    self.watcher.saved.connect(self.rebuildWatched)
+    # (blend, asset) pairs and mod name of the last build started, what watch mode rebuilds
+    self.last_build:Optional[Tuple[List[Tuple[Path,str]], str]] = None
+    # a save landed while the watched mod was building, it is rebuilt once that build stops
+    self.watch_pending = False
     self.progress = QtWidgets.QProgressBar()
-    self.progress.setMaximum(5)
     self.progress.setValue(0)
-    self.state = QtWidgets.QLabel()
+    # finished builds stay listed so their failed, skipped and cached stages can be read
+    self.build_list = QtWidgets.QTreeWidget()
+    self.build_list.setHeaderLabels(["Build", "Status", "Details"])
+    self.build_list.setVisible(False)
+    # running builds by their session's signals object, which is what sender() gives the handlers
+    self.builds:Dict[QtCore.QObject, BuildRow] = {}
 
     layout = QtWidgets.QVBoxLayout(self)
     layout.addWidget(self.target_field)
     layout.addWidget(self.char_field)
     layout.addWidget(self.mod_field)
     layout.addWidget(self.export_FBX)
+    layout.addWidget(self.batch_field)
+    layout.addWidget(self.export_batch)
+    layout.addWidget(self.watch_box)
+    layout.addWidget(self.show_history)
     layout.addWidget(self.progress)
-    layout.addWidget(self.state)
+    layout.addWidget(self.build_list)
 
     self.setWorking(False)
   
@@ -50,43 +94,187 @@ class FastPakWidget(QtWidgets.QWidget):
     self.target_field.loadSettings(settings)
     self.char_field.loadSettings(settings)
     self.mod_field.loadSettings(settings)
+    self.batch_field.loadSettings(settings)
   def saveSettings(self, settings):
     self.target_field.saveSettings(settings)
     self.char_field.saveSettings(settings)
     self.mod_field.saveSettings(settings)
+    self.batch_field.saveSettings(settings)
+
+  @QtCore.Slot()
+  def setAssetIndex(self, index:AssetIndex):
+    self.asset_names.setStringList(index.assetNames())
 
   def setWorking(self, working:bool):
+    """ Mods stay stashed and the config locked from the first build starting until the last one ends """
     if working:
       self.config.stashMods()
     else:
       self.config.restoreMods()
     self.config.setEnabled(not working)
-    self.export_FBX.setEnabled(not working)
-    self.export_FBX.setVisible(not working)
     self.progress.setVisible(working)
-    self.state.setVisible(working)
+
+  def updateProgress(self):
+    rows = list(self.builds.values())
+    self.progress.setMaximum(max(1, sum(len(row.stage_items) for row in rows)))
+    self.progress.setValue(sum(row.finishedStages() for row in rows))
+
+  def modName(self) -> Optional[str]:
+    if not (rcode := self.mod_field.updateValue()):
+      showWarning("Bad Target", f"Please verify your target mod name:\n{rcode.value}", False)
+      return None
+    return self.mod_field.value
+
+  def runningBuild(self, mod_name:str) -> Optional[BuildRow]:
+    return next((row for row in self.builds.values() if row.session.mod_name == mod_name), None)
+
+  def startSession(self, targets:List[BuildTarget], mod_name:str, quiet:bool=False):
+    # builds of one mod would share its pak and Unverum folder, other mods build side by side
+    if self.runningBuild(mod_name) is not None:
+      showWarning("Build Running", f"{mod_name} is already being built, wait for it to finish first", False)
+      return
+    session = FastExportSession(self.config, targets, mod_name)
+    self.last_build = ([(target.blend, target.asset_path) for target in targets], mod_name)
+    if self.watcher.watching():
+      self.watcher.watch([blend for blend, _ in self.last_build[0]])
+
+    for idx in reversed(range(self.build_list.topLevelItemCount())):
+      if self.build_list.topLevelItem(idx).text(0) == session.mod_name:
+        self.build_list.takeTopLevelItem(idx)
+    item = QtWidgets.QTreeWidgetItem(self.build_list, [session.mod_name, "starting"])
+    item.setExpanded(True)
+    self.build_list.setVisible(True)
+
+    if len(self.builds) == 0:
+      self.setWorking(True)
+    self.builds[session.signals] = BuildRow(session, item, quiet)
+    session.signals.error.connect(self.handleExportError)
+    session.signals.cancelled.connect(self.handleExportCancelled)
+    session.signals.stages.connect(self.handleExportStages)
+    session.signals.progress.connect(self.handleExportProgress)
+    session.signals.note.connect(self.handleExportNote)
+    session.signals.finished.connect(self.handleExportFinished)
+    QtCore.QThreadPool.globalInstance().start(session)
 
   @QtCore.Slot()
   def export(self):
-    # ----- Config Validation
-      session = FastExportSession(self.config, self.target_field, self.char_field, self.mod_field)
-      self.setWorking(True)
-      session.signals.error.connect(self.handleExportError)
-      session.signals.progress.connect(self.handleExportProgress)
-      session.signals.finished.connect(self.handleExportFinished)
-      QtCore.QThreadPool.globalInstance().start(session)
+    targets = singleTarget(self.target_field, self.char_field)
+    if (mod_name := self.modName()) is None: return
+    self.startSession(targets, mod_name)
+
+  @QtCore.Slot()
+  def exportBatch(self):
+    if not (rcode := self.batch_field.updateValue()):
+      showWarning("Bad Batch Spec", f"Please verify your batch spec:\n{rcode.value}", False)
+      return
+    try:
+      targets = loadBatchSpec(self.batch_field.value)
+    except Exception as error:
+      showWarning("Bad Batch Spec", str(error), False)
+      return
+    if (mod_name := self.modName()) is None: return
+    self.startSession(targets, mod_name)
+
+  @QtCore.Slot()
+  def showHistory(self):
+    if not self.config.work_field.updateValue():
+      showWarning("Bad Config", "Please set your working directory first", False)
+      return
+    report = BuildHistory(self.config.work().joinpath(BUILD_HISTORY)).report()
+
+    dialog = QtWidgets.QDialog(self)
+    dialog.setWindowTitle("Build History")
+    text = QtWidgets.QPlainTextEdit(report)
+    text.setReadOnly(True)
+    text.setFont(QtGui.QFontDatabase.systemFont(QtGui.QFontDatabase.SystemFont.FixedFont))
+    text.setLineWrapMode(QtWidgets.QPlainTextEdit.LineWrapMode.NoWrap)
+    layout = QtWidgets.QVBoxLayout(dialog)
+    layout.addWidget(text)
+    dialog.resize(760, 420)
+    dialog.exec()
+
+  # ----- Watch Mode -----
+  @QtCore.Slot()
+  def toggleWatch(self, checked:bool):
+    self.watch_pending = False
+    if not checked:
+      self.watcher.stop()
+      return
+    # nothing built yet this session, so watch what One-Click would build
+    if self.last_build is None:
+      try:
+        targets = singleTarget(self.target_field, self.char_field)
+      except Exception as error:
+        showWarning("Bad Target", str(error), False)
+        self.watch_box.setChecked(False)
+        return
+      if (mod_name := self.modName()) is None:
+        self.watch_box.setChecked(False)
+        return
+      self.last_build = ([(target.blend, target.asset_path) for target in targets], mod_name)
+    self.watcher.watch([blend for blend, _ in self.last_build[0]])
+
+  @QtCore.Slot()
+  def rebuildWatched(self):
+    if self.last_build is None: return
+    # a build of stale files is wasted work, the new save supersedes it
+    if (row := self.runningBuild(self.last_build[1])) is not None:
+      row.session.cancel()
+      self.watch_pending = True
+      return
+    self.startWatched()
+
+  def startWatched(self):
+    pairs, mod_name = self.last_build
+    try:
+      self.startSession([BuildTarget(blend, asset_path) for blend, asset_path in pairs], mod_name, quiet=True)
+    except Exception as error:
+      showWarning("Rebuild Failed", str(error), False)
       
+  def finishBuild(self, status:str) -> Optional[BuildRow]:
+    if (row := self.builds.pop(self.sender(), None)) is None: return None
+    row.item.setText(1, status)
+    # started before going idle, so mods are not restored and stashed again in between
+    if self.watch_pending and self.runningBuild(self.last_build[1]) is None:
+      self.watch_pending = False
+      self.startWatched()
+    if len(self.builds) == 0:
+      self.setWorking(False)
+    self.updateProgress()
+    return row
+
   @QtCore.Slot()
   def handleExportError(self, msg:str):
-    showWarning("Export Failed", msg, False)
-    self.setWorking(False)
+    if (row := self.finishBuild(STAGE_FAILED)) is None: return
+    showWarning("Export Failed", f"{row.session.mod_name}: {msg}", False)
+
+  @QtCore.Slot()
+  def handleExportCancelled(self):
+    self.finishBuild(BUILD_CANCELLED)
+
+  @QtCore.Slot()
+  def handleExportStages(self, stages:List[Tuple[str,str]]):
+    if (row := self.builds.get(self.sender())) is None: return
+    row.item.setText(1, "running")
+    for name, label in stages:
+      row.stage_items[name] = QtWidgets.QTreeWidgetItem(row.item, [label, "waiting"])
+    self.build_list.resizeColumnToContents(0)
+    self.updateProgress()
+
+  @QtCore.Slot()
+  def handleExportProgress(self, stage:str, msg:str):
+    if (row := self.builds.get(self.sender())) is None: return
+    if (item := row.stage_items.get(stage)) is None: return
+    item.setText(1, msg)
+    self.updateProgress()
 
   @QtCore.Slot()
-  def handleExportProgress(self, step:int, msg:str):
-    self.progress.setValue(step)
-    self.state.setText(msg)
+  def handleExportNote(self, stage:str, msg:str):
+    if (row := self.builds.get(self.sender())) is None: return
+    if (item := row.stage_items.get(stage)) is None: return
+    item.setText(2, msg)
 
   @QtCore.Slot()
   def handleExportFinished(self, result:Path):
-    showWarning("Success", f"Successfully exported to: {result}", False)
-    self.setWorking(False)
\ No newline at end of file
+    if (row := self.finishBuild(STAGE_DONE)) is None or row.quiet: return
+    showWarning("Success", f"Successfully exported to: {result}", False)
\ No newline at end of file
@@ -0,0 +1,215 @@
+""" Pulls a few paths out of a large json file without loading it, everything else is skipped as text
+
+Ue4Export dumps of skeletal meshes are mostly vertex and index data that the Fast
+Package never reads. Skipped values only cost a regex scan, no Python objects are
+built for them, so peak memory depends on the chunk size and not on the mesh.
+"""
+from pathlib import Path
+from typing import Any, Dict, List, Tuple, Union, IO, Optional
+from array import array
+from itertools import accumulate
+import json, re
+
+CHUNK_SIZE = 1 << 16
+# containers longer than this are skipped by counting brackets a window at a time rather than one at a time
+FAST_SKIP = 4096
+BULK_WINDOW = 1 << 16
+WILDCARD = "*"
+
+PathPart = Union[str, int]
+JsonPath = Tuple[PathPart, ...]
+
+WHITESPACE = re.compile(r'[ \t\n\r]*')
+# text up to the next bracket, strings included whole so brackets inside them don't count
+SKIP_TEXT = re.compile(r'[^"\[\]{}]*(?:"(?:[^"\\]|\\.)*"[^"\[\]{}]*)*')
+STRING = re.compile(r'"((?:[^"\\]|\\.)*)"')
+# brackets to signed bytes, +1 opens and -1 closes, every other byte dropped
+BRACKET_STEPS = bytes.maketrans(b"[{]}", b"\x01\x01\xff\xff")
+NOT_BRACKETS = bytes(set(range(256)) - set(b"[{]}"))
+SCALAR = re.compile(r'[^,\]}\s]+')
+
+class JsonStream:
+  """ A read position in a json text that is only partly in memory """
+  def __init__(self, handle:IO[str], chunk_size:int=CHUNK_SIZE):
+    self.handle, self.chunk_size = handle, chunk_size
+    self.buf, self.pos = "", 0
+    # file offset of buf[0]
+    self.base = 0
+    self.eof = False
+    # start of the value being captured, the buffer keeps everything from there on
+    self.capture:Optional[int] = None
+
+  def fill(self) -> bool:
+    """ Reads the next chunk, False at the end of the file """
+    if self.eof: return False
+    data = self.handle.read(self.chunk_size)
+    if len(data) == 0:
+      self.eof = True
+      return False
+    drop = self.pos if self.capture is None else self.capture
+    self.buf = self.buf[drop:] + data
+    self.base += drop
+    self.pos -= drop
+    if self.capture is not None: self.capture -= drop
+    return True
+
+  def error(self, msg:str) -> ValueError:
+    return ValueError(f"Bad json: {msg}")
+
+  def peek(self) -> str:
+    """ The next character that isn't whitespace, empty at the end of the file """
+    while True:
+      self.pos = WHITESPACE.match(self.buf, self.pos).end()
+      if self.pos < len(self.buf): return self.buf[self.pos]
+      if not self.fill(): return ""
+
+  def expect(self, char:str):
+    if self.peek() != char:
+      raise self.error(f"expected '{char}' at offset {self.base + self.pos}")
+    self.pos += 1
+
+  def match(self, pattern:re.Pattern) -> re.Match:
+    """ A match that doesn't run into the end of the buffer, reading on until it doesn't """
+    while True:
+      found = pattern.match(self.buf, self.pos)
+      if found is not None and found.end() < len(self.buf): return found
+      if not self.fill():
+        if found is None: raise self.error(f"unexpected text at offset {self.base + self.pos}")
+        return found
+
+  def string(self) -> str:
+    self.peek()
+    found = self.match(STRING)
+    self.pos = found.end()
+    return json.loads(found.group(0))
+
+  def bulkWindow(self) -> Optional[Tuple[int, str]]:
+    """ The end of the next window and its text outside of strings, None where escapes make splitting on quotes unsafe """
+    window = self.buf[self.pos:self.pos + BULK_WINDOW]
+    if "\\" in window: return None
+    parts = window.split('"')
+    # an even count means the last string runs past the window, which then ends at its quote
+    if len(parts) % 2 == 0:
+      window = window[:len(window) - len(parts.pop()) - 1]
+    if len(window) == 0: return None
+    return self.pos + len(window), "".join(parts[0::2])
+
+  def skipContainer(self):
+    self.pos += 1
+    depth = 1
+    # file offset up to which brackets are counted one at a time
+    exact_until = self.base + self.pos + FAST_SKIP
+    while depth > 0:
+      # bulk data: the window's brackets are summed in C, unless the container ends inside it
+      if self.base + self.pos >= exact_until and (outside := self.bulkWindow()) is not None:
+        end, text = outside
+        steps = array('b', text.encode().translate(BRACKET_STEPS, NOT_BRACKETS))
+        if min(accumulate(steps, initial=depth)) > 0:
+          depth += sum(steps)
+          self.pos = end
+          continue
+        exact_until = self.base + end
+
+      self.pos = SKIP_TEXT.match(self.buf, self.pos).end()
+      # a string cut off by the end of the buffer stops the scan at its quote
+      if self.pos == len(self.buf) or self.buf[self.pos] == '"':
+        if not self.fill(): raise self.error("unterminated string or container")
+        continue
+      char = self.buf[self.pos]
+      self.pos += 1
+      depth += 1 if char in "[{" else -1
+
+  def skip(self):
+    char = self.peek()
+    if char in "[{":
+      self.skipContainer()
+    elif char == '"':
+      self.pos = self.match(STRING).end()
+    elif char == "":
+      raise self.error("unexpected end of file")
+    else:
+      self.pos = self.match(SCALAR).end()
+
+  def value(self) -> Any:
+    """ The next value as Python objects, only used for the small values being extracted """
+    self.peek()
+    self.capture = self.pos
+    try:
+      self.skip()
+      return json.loads(self.buf[self.capture:self.pos])
+    finally:
+      self.capture = None
+
+  def separator(self, close:str) -> bool:
+    """ Consumes a ',' and returns True, or the closing bracket and returns False """
+    char = self.peek()
+    self.pos += 1
+    if char == ",": return True
+    if char == close: return False
+    raise self.error(f"expected ',' or '{close}' at offset {self.base + self.pos - 1}")
+
+def resolve(value:Any, rest:JsonPath) -> List[Any]:
+  """ The values at rest below an already loaded value, matched as walk matches them in the text """
+  if len(rest) == 0: return [value]
+  part, below = rest[0], rest[1:]
+  if isinstance(value, dict):
+    return resolve(value[part], below) if isinstance(part, str) and part in value else []
+  if isinstance(value, list):
+    if part == WILDCARD: return [found for item in value for found in resolve(item, below)]
+    if isinstance(part, int) and 0 <= part < len(value): return resolve(value[part], below)
+  return []
+
+def walk(stream:JsonStream, paths:List[Tuple[JsonPath, JsonPath]], results:Dict[JsonPath, List[Any]]):
+  """ paths pairs each requested path with what is left of it below the current value """
+  if any(len(rest) == 0 for _, rest in paths):
+    # the value is loaded whole for the paths ending here, longer ones through it are read from that
+    value = stream.value()
+    for path, rest in paths:
+      results[path].extend(resolve(value, rest))
+    return
+
+  char = stream.peek()
+  if char == "{":
+    stream.pos += 1
+    if stream.peek() == "}":
+      stream.pos += 1
+      return
+    while True:
+      key = stream.string()
+      stream.expect(":")
+      below = [(path, rest[1:]) for path, rest in paths if rest[0] == key]
+      if len(below) > 0:
+        walk(stream, below, results)
+      else:
+        stream.skip()
+      if not stream.separator("}"): return
+  elif char == "[":
+    stream.pos += 1
+    if stream.peek() == "]":
+      stream.pos += 1
+      return
+    idx = 0
+    while True:
+      below = [(path, rest[1:]) for path, rest in paths if rest[0] == WILDCARD or rest[0] == idx]
+      if len(below) > 0:
+        walk(stream, below, results)
+      else:
+        stream.skip()
+      if not stream.separator("]"): return
+      idx += 1
+  else:
+    # a scalar where the paths expected a container, nothing below it can match
+    stream.skip()
+
+def extractPaths(json_path:Path, paths:List[JsonPath], chunk_size:int=CHUNK_SIZE) -> Dict[JsonPath, List[Any]]:
+  """ Every value at each path in document order, a path part is a key, an index or WILDCARD for every index
+
+  e.g. ("Materials", WILDCARD, "ObjectName") gives the name of every material.
+  """
+  results:Dict[JsonPath, List[Any]] = { path: [] for path in paths }
+  with open(json_path, encoding="utf-8") as handle:
+    stream = JsonStream(handle, chunk_size)
+    walk(stream, [(path, path) for path in paths], results)
+    if stream.peek() != "":
+      raise stream.error(f"trailing data at offset {stream.base + stream.pos}")
+  return results
@@ -0,0 +1,123 @@
+""" Reads the export table of cooked UE 4.25 packages, the part of a .uasset umodel -list prints """
+from typing import List, Tuple
+import struct
+
+PACKAGE_TAG = 0x9E2A83C1
+# the newest legacy version 4.25 writes, older ones lay the summary out differently
+LEGACY_VERSION_UE4_25 = -7
+# files cooked unversioned carry 0 and are read as the engine that cooked them
+UE4_VERSION_4_25 = 518
+VER_UE4_64BIT_EXPORTMAP_SERIALSIZES = 511
+VER_UE4_TEMPLATE_INDEX_IN_COOKED_EXPORTS = 508
+VER_UE4_NAME_HASHES_SERIALIZED = 504
+VER_UE4_SERIALIZE_TEXT_IN_PACKAGES = 459
+VER_UE4_ADDED_PACKAGE_SUMMARY_LOCALIZATION_ID = 516
+PKG_FILTER_EDITOR_ONLY = 0x80000000
+
+INT32 = struct.Struct("<i")
+CUSTOM_VERSION_SIZE = 20
+
+# (index, serial offset, serial size, class name, object name), as the columns of a umodel listing
+ExportRow = Tuple[int, int, int, str, str]
+
+class PackageError(ValueError):
+  pass
+
+class PackageHeader:
+  def __init__(self, data:bytes):
+    self.data, self.pos = data, 0
+
+  def int32(self) -> int:
+    if self.pos + 4 > len(self.data):
+      raise PackageError("package header is truncated")
+    value = INT32.unpack_from(self.data, self.pos)[0]
+    self.pos += 4
+    return value
+
+  def unpack(self, fmt:struct.Struct) -> tuple:
+    if self.pos + fmt.size > len(self.data):
+      raise PackageError("package header is truncated")
+    values = fmt.unpack_from(self.data, self.pos)
+    self.pos += fmt.size
+    return values
+
+  def fstring(self) -> str:
+    length = self.int32()
+    if length == 0: return ""
+    if length > 0:
+      value = self.data[self.pos:self.pos+length-1].decode("latin-1")
+      self.pos += length
+    else:
+      value = self.data[self.pos:self.pos-2*length-2].decode("utf-16-le")
+      self.pos += -2*length
+    if self.pos > len(self.data):
+      raise PackageError("package header is truncated")
+    return value
+
+def fname(names:List[str], index:int, number:int) -> str:
+  if not 0 <= index < len(names):
+    raise PackageError(f"name {index} is outside the name map")
+  return names[index] if number == 0 else f"{names[index]}_{number - 1}"
+
+def readExports(data:bytes) -> List[ExportRow]:
+  """ The export rows of a package from its .uasset alone, the export data itself lives in the .uexp """
+  header = PackageHeader(data)
+  if header.int32() & 0xFFFFFFFF != PACKAGE_TAG:
+    raise PackageError("not a package, the tag is missing")
+  legacy = header.int32()
+  if legacy != LEGACY_VERSION_UE4_25:
+    raise PackageError(f"legacy version {legacy} is not the one UE 4.25 writes")
+  header.int32() # legacy UE3 version
+  version = header.int32() or UE4_VERSION_4_25
+  header.int32() # licensee version
+  custom_versions = header.int32()
+  header.pos += custom_versions * CUSTOM_VERSION_SIZE
+  header.int32() # total header size
+  header.fstring() # folder name
+  package_flags = header.int32() & 0xFFFFFFFF
+  name_count, name_offset = header.int32(), header.int32()
+  if version >= VER_UE4_ADDED_PACKAGE_SUMMARY_LOCALIZATION_ID and not package_flags & PKG_FILTER_EDITOR_ONLY:
+    header.fstring() # localization id
+  if version >= VER_UE4_SERIALIZE_TEXT_IN_PACKAGES:
+    header.pos += 8 # gatherable text data count and offset
+  export_count, export_offset = header.int32(), header.int32()
+  import_count, import_offset = header.int32(), header.int32()
+  if min(name_count, export_count, import_count) < 0:
+    raise PackageError("negative table size")
+
+  header.pos = name_offset
+  names = []
+  for _ in range(name_count):
+    names.append(header.fstring())
+    if version >= VER_UE4_NAME_HASHES_SERIALIZED:
+      header.pos += 4 # case preserving and case insensitive hashes
+
+  # class package, class name and outer come before the object name, an imported class is named by the latter
+  import_entry = struct.Struct("<20xii")
+  header.pos = import_offset
+  imports = [fname(names, *header.unpack(import_entry)) for _ in range(import_count)]
+
+  # class, super, template, outer, name and number, flags, size, offset; the rest are dependency fields
+  serial = "qq" if version >= VER_UE4_64BIT_EXPORTMAP_SERIALSIZES else "ii"
+  template = "i" if version >= VER_UE4_TEMPLATE_INDEX_IN_COOKED_EXPORTS else ""
+  export_entry = struct.Struct(f"<ii{template}iiiI{serial}iii16xIiiiiiii")
+  header.pos = export_offset
+  raw_exports = [header.unpack(export_entry) for _ in range(export_count)]
+  outer_at = 3 if template else 2
+  exports:List[Tuple[int, str, int, int]] = [
+    (row[0], fname(names, row[outer_at + 1], row[outer_at + 2]), row[outer_at + 4], row[outer_at + 5]) for row in raw_exports
+  ]
+
+  rows:List[ExportRow] = []
+  for idx, (class_index, name, size, offset) in enumerate(exports):
+    # negative indices are imports, positive ones exports, both counted from 1
+    if class_index < 0:
+      if -class_index > len(imports): raise PackageError(f"import {-class_index} is outside the import map")
+      class_name = imports[-class_index - 1]
+    elif class_index > 0:
+      if class_index > len(exports): raise PackageError(f"export {class_index} is outside the export map")
+      class_name = exports[class_index - 1][1]
+    else:
+      class_name = "Class"
+    rows.append((idx, offset, size, class_name, name))
+  return rows
@@ -0,0 +1,222 @@
+""" Reader for UE4 pak files up to version 9 (4.25), used to list game files without umodel """
+from pathlib import Path
+from typing import Optional, List, Dict, Tuple
+import mmap, struct, zlib, fnmatch, threading, re
+
+from . import Aes
+
+PAK_MAGIC = 0x5A6F12E1
+
+PAK_VERSION_INITIAL = 1
+PAK_VERSION_COMPRESSION_ENCRYPTION = 3
+PAK_VERSION_RELATIVE_CHUNK_OFFSETS = 5
+PAK_VERSION_ENCRYPTION_KEY_GUID = 7
+PAK_VERSION_FNAME_COMPRESSION = 8
+PAK_VERSION_FROZEN_INDEX = 9
+PAK_VERSION_PATH_HASH_INDEX = 10
+
+COMPRESSION_NAME_LEN = 32
+ENTRY_FLAG_ENCRYPTED = 0x01
+ENTRY_FLAG_DELETED = 0x02
+
+INT32 = struct.Struct("<i")
+ENTRY_SIZES = struct.Struct("<qqq")
+UINT32 = struct.Struct("<I")
+BLOCK = struct.Struct("<qq")
+
+class PakError(Exception):
+  pass
+
+class PakEntry:
+  __slots__ = ("path", "offset", "size", "uncompressed_size", "compression", "hash", "blocks", "flags", "block_size")
+  def __init__(self, path:str):
+    self.path = path
+    self.offset = self.size = self.uncompressed_size = 0
+    self.compression:Optional[str] = None
+    self.hash = b""
+    self.blocks:List[Tuple[int,int]] = []
+    self.flags = 0
+    self.block_size = 0
+
+  @property
+  def encrypted(self) -> bool:
+    return bool(self.flags & ENTRY_FLAG_ENCRYPTED)
+
+class PakInfo:
+  """ The fixed size footer at the end of every pak """
+  def __init__(self, encrypted_index:bool, version:int, index_offset:int, index_size:int, index_hash:bytes, compression:List[str], frozen:bool=False):
+    self.encrypted_index, self.version, self.frozen = encrypted_index, version, frozen
+    self.index_offset, self.index_size, self.index_hash = index_offset, index_size, index_hash
+    self.compression = compression
+
+  @staticmethod
+  def footerSizes():
+    # (size, has key guid, has frozen flag, compression name count), newest layouts first
+    return [(222, True, True, 5), (221, True, False, 5), (189, True, False, 4), (61, True, False, 0), (45, False, False, 0)]
+
+  @staticmethod
+  def parse(data) -> 'PakInfo':
+    for size, has_guid, has_frozen, name_count in PakInfo.footerSizes():
+      if len(data) < size: continue
+      pos = len(data) - size + (16 if has_guid else 0)
+      encrypted, magic, version, index_offset, index_size = struct.unpack_from("<BIiqq", data, pos)
+      if magic != PAK_MAGIC: continue
+      if has_frozen != (version == PAK_VERSION_FROZEN_INDEX): continue
+      if (name_count > 0) != (version >= PAK_VERSION_FNAME_COMPRESSION): continue
+      pos += 25
+      index_hash = bytes(data[pos:pos+20])
+      frozen = has_frozen and data[pos+20] != 0
+      pos += 20 + (1 if has_frozen else 0)
+      names = []
+      for _ in range(name_count):
+        raw = bytes(data[pos:pos+COMPRESSION_NAME_LEN]).split(b"\0")[0]
+        if len(raw) > 0: names.append(raw.decode())
+        pos += COMPRESSION_NAME_LEN
+      return PakInfo(bool(encrypted), version, index_offset, index_size, index_hash, names, frozen)
+    raise PakError("Pak footer not found, this may not be a pak file")
+
+class PakIndexReader:
+  def __init__(self, data:bytes, version:int, compression:List[str]):
+    self.data, self.pos, self.version, self.compression = data, 0, version, compression
+
+  def int32(self) -> int:
+    value = INT32.unpack_from(self.data, self.pos)[0]
+    self.pos += 4
+    return value
+
+  def fstring(self) -> str:
+    length = self.int32()
+    if length == 0: return ""
+    if length > 0:
+      value = self.data[self.pos:self.pos+length-1].decode("latin-1")
+      self.pos += length
+    else:
+      value = self.data[self.pos:self.pos-2*length-2].decode("utf-16-le")
+      self.pos += -2*length
+    return value
+
+  def entry(self, path:str) -> PakEntry:
+    entry = PakEntry(path)
+    entry.offset, entry.size, entry.uncompressed_size = ENTRY_SIZES.unpack_from(self.data, self.pos)
+    self.pos += 24
+    method = UINT32.unpack_from(self.data, self.pos)[0]
+    self.pos += 4
+    if self.version >= PAK_VERSION_FNAME_COMPRESSION:
+      entry.compression = self.compression[method-1] if 0 < method <= len(self.compression) else (None if method == 0 else f"Unknown{method}")
+    else:
+      entry.compression = "Zlib" if method & 0x01 else None
+    if self.version <= PAK_VERSION_INITIAL:
+      self.pos += 8 # timestamp
+    entry.hash = self.data[self.pos:self.pos+20]
+    self.pos += 20
+    if self.version >= PAK_VERSION_COMPRESSION_ENCRYPTION:
+      if method != 0:
+        count = self.int32()
+        entry.blocks = [BLOCK.unpack_from(self.data, self.pos + 16*idx) for idx in range(count)]
+        self.pos += 16*count
+      entry.flags = self.data[self.pos]
+      entry.block_size = UINT32.unpack_from(self.data, self.pos + 1)[0]
+      self.pos += 5
+    return entry
+
+def cleanMountPoint(mount:str) -> str:
+  """ '../../../RED/Content/' style mount points become '/RED/Content/' like umodel paths """
+  while mount[:3] == "../":
+    mount = mount[3:]
+  return "/" + mount.lstrip("/")
+
+class PakFile:
+  """ A parsed pak index, the pak is only memory mapped while reading from it
+
+  Nothing is kept open between reads so the game can still be patched while we run.
+  """
+  def __init__(self, path:Path, aes_key:Optional[bytes]=None):
+    self.path, self.aes_key = path, aes_key
+    with self.mapped() as pak_map:
+      self.info = PakInfo.parse(pak_map[-256:])
+      if self.info.version >= PAK_VERSION_PATH_HASH_INDEX:
+        raise PakError(f"Pak version {self.info.version} is newer than UE 4.25 and not supported")
+      # a frozen index is a memory image of the engine's index structures, not the serialized entry list
+      if self.info.frozen:
+        raise PakError(f"{path.name} has a frozen index, which is not supported")
+      index = pak_map[self.info.index_offset:self.info.index_offset + self.info.index_size]
+
+    if len(index) != self.info.index_size:
+      raise PakError(f"{path.name} is truncated, its index runs past the end of the file")
+    if self.info.encrypted_index:
+      index = self.decrypt(index)
+    reader = PakIndexReader(index, self.info.version, self.info.compression)
+    self.mount_point = reader.fstring()
+    prefix = cleanMountPoint(self.mount_point)
+    self.entries:List[PakEntry] = []
+    for _ in range(reader.int32()):
+      self.entries.append(reader.entry(prefix + reader.fstring()))
+
+  def mapped(self) -> mmap.mmap:
+    with open(self.path, 'rb') as handle:
+      return mmap.mmap(handle.fileno(), 0, access=mmap.ACCESS_READ)
+
+  def decrypt(self, data:bytes) -> bytes:
+    if self.aes_key is None:
+      raise PakError(f"{self.path.name} is encrypted, but no AES key was given")
+    return Aes.decryptECB(self.aes_key, data)
+
+  def headerSize(self, entry:PakEntry) -> int:
+    """ Every payload is preceded by a copy of its index entry """
+    size = 24 + 4 + 20
+    if self.info.version <= PAK_VERSION_INITIAL: size += 8
+    if self.info.version >= PAK_VERSION_COMPRESSION_ENCRYPTION:
+      if entry.compression is not None: size += 4 + 16*len(entry.blocks)
+      size += 5
+    return size
+
+  def read(self, entry:PakEntry) -> bytes:
+    """ The decrypted, decompressed payload of one entry """
+    align = lambda size: size if not entry.encrypted else (size + Aes.BLOCK_SIZE - 1) // Aes.BLOCK_SIZE * Aes.BLOCK_SIZE
+    if entry.compression is not None and entry.compression.lower() != "zlib":
+      raise PakError(f"{entry.path} uses unsupported compression {entry.compression}")
+
+    with self.mapped() as pak_map:
+      if entry.compression is None:
+        start = entry.offset + self.headerSize(entry)
+        raw = pak_map[start:start + align(entry.size)]
+        return (self.decrypt(raw) if entry.encrypted else raw)[:entry.size]
+
+      base = entry.offset if self.info.version >= PAK_VERSION_RELATIVE_CHUNK_OFFSETS else 0
+      parts = []
+      for start, end in entry.blocks:
+        raw = pak_map[base + start:base + start + align(end - start)]
+        if entry.encrypted: raw = self.decrypt(raw)
+        # encrypted blocks carry padding after the zlib stream
+        parts.append(zlib.decompressobj().decompress(raw))
+      return b"".join(parts)
+
+# ----- Game Wide Listing -----
+pak_cache:Dict[Tuple[str,int,int,Optional[bytes]], PakFile] = {}
+pak_cache_lock = threading.Lock()
+
+def openPak(path:Path, aes_key:Optional[bytes]) -> PakFile:
+  """ Parsed paks are kept for the session and reparsed only when the file changes """
+  stat = path.stat()
+  key = (path.as_posix(), stat.st_size, stat.st_mtime_ns, aes_key)
+  with pak_cache_lock:
+    if key not in pak_cache:
+      pak_cache[key] = PakFile(path, aes_key)
+    return pak_cache[key]
+
+def listGameFiles(pak_dir:Path, aes:str, pattern:str="*") -> Dict[str, Tuple[PakFile, PakEntry]]:
+  """ Every file matching pattern across all paks, later paks (patches, mods) override earlier ones """
+  aes_key = Aes.parseKey(aes)
+  matcher = re.compile(fnmatch.translate(pattern), re.IGNORECASE).match
+  results:Dict[str, Tuple[PakFile, PakEntry]] = {}
+  # patch paks (_P suffix) mount over the base game regardless of name
+  for pak_path in sorted(pak_dir.rglob("*.pak"), key=lambda pak: (pak.stem[-2:] == "_P", pak.as_posix())):
+    pak = openPak(pak_path, aes_key)
+    for entry in pak.entries:
+      # a patch deletes a file by listing it with the deleted flag
+      if entry.flags & ENTRY_FLAG_DELETED:
+        results.pop(entry.path, None)
+        continue
+      if matcher(entry.path):
+        results[entry.path] = (pak, entry)
+  return results
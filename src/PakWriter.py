@@ -0,0 +1,123 @@
+""" Writer for unencrypted, zlib compressed UE4 paks that 4.25 mounts, used instead of launching UnrealPak """
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Optional, List, Tuple
+import hashlib, os, struct, zlib, logging
+
+from .PakReader import PakFile, PakEntry, PakError, PAK_MAGIC, PAK_VERSION_FNAME_COMPRESSION, COMPRESSION_NAME_LEN, INT32, ENTRY_SIZES, UINT32, BLOCK
+
+logger = logging.getLogger(__name__)
+
+# bump whenever the output changes, build cache keys include it
+PAK_WRITER_VERSION = 2
+
+MOUNT_POINT = "../../../"
+COMPRESSION_BLOCK_SIZE = 64 * 1024
+COMPRESSION_NAMES = ["Zlib"]
+COMPRESSION_SLOTS = 5
+ZLIB_METHOD = 1 # index into COMPRESSION_NAMES, counted from 1
+
+def fstring(value:str) -> bytes:
+  """ ANSI when every character is ASCII, otherwise UTF-16 with the length negated, as UE writes an FString """
+  if value.isascii():
+    raw = value.encode("ascii") + b"\0"
+    return INT32.pack(len(raw)) + raw
+  raw = value.encode("utf-16-le") + b"\0\0"
+  return INT32.pack(-(len(raw) // 2)) + raw
+
+class PendingFile:
+  """ One file going into the pak, its blocks compressed on the pool """
+  def __init__(self, name:str, data:bytes):
+    self.name, self.data = name, data
+    self.blocks:List[bytes] = []
+
+  def compressed(self) -> bool:
+    # UnrealPak stores files raw when compression would not make them smaller
+    return len(self.blocks) > 0 and sum(len(block) for block in self.blocks) < len(self.data)
+
+def serializeEntry(entry:PakEntry, method:int) -> bytes:
+  raw = ENTRY_SIZES.pack(entry.offset, entry.size, entry.uncompressed_size) + UINT32.pack(method) + entry.hash
+  if method != 0:
+    raw += INT32.pack(len(entry.blocks)) + b"".join(BLOCK.pack(start, end) for start, end in entry.blocks)
+  return raw + bytes([entry.flags]) + UINT32.pack(entry.block_size)
+
+def headerSize(block_count:int) -> int:
+  """ Matches PakFile.headerSize for this writer's version """
+  return 24 + 4 + 20 + (4 + 16*block_count if block_count > 0 else 0) + 5
+
+def collectFiles(root:Path) -> List[Tuple[str, Path]]:
+  """ Every file below root by its pak name, sorted so the same tree always gives the same pak """
+  return sorted((path.relative_to(root).as_posix(), path) for path in root.rglob("*") if path.is_file())
+
+def writePak(root:Path, pak_path:Path, mount_point:str=MOUNT_POINT, max_workers:Optional[int]=None):
+  """ Packs every file below root, block compression runs on a thread pool since zlib releases the GIL
+
+  The pak is written beside pak_path and renamed over it once complete.
+  """
+  files = [PendingFile(name, path.read_bytes()) for name, path in collectFiles(root)]
+  jobs = [
+    (pending, pending.data[start:start + COMPRESSION_BLOCK_SIZE])
+    for pending in files for start in range(0, len(pending.data), COMPRESSION_BLOCK_SIZE)
+  ]
+  with ThreadPoolExecutor(max_workers or os.cpu_count() or 1, thread_name_prefix="PakWriter") as pool:
+    # map keeps job order, so each file's blocks come back in sequence
+    for (pending, _), block in zip(jobs, pool.map(lambda job: zlib.compress(job[1]), jobs)):
+      pending.blocks.append(block)
+
+  temp_path = pak_path.with_name(pak_path.name + ".new")
+  index = [fstring(mount_point), INT32.pack(len(files))]
+  try:
+    with open(temp_path, 'wb') as pak_file:
+      for pending in files:
+        entry = PakEntry(pending.name)
+        entry.offset = pak_file.tell()
+        entry.uncompressed_size = len(pending.data)
+        if pending.compressed():
+          method = ZLIB_METHOD
+          payload = b"".join(pending.blocks)
+          entry.block_size = min(COMPRESSION_BLOCK_SIZE, len(pending.data))
+          # block offsets are relative to the entry, past the header that precedes the payload
+          block_start = headerSize(len(pending.blocks))
+          for block in pending.blocks:
+            entry.blocks.append((block_start, block_start + len(block)))
+            block_start += len(block)
+        else:
+          method = 0
+          payload = pending.data
+        entry.size = len(payload)
+        entry.hash = hashlib.sha1(payload).digest()
+
+        # the header copy has a zero offset, only the index records where the entry is
+        header = PakEntry(pending.name)
+        header.size, header.uncompressed_size, header.hash = entry.size, entry.uncompressed_size, entry.hash
+        header.blocks, header.block_size = entry.blocks, entry.block_size
+        pak_file.write(serializeEntry(header, method))
+        pak_file.write(payload)
+        index.append(fstring(pending.name) + serializeEntry(entry, method))
+
+      index_data = b"".join(index)
+      index_offset = pak_file.tell()
+      pak_file.write(index_data)
+      names = b"".join(name.encode().ljust(COMPRESSION_NAME_LEN, b"\0") for name in COMPRESSION_NAMES)
+      pak_file.write(
+        bytes(16) # encryption key guid
+        + struct.pack("<BIiqq", 0, PAK_MAGIC, PAK_VERSION_FNAME_COMPRESSION, index_offset, len(index_data))
+        + hashlib.sha1(index_data).digest()
+        + names.ljust(COMPRESSION_NAME_LEN * COMPRESSION_SLOTS, b"\0")
+      )
+    os.replace(temp_path, pak_path)
+  finally:
+    temp_path.unlink(missing_ok=True)
+  logger.info(f"Wrote {pak_path.name}: {len(files)} files, {len(jobs)} blocks")
+
+def checkPak(root:Path, pak_path:Path):
+  """ Reads the pak back and compares every entry to the file it was made from """
+  pak = PakFile(pak_path)
+  expected = collectFiles(root)
+  if len(pak.entries) != len(expected):
+    raise PakError(f"{pak_path.name} has {len(pak.entries)} entries, expected {len(expected)}")
+  for entry, (name, path) in zip(pak.entries, expected):
+    if not entry.path.endswith("/" + name):
+      raise PakError(f"{pak_path.name} lists {entry.path} where {name} was expected")
+    if pak.read(entry) != path.read_bytes():
+      raise PakError(f"{entry.path} in {pak_path.name} does not match {path}")
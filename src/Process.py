@@ -1,14 +1,41 @@
-from typing import Optional, List, Union, TypeVar, Generic
-import subprocess, logging
+from typing import Optional, List, Union, TypeVar, Generic, Callable, Deque, IO
+from collections import deque
+from pathlib import Path
+import subprocess, logging, threading, time, json, os, sys
 
 T = TypeVar('T')
 Buffer = Union[str,bytes]
+LineFunc = Callable[[str],None]
+
+STREAM_TAIL_LINES = 200
+USAGE_SAMPLE_INTERVAL = 0.25
+WATCH_INTERVAL = 0.1
+# a killed tool's children can keep its pipes open, their output is abandoned after this long
+READER_JOIN_TIMEOUT = 5.0
+HAS_PROC = os.path.isdir("/proc/self")
 
 logger = logging.getLogger(__name__)
 
+class ProcessUsage:
+  """ Resources consumed by a child process and the descendants it waited for """
+  def __init__(self):
+    self.wall = 0.0
+    self.user_cpu = 0.0
+    self.system_cpu = 0.0
+    self.peak_rss = 0
+    self.read_bytes = 0
+    self.write_bytes = 0
+
+  def asDict(self):
+    return dict(self.__dict__)
+
+  def __str__(self):
+    return (f"wall {self.wall:.2f}s, cpu {self.user_cpu:.2f}s user {self.system_cpu:.2f}s sys, "
+            f"peak rss {self.peak_rss // (1024*1024)}MB, io {self.read_bytes // 1024}KB read {self.write_bytes // 1024}KB written")
+
 class ReturnCode(Generic[T]):
-  def __init__(self, success:bool, value:Optional[T]=None):
-    self.success, self.value = success, value
+  def __init__(self, success:bool, value:Optional[T]=None, usage:Optional[ProcessUsage]=None):
+    self.success, self.value, self.usage = success, value, usage
   def __bool__(self):
     return self.success
   def __call__(self):
@@ -31,33 +58,269 @@ def makeProcLog(header:str, stdout:Buffer,stderr:Buffer):
   ])
   return stdout, logmsg
 
-def runProcess(options:Union[List[str],str], returnOut:bool = True, timeout:Optional[float]=None) -> ReturnCode[str]:
-  """ Invokes a sub-process with automated logging """
+# ----- Resource Accounting -----
+metrics_path:Optional[Path] = None
+metrics_lock = threading.Lock()
+
+def setMetricsFile(path:Optional[Path]):
+  """ Every process run is appended to this file as one json line """
+  global metrics_path
+  metrics_path = path
+
+def recordUsage(label:str, success:bool, usage:ProcessUsage):
+  logger.info(f"Process usage ({label}): {usage}")
+  if metrics_path is None: return
+  entry = usage.asDict()
+  entry.update(time=time.time(), label=label, success=success)
+  try:
+    with metrics_lock, open(metrics_path, 'a') as metrics:
+      metrics.write(json.dumps(entry) + "\n")
+  except OSError as error:
+    logger.error(f"Failed to write process metrics: {error}")
+
+def procTree(root:int) -> List[int]:
+  pids, idx = [root], 0
+  while idx < len(pids):
+    try:
+      for task in os.listdir(f"/proc/{pids[idx]}/task"):
+        with open(f"/proc/{pids[idx]}/task/{task}/children") as children:
+          pids += [int(pid) for pid in children.read().split()]
+    except OSError:
+      pass
+    idx += 1
+  return pids
+
+def procRSS(pid:int) -> int:
+  try:
+    with open(f"/proc/{pid}/statm") as statm:
+      return int(statm.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+  except (OSError, IndexError, ValueError):
+    return 0
+
+def procIO(pid:int, usage:ProcessUsage):
+  try:
+    with open(f"/proc/{pid}/io") as io:
+      fields = dict(line.split(":") for line in io.read().splitlines())
+    usage.read_bytes = int(fields["rchar"])
+    usage.write_bytes = int(fields["wchar"])
+  except (OSError, KeyError, ValueError):
+    pass
+
+def windowsUsage(proc:subprocess.Popen, usage:ProcessUsage):
+  import ctypes
+  from ctypes import wintypes
+  class IOCounters(ctypes.Structure):
+    _fields_ = [(name, ctypes.c_ulonglong) for name in (
+      "ReadOperationCount", "WriteOperationCount", "OtherOperationCount",
+      "ReadTransferCount", "WriteTransferCount", "OtherTransferCount")]
+  class MemoryCounters(ctypes.Structure):
+    _fields_ = [("cb", wintypes.DWORD), ("PageFaultCount", wintypes.DWORD)] + [(name, ctypes.c_size_t) for name in (
+      "PeakWorkingSetSize", "WorkingSetSize", "QuotaPeakPagedPoolUsage", "QuotaPagedPoolUsage",
+      "QuotaPeakNonPagedPoolUsage", "QuotaNonPagedPoolUsage", "PagefileUsage", "PeakPagefileUsage")]
+
+  kernel32 = ctypes.windll.kernel32
+  handle = wintypes.HANDLE(int(proc._handle)) # type: ignore
+  created, exited, kernel, user = (ctypes.c_ulonglong() for _ in range(4))
+  if kernel32.GetProcessTimes(handle, ctypes.byref(created), ctypes.byref(exited), ctypes.byref(kernel), ctypes.byref(user)):
+    usage.user_cpu, usage.system_cpu = user.value / 1e7, kernel.value / 1e7
+  io = IOCounters()
+  if kernel32.GetProcessIoCounters(handle, ctypes.byref(io)):
+    usage.read_bytes, usage.write_bytes = io.ReadTransferCount, io.WriteTransferCount
+  memory = MemoryCounters()
+  memory.cb = ctypes.sizeof(MemoryCounters)
+  if kernel32.K32GetProcessMemoryInfo(handle, ctypes.byref(memory), memory.cb):
+    usage.peak_rss = memory.PeakWorkingSetSize
+
+class UsageMonitor:
+  """ Waits on a child, sampling its process tree and collecting rusage on exit """
+  def __init__(self, proc:subprocess.Popen, cancel:Optional[threading.Event]=None):
+    self.proc = proc
+    self.cancel = cancel
+    self.usage = ProcessUsage()
+    self.started = time.monotonic()
+    self.done = threading.Event()
+    self.exited = threading.Event()
+    self.killed = threading.Event()
+    if HAS_PROC:
+      threading.Thread(target=self.sample, daemon=True).start()
+
+  def sample(self):
+    while not self.done.wait(USAGE_SAMPLE_INTERVAL):
+      rss = sum(procRSS(pid) for pid in procTree(self.proc.pid))
+      self.usage.peak_rss = max(self.usage.peak_rss, rss)
+
+  def kill(self):
+    self.killed.set()
+    if hasattr(os, "wait4"):
+      # Popen.kill would poll and could reap the child before wait4 does
+      os.kill(self.proc.pid, 9)
+    else:
+      self.proc.kill()
+
+  def expired(self, deadline:Optional[float]) -> bool:
+    cancelled = self.cancel is not None and self.cancel.is_set()
+    return cancelled or (deadline is not None and time.monotonic() > deadline)
+
+  def watch(self, timeout:Optional[float]):
+    deadline = None if timeout is None else time.monotonic() + timeout
+    while not self.exited.wait(WATCH_INTERVAL):
+      if self.expired(deadline):
+        self.kill()
+        return
+
+  def pollPosix(self, timeout:Optional[float]):
+    """ Without waitid the child can't be waited on unreaped, so the poll that reaps it also does the watchdog's job """
+    deadline = None if timeout is None else time.monotonic() + timeout
+    while True:
+      reaped, status, rusage = os.wait4(self.proc.pid, os.WNOHANG)
+      if reaped == self.proc.pid:
+        return status, rusage
+      if not self.killed.is_set() and self.expired(deadline):
+        self.kill()
+      time.sleep(WATCH_INTERVAL)
+
+  def waitPosix(self, watchdog:Optional[threading.Thread], timeout:Optional[float]):
+    pid = self.proc.pid
+    if hasattr(os, "waitid"):
+      os.waitid(os.P_PID, pid, os.WEXITED | os.WNOWAIT)
+      # the zombie's io counters still include every descendant it reaped
+      if HAS_PROC: procIO(pid, self.usage)
+      # the watchdog must be finished before the pid is reaped and can be reused
+      self.exited.set()
+      if watchdog is not None: watchdog.join()
+      _, status, rusage = os.wait4(pid, 0)
+    else:
+      status, rusage = self.pollPosix(timeout)
+      self.exited.set()
+
+    self.proc.returncode = -os.WTERMSIG(status) if os.WIFSIGNALED(status) else os.WEXITSTATUS(status)
+
+    self.usage.user_cpu, self.usage.system_cpu = rusage.ru_utime, rusage.ru_stime
+    maxrss = rusage.ru_maxrss if sys.platform == "darwin" else rusage.ru_maxrss * 1024
+    self.usage.peak_rss = max(self.usage.peak_rss, maxrss)
+    if self.usage.read_bytes == 0 and self.usage.write_bytes == 0:
+      self.usage.read_bytes, self.usage.write_bytes = rusage.ru_inblock * 512, rusage.ru_oublock * 512
+
+  def wait(self, timeout:Optional[float]) -> Optional[int]:
+    """ Returns the exit code, or None if the process was killed for timing out or cancellation """
+    watchdog = None
+    polling = hasattr(os, "wait4") and not hasattr(os, "waitid")
+    if (timeout is not None or self.cancel is not None) and not polling:
+      watchdog = threading.Thread(target=self.watch, args=(timeout,), daemon=True)
+      watchdog.start()
+    try:
+      if hasattr(os, "wait4"):
+        self.waitPosix(watchdog, timeout)
+      else:
+        self.proc.wait()
+        self.exited.set()
+        if watchdog is not None: watchdog.join()
+        try:
+          windowsUsage(self.proc, self.usage)
+        except Exception as error:
+          logger.error(f"Failed to collect process usage: {error}")
+    finally:
+      self.done.set()
+      self.usage.wall = time.monotonic() - self.started
+    return None if self.killed.is_set() else self.proc.returncode
+
+# ----- Output Handling -----
+def readLines(stream:IO[bytes], on_line:Optional[LineFunc], tail:Deque[str]):
+  """ Drains a pipe line by line, keeping only a bounded tail of it """
+  for raw in iter(stream.readline, b''):
+    line = raw.decode(errors="replace").rstrip("\r\n")
+    tail.append(line)
+    if on_line is None: continue
+    try:
+      on_line(line)
+    except Exception as error:
+      # the pipe must keep draining or the child will block on a full buffer
+      logger.error(f"Line callback failed: {error}")
+  stream.close()
+
+def readAll(stream:IO[bytes], chunks:List[bytes]):
+  chunks.append(stream.read())
+  stream.close()
+
+def processLabel(options:Union[List[str],str]) -> str:
+  command = options if isinstance(options, str) else str(options[0])
+  return Path(command.strip().split(" ")[0].strip('"')).stem
+
+def runProcess(options:Union[List[str],str], returnOut:bool = True, timeout:Optional[float]=None,
+               onStdout:Optional[LineFunc]=None, onStderr:Optional[LineFunc]=None, tailLines:Optional[int]=None,
+               label:Optional[str]=None, cancel:Optional[threading.Event]=None) -> ReturnCode[str]:
+  """ Invokes a sub-process with automated logging and resource accounting
+
+  Passing a line callback or tailLines switches to streaming mode: output is read
+  incrementally, each line is handed to its callback as it arrives, and only the
+  last tailLines lines of each stream are kept for the log and the return value.
+  Setting the cancel event kills the process and fails the call.
+  """
 
   logger.info(f"runProcess: {str(options)}")
+  streaming = onStdout is not None or onStderr is not None or tailLines is not None
   try:
-    proc_info = subprocess.run(options, stdout=subprocess.PIPE, stderr=subprocess.PIPE, timeout=timeout)
-  except subprocess.TimeoutExpired:
-    logger.error(f"Process timed out after {timeout} seconds")
-    return ReturnCode(False)
+    proc = subprocess.Popen(options, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
   except Exception as error:
     logger.error(f"Process failed with unexpected error:")
     logger.error(error)
     return ReturnCode(False)
 
-  if proc_info.returncode != 0: 
-    header = "Process returned with non zero exit code"
-    _, logmsg = makeProcLog(header, proc_info.stdout, proc_info.stderr)
+  if streaming:
+    stdout_tail:Deque[str] = deque(maxlen=tailLines or STREAM_TAIL_LINES)
+    stderr_tail:Deque[str] = deque(maxlen=tailLines or STREAM_TAIL_LINES)
+    readers = [
+      threading.Thread(target=readLines, args=(proc.stdout, onStdout, stdout_tail), daemon=True),
+      threading.Thread(target=readLines, args=(proc.stderr, onStderr, stderr_tail), daemon=True),
+    ]
+  else:
+    stdout_chunks:List[bytes] = []
+    stderr_chunks:List[bytes] = []
+    readers = [
+      threading.Thread(target=readAll, args=(proc.stdout, stdout_chunks), daemon=True),
+      threading.Thread(target=readAll, args=(proc.stderr, stderr_chunks), daemon=True),
+    ]
+  for reader in readers: reader.start()
+
+  monitor = UsageMonitor(proc, cancel)
+  returncode = monitor.wait(timeout)
+  join_deadline = time.monotonic() + READER_JOIN_TIMEOUT
+  for reader in readers:
+    reader.join(max(0.0, join_deadline - time.monotonic()) if returncode is None else None)
+  if any(reader.is_alive() for reader in readers):
+    logger.error(f"Output of killed process still held open by its children, abandoning it: {str(options)}")
+  usage = monitor.usage
+  recordUsage(label or processLabel(options), returncode == 0, usage)
+
+  if streaming:
+    stdout, stderr = "\n".join(stdout_tail), "\n".join(stderr_tail)
+    suffix = ", output tail:"
+  else:
+    stdout, stderr = b"".join(stdout_chunks), b"".join(stderr_chunks)
+    suffix = ""
+
+  if returncode is None and cancel is not None and cancel.is_set():
+    logger.info(f"Process cancelled: {str(options)}")
+    return ReturnCode(False, usage=usage)
+
+  if returncode is None:
+    _, logmsg = makeProcLog(f"Process timed out after {timeout} seconds{suffix}", stdout, stderr)
     logger.error(logmsg)
-    return ReturnCode(False)
-  
-  stdout = None
+    return ReturnCode(False, usage=usage)
+
+  if returncode != 0:
+    header = f"Process returned with non zero exit code{suffix}"
+    _, logmsg = makeProcLog(header, stdout, stderr)
+    logger.error(logmsg)
+    return ReturnCode(False, usage=usage)
+
+  clean_stdout = None
   if logger.isEnabledFor(logging.INFO):
-    header = "Process returned successfully"
-    stdout, logmsg = makeProcLog(header, proc_info.stdout, proc_info.stderr)
+    header = f"Process returned successfully{suffix}"
+    clean_stdout, logmsg = makeProcLog(header, stdout, stderr)
     logger.info( logmsg )
-  
-  if returnOut and stdout is None: 
-    stdout = cleanSTD(proc_info.stdout)
-  
-  return ReturnCode(True, stdout)
+
+  if returnOut and clean_stdout is None:
+    clean_stdout = cleanSTD(stdout)
+
+  return ReturnCode(True, clean_stdout, usage)
@@ -0,0 +1,223 @@
+from typing import Optional, List, Union, Dict, Tuple
+from concurrent.futures import Future, TimeoutError as FutureTimeout
+import threading, logging, os, sys, time
+
+from .Process import runProcess, ReturnCode
+
+logger = logging.getLogger(__name__)
+
+TOOL_UMODEL="umodel"
+TOOL_NOESIS="noesis"
+TOOL_UE4EXP="ue4export"
+TOOL_BLENDER="blender"
+TOOL_UNREAL="unreal"
+TOOL_PAK="unrealpak"
+
+CPU_COUNT = os.cpu_count() or 1
+
+# concurrent instances allowed per tool, fast package builds each have their own unreal project and pak staging
+DEFAULT_SLOTS = {
+  TOOL_UMODEL: max(1, CPU_COUNT // 2),
+  TOOL_NOESIS: CPU_COUNT,
+  TOOL_UE4EXP: max(1, CPU_COUNT // 2),
+  TOOL_BLENDER: 1,
+  TOOL_UNREAL: max(1, CPU_COUNT // 4),
+  TOOL_PAK: max(1, CPU_COUNT // 2),
+}
+HEAVY_TOOLS = {TOOL_BLENDER, TOOL_UNREAL}
+DEFAULT_MIN_FREE_MB = 2048
+ADMIT_POLL = 1.0
+
+def freeMemoryMB() -> Optional[int]:
+  """ Available physical memory, None when the platform can't tell us """
+  if sys.platform == "win32":
+    import ctypes
+    class MemoryStatus(ctypes.Structure):
+      _fields_ = [
+        ("dwLength", ctypes.c_ulong), ("dwMemoryLoad", ctypes.c_ulong),
+        ("ullTotalPhys", ctypes.c_ulonglong), ("ullAvailPhys", ctypes.c_ulonglong),
+        ("ullTotalPageFile", ctypes.c_ulonglong), ("ullAvailPageFile", ctypes.c_ulonglong),
+        ("ullTotalVirtual", ctypes.c_ulonglong), ("ullAvailVirtual", ctypes.c_ulonglong),
+        ("ullAvailExtendedVirtual", ctypes.c_ulonglong),
+      ]
+    status = MemoryStatus()
+    status.dwLength = ctypes.sizeof(MemoryStatus)
+    if not ctypes.windll.kernel32.GlobalMemoryStatusEx(ctypes.byref(status)):
+      return None
+    return status.ullAvailPhys // (1024*1024)
+
+  try:
+    with open("/proc/meminfo") as meminfo:
+      for line in meminfo:
+        if line[:13] == "MemAvailable:":
+          return int(line.split()[1]) // 1024
+  except OSError:
+    pass
+  return None
+
+class ToolJob:
+  def __init__(self, tool:str, options:Union[List[str],str], heavy:bool, kwargs:dict, lease:bool=False):
+    self.tool, self.options, self.heavy, self.kwargs = tool, options, heavy, kwargs
+    # a lease only holds the slot, whoever acquired it runs the tool and releases it
+    self.lease = lease
+    self.future:'Future[ReturnCode[str]]' = Future()
+    self.started:Optional[float] = None
+
+  def describe(self) -> str:
+    return self.options if isinstance(self.options, str) else " ".join(str(x) for x in self.options)
+
+class ToolScheduler:
+  """ Runs external tools with per-tool slot limits, holding heavy jobs back while memory is low """
+  def __init__(self, slots:Optional[Dict[str,int]]=None, min_free_mb:int=DEFAULT_MIN_FREE_MB):
+    self.slots = dict(DEFAULT_SLOTS)
+    if slots is not None: self.slots.update(slots)
+    self.min_free_mb = min_free_mb
+
+    self.cond = threading.Condition()
+    self.queued:List[ToolJob] = []
+    self.running:List[ToolJob] = []
+    # resident tool processes (workers) by id, listed with the running jobs but holding no slot while idle
+    self.residents:Dict[int, Tuple[str, str, float]] = {}
+    self.dispatcher = threading.Thread(target=self.dispatch, daemon=True, name="ToolScheduler")
+    self.dispatcher.start()
+
+  def setSlots(self, tool:str, count:int):
+    with self.cond:
+      self.slots[tool] = max(1, count)
+      self.cond.notify_all()
+
+  def setMinFreeMemory(self, min_free_mb:int):
+    with self.cond:
+      self.min_free_mb = min_free_mb
+      self.cond.notify_all()
+
+  def submit(self, tool:str, options:Union[List[str],str], heavy:Optional[bool]=None, **kwargs) -> 'Future[ReturnCode[str]]':
+    """ Queues a runProcess call, kwargs are passed through to it """
+    kwargs.setdefault("label", tool)
+    job = ToolJob(tool, options, tool in HEAVY_TOOLS if heavy is None else heavy, kwargs)
+    with self.cond:
+      self.queued.append(job)
+      self.cond.notify_all()
+    return job.future
+
+  def run(self, tool:str, options:Union[List[str],str], returnOut:bool=True, **kwargs) -> ReturnCode[str]:
+    return self.submit(tool, options, returnOut=returnOut, **kwargs).result()
+
+  def acquire(self, tool:str, label:str, heavy:Optional[bool]=None, cancel:Optional[threading.Event]=None) -> Optional[ToolJob]:
+    """ Waits for a slot of tool for work done outside of runProcess, None if cancelled first. Pass the result to release """
+    job = ToolJob(tool, label, tool in HEAVY_TOOLS if heavy is None else heavy, {}, lease=True)
+    with self.cond:
+      self.queued.append(job)
+      self.cond.notify_all()
+    while True:
+      try:
+        job.future.result(ADMIT_POLL)
+        return job
+      except FutureTimeout:
+        pass
+      if cancel is not None and cancel.is_set():
+        if job.future.cancel():
+          with self.cond:
+            if job in self.queued: self.queued.remove(job)
+          return None
+        # admitted in the meantime, give it straight back
+        job.future.result()
+        self.release(job)
+        return None
+
+  def release(self, job:ToolJob):
+    with self.cond:
+      self.running.remove(job)
+      self.cond.notify_all()
+
+  def addResident(self, key:int, tool:str, command:str):
+    with self.cond:
+      self.residents[key] = (tool, command, time.monotonic())
+
+  def removeResident(self, key:int):
+    with self.cond:
+      self.residents.pop(key, None)
+
+  def queueDepth(self, tool:Optional[str]=None) -> int:
+    with self.cond:
+      return sum(1 for job in self.queued if tool is None or job.tool == tool)
+
+  def runningJobs(self) -> List[Tuple[str, str, float]]:
+    """ (tool, command, seconds running) for every job currently holding a slot, and every resident worker """
+    now = time.monotonic()
+    with self.cond:
+      jobs = [(job.tool, job.describe(), now - (job.started or now)) for job in self.running if not job.lease]
+      return jobs + [(tool, command, now - started) for tool, command, started in self.residents.values()]
+
+  # ----- Dispatching -----
+  def canStart(self, job:ToolJob, free_mb:Optional[int]) -> bool:
+    in_use = sum(1 for other in self.running if other.tool == job.tool)
+    if in_use >= self.slots.get(job.tool, 1):
+      return False
+    if job.heavy and free_mb is not None and free_mb < self.min_free_mb:
+      # never stall completely, an idle machine always gets one heavy job
+      return not any(other.heavy for other in self.running)
+    return True
+
+  def dropCancelled(self):
+    """ Fails queued jobs whose cancel event is set, as runProcess fails a cancelled call, so the tool never starts """
+    for job in list(self.queued):
+      cancel = job.kwargs.get("cancel")
+      if cancel is None or not cancel.is_set(): continue
+      self.queued.remove(job)
+      if job.future.set_running_or_notify_cancel():
+        logger.info(f"Cancelled before starting: {job.describe()}")
+        job.future.set_result(ReturnCode(False))
+
+  def dispatch(self):
+    while True:
+      with self.cond:
+        if len(self.queued) == 0:
+          self.cond.wait()
+          continue
+
+        self.dropCancelled()
+        free_mb = freeMemoryMB() if any(job.heavy for job in self.queued) else None
+        blocked = set()
+        heavy_started = False
+        for job in list(self.queued):
+          # jobs of one tool are admitted in submission order
+          if job.tool in blocked: continue
+          # one heavy admission per pass so the memory reading can catch up
+          if not self.canStart(job, free_mb) or (job.heavy and heavy_started):
+            blocked.add(job.tool)
+            continue
+          self.queued.remove(job)
+          if not job.future.set_running_or_notify_cancel():
+            continue
+          job.started = time.monotonic()
+          self.running.append(job)
+          if job.lease:
+            job.future.set_result(ReturnCode(True))
+          else:
+            threading.Thread(target=self.execute, args=(job,), daemon=True).start()
+          heavy_started = heavy_started or job.heavy
+
+        self.cond.wait(ADMIT_POLL)
+
+  def execute(self, job:ToolJob):
+    try:
+      job.future.set_result(runProcess(job.options, **job.kwargs))
+    except Exception as error:
+      logger.error(f"Scheduled {job.tool} job failed with unexpected error:")
+      logger.error(error)
+      job.future.set_exception(error)
+    finally:
+      with self.cond:
+        self.running.remove(job)
+        self.cond.notify_all()
+
+_scheduler:Optional[ToolScheduler] = None
+_scheduler_lock = threading.Lock()
+
+def getScheduler() -> ToolScheduler:
+  global _scheduler
+  with _scheduler_lock:
+    if _scheduler is None:
+      _scheduler = ToolScheduler()
+    return _scheduler
@@ -0,0 +1,99 @@
+""" Runs build stages as a dependency graph, each starts as soon as the stages producing its inputs finish """
+from concurrent.futures import ThreadPoolExecutor, Future, wait, FIRST_COMPLETED
+from typing import Optional, List, Dict, Set, Callable, Iterable
+import threading, logging
+
+logger = logging.getLogger(__name__)
+
+STAGE_RUNNING="running"
+STAGE_DONE="done"
+STAGE_FAILED="failed"
+STAGE_SKIPPED="skipped"
+
+StateFunc = Callable[[str, str], None]
+
+class Stage:
+  def __init__(self, name:str, label:str, func:Callable[[], None], inputs:Iterable[str], outputs:Iterable[str]):
+    self.name, self.label, self.func = name, label, func
+    self.inputs, self.outputs = list(inputs), list(outputs)
+
+class StageGraph:
+  """ Stages declare the named artifacts they read and write, the edges follow from those
+
+  Every input must be the output of exactly one stage. After a failure or once cancel
+  is set nothing new starts, stages already running are waited for and the first
+  error is raised.
+  """
+  def __init__(self):
+    self.stages:Dict[str, Stage] = {}
+
+  def add(self, name:str, label:str, func:Callable[[], None], inputs:Iterable[str]=(), outputs:Iterable[str]=()) -> Stage:
+    if name in self.stages:
+      raise ValueError(f"Stage {name} was added twice")
+    stage = Stage(name, label, func, inputs, outputs)
+    self.stages[name] = stage
+    return stage
+
+  def dependencies(self) -> Dict[str, Set[str]]:
+    producers:Dict[str, str] = {}
+    for stage in self.stages.values():
+      for output in stage.outputs:
+        if output in producers:
+          raise ValueError(f"{output} is produced by both {producers[output]} and {stage.name}")
+        producers[output] = stage.name
+
+    deps:Dict[str, Set[str]] = {}
+    for stage in self.stages.values():
+      for needed in stage.inputs:
+        if needed not in producers:
+          raise ValueError(f"Stage {stage.name} needs {needed}, which no stage produces")
+      deps[stage.name] = set(producers[needed] for needed in stage.inputs)
+
+    # peel off stages without unmet dependencies, anything left over is a cycle
+    remaining = { name: set(needs) for name, needs in deps.items() }
+    while (ready := [name for name, needs in remaining.items() if len(needs) == 0]):
+      for name in ready:
+        del remaining[name]
+      for needs in remaining.values():
+        needs.difference_update(ready)
+    if len(remaining) > 0:
+      raise ValueError(f"Stages {', '.join(sorted(remaining))} depend on each other")
+    return deps
+
+  def order(self) -> List[Stage]:
+    return list(self.stages.values())
+
+  def run(self, on_state:Optional[StateFunc]=None, max_workers:Optional[int]=None, cancel:Optional[threading.Event]=None):
+    deps = self.dependencies()
+    notify = on_state or (lambda name, state: None)
+    waiting = { name: set(needs) for name, needs in deps.items() }
+    running:Dict[Future, str] = {}
+    first_error:Optional[BaseException] = None
+
+    with ThreadPoolExecutor(max_workers or max(1, len(self.stages)), thread_name_prefix="Stage") as pool:
+      while True:
+        if first_error is None and not (cancel is not None and cancel.is_set()):
+          for name in [name for name, needs in waiting.items() if len(needs) == 0]:
+            del waiting[name]
+            notify(name, STAGE_RUNNING)
+            running[pool.submit(self.stages[name].func)] = name
+        if len(running) == 0:
+          break
+
+        finished, _ = wait(running, return_when=FIRST_COMPLETED)
+        for future in finished:
+          name = running.pop(future)
+          error = future.exception()
+          if error is not None:
+            logger.error(f"Stage {name} failed: {error}")
+            notify(name, STAGE_FAILED)
+            first_error = first_error or error
+            continue
+          notify(name, STAGE_DONE)
+          for needs in waiting.values():
+            needs.discard(name)
+
+    for name in waiting:
+      notify(name, STAGE_SKIPPED)
+    if first_error is not None:
+      raise first_error
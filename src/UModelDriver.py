@@ -1,34 +1,55 @@
-import re
 from pathlib import Path
-from typing import Optional, List, Dict
+from typing import Optional, List, Dict, Any, Tuple, Callable
+import threading, logging, re, os, shutil, tempfile, glob, zlib
 
 from . import Constants
-from .Process import runProcess
+from .Scheduler import getScheduler, TOOL_UMODEL
+from .AssetCache import ListingCache, pakFingerprint
+from .PakReader import PakFile, PakEntry, PakError, listGameFiles
+from .AssetListing import AssetListing, ListingParser
+from .PackageReader import readExports, PackageError
+from .AssetIndex import AssetIndex
+from .ContentStore import ContentStore
 from .ConfigView import ConfigWidget
 
-CLEAN_WHITESPACE = re.compile(r'\s+')
+logger = logging.getLogger(__name__)
 
 GETPACK_MSG = "getPackageObjects UModel Failed to Parse"
 EXPORT_MSG = "exportTarget UModel Failed to Parse"
 
-class Asset:
-  def __init__(self, desc:str):
-    parts = CLEAN_WHITESPACE.sub(" ", desc).strip(" ").split(" ")
-    self.index = int(parts[0])
-    self.offset = int(parts[1],16)
-    self.size = int(parts[2],16)
-    self.type = parts[3]
-    self.name = parts[4]
-class AssetFile:
-  def __init__(self, desc:str):
-    lines = desc.split("\n")
-    self.path = lines[0]
-    self.contents = [Asset(line) for line in lines[1:] if len(line) > 1]
-  def contains(self, desired_type:str):
-    for child in self.contents:
-      if child.type == desired_type:
-        return True
-    return False
+EXPORTED_LINE = re.compile(r'^Exporting (\w+) (\S+) to (.*)$')
+EXPORT_BATCH_SIZE = 32
+EXPORT_OPTIONS = ["-png"]
+# a mesh's data is split over these, any of them changing means a re-export
+PACKAGE_SUFFIXES = [".uasset", ".uexp", ".ubulk"]
+# meshes are unique per target and moved as is, everything else goes through the content store
+MESH_SUFFIXES = {".psk", ".pskx"}
+
+ExportedFunc = Callable[[str], None]
+
+def targetName(target:str) -> str:
+  """ The object name umodel reports for a package path """
+  return target.split("/")[-1].split(".")[0]
+
+def exportedMesh(out:Path, target:str) -> Path:
+  """ Where umodel writes the psk of a /RED/Content/... mesh target """
+  return out.joinpath("/".join(target.split("/")[3:])).with_suffix(".psk")
+
+MESH_BODY, MESH_HIGH, MESH_LOW, MESH_WEAPON, MESH_OTHER = "body", "high", "low", "weapon", "other"
+MESH_KINDS = [MESH_BODY, MESH_HIGH, MESH_LOW, MESH_WEAPON, MESH_OTHER]
+# what follows the character name in <char>_body.uasset, <char>_head_high.uasset, <char>_head_low.uasset and <char>_weapon<anything>
+MESH_SUFFIX = re.compile(r'_(?:(?P<weapon>weapon).*|(?P<body>body)\.uasset|(?P<high>head_high)\.uasset|(?P<low>head_low)\.uasset)$')
+MESH_GROUPS = { "weapon": MESH_WEAPON, "body": MESH_BODY, "high": MESH_HIGH, "low": MESH_LOW }
+
+def meshKind(char_name:str, mesh:str) -> str:
+  """ Which of a character's meshes a path is, character names differ in case between folder and file """
+  mesh_file = mesh.split("/")[-1]
+  if not mesh_file.lower().startswith(char_name.lower()):
+    return MESH_OTHER
+  found = MESH_SUFFIX.match(mesh_file, len(char_name))
+  if found is None:
+    return MESH_OTHER
+  return next(kind for group, kind in MESH_GROUPS.items() if found.group(group) is not None)
 
 class CharManifest:
   def __init__(self, char_name:str):
@@ -40,41 +61,135 @@ class CharManifest:
     self.other_meshes:List[str] = []
 
   def addMesh(self, mesh:str):
-    mesh_file = mesh.split("/")[-1]
-    if mesh_file[len(self.name):len(self.name)+7] == "_weapon":
+    kind = meshKind(self.name, mesh)
+    if kind == MESH_WEAPON:
       self.weapon_meshes.append(mesh)
-    elif mesh_file[len(self.name):] == "_body.uasset":
+    elif kind == MESH_BODY:
       self.body_mesh = mesh
-    elif mesh_file[len(self.name):] == "_head_high.uasset":
+    elif kind == MESH_HIGH:
       self.high_mesh = mesh
-    elif mesh_file[len(self.name):] == "_head_low.uasset":
+    elif kind == MESH_LOW:
       self.low_mesh = mesh
     else:
       self.other_meshes.append(mesh)
 
+  def meshes(self, kind:str) -> List[str]:
+    if kind == MESH_WEAPON: return self.weapon_meshes
+    if kind == MESH_OTHER: return self.other_meshes
+    single = { MESH_BODY: self.body_mesh, MESH_HIGH: self.high_mesh, MESH_LOW: self.low_mesh }[kind]
+    return [] if single is None else [single]
+
 class PackageManager:
   def __init__(self, config:ConfigWidget):
-    self.umodel = config.umodel.as_posix()
+    self.umodel = config.umodel().as_posix()
+    self.pak_dir, self.aes = config.pak(), config.aes()
+    self.native_listing = True
+    self.native_exports = True
+    self.staging = config.work().joinpath(Constants.EXPORT_STAGING)
+    self.store = ContentStore(config.work().joinpath(Constants.CONTENT_STORE))
     self.std_ops = [self.umodel, '', '-game=ue4.25', f'-path={config.pak().as_posix()}', f'-aes={config.aes()}']
+    self.cache = ListingCache(config.work().joinpath(Constants.LISTING_CACHE), pakFingerprint(config.pak(), config.aes()))
 
   def buildCommand(self, cmd:str, other:List[str]):
     options = self.std_ops + other
     options[1] = f"-{cmd}"
     return options
 
-  def getPackageObjects(self, obj:str) -> List[AssetFile]:
+  def getPackageEntries(self, pattern:str) -> Optional[Dict[str, Tuple[PakFile, PakEntry]]]:
+    """ Lists matching files straight from the pak indexes, None if they couldn't be read """
+    if not self.native_listing:
+      return None
+    try:
+      return listGameFiles(self.pak_dir, self.aes, pattern)
+    except (PakError, OSError, ValueError) as error:
+      logger.error(f"Native pak listing failed, falling back to umodel: {error}")
+      self.native_listing = False
+      return None
+
+  def sourceFingerprints(self, targets:List[str]) -> Dict[str,str]:
+    """ Per target hash of its pak entries, only changes when a patch touches that asset
+
+    Without a readable pak index every target falls back to the whole game fingerprint.
+    """
+    entries = self.getPackageEntries(f'{Constants.PAK_TOP}*')
+    results:Dict[str,str] = {}
+    for target in targets:
+      stem = target[:-len(PACKAGE_SUFFIXES[0])]
+      if entries is None or target not in entries:
+        results[target] = self.cache.fingerprint
+        continue
+      parts = []
+      for suffix in PACKAGE_SUFFIXES:
+        if (found := entries.get(stem + suffix)) is not None:
+          parts.append(f"{suffix}:{found[1].hash.hex()}:{found[1].size}")
+      results[target] = ";".join(parts)
+    return results
+
+  def readPackageObjects(self, entries:Dict[str, Tuple[PakFile, PakEntry]]) -> Optional[AssetListing]:
+    """ Export tables read from the .uassets in the paks, None if one couldn't be parsed """
+    if not self.native_exports:
+      return None
+    listing = AssetListing()
+    try:
+      for path in sorted(entries):
+        if Path(path).suffix.lower() not in (".uasset", ".umap"): continue
+        pak, entry = entries[path]
+        listing.addFile(path)
+        for row in readExports(pak.read(entry)):
+          listing.addExport(*row)
+    except (PackageError, PakError, OSError, zlib.error) as error:
+      logger.error(f"Native package listing failed, falling back to umodel: {error}")
+      self.native_exports = False
+      return None
+    return listing
+
+  def getPackageObjects(self, obj:str, cancel:Optional[threading.Event]=None) -> AssetListing:
+    """ Read from the pak indexes and package headers, umodel only lists what they can't """
+    cached = self.cache.get(obj)
+    if cached is not None:
+      return AssetListing.fromRecords(cached)
+
+    entries = self.getPackageEntries(obj)
+    if entries is not None and (listing := self.readPackageObjects(entries)) is not None:
+      self.cache.put(obj, listing.toRecords())
+      return listing
+
     options = self.buildCommand('list', [obj])
 
-    result = runProcess(options, True)
-    stdout = result()
-    if not result or stdout is None:
+    # parsed as umodel writes it, the full listing is never held as one string
+    parser = ListingParser()
+    result = getScheduler().run(TOOL_UMODEL, options, False, onStdout=parser.feed, cancel=cancel)
+    if not result or parser.malformed > 0:
       raise Exception(GETPACK_MSG)
-    
-    return [ AssetFile(chunk) for chunk in stdout.split("\n\n") if chunk[0:5] == "/RED/" ]
 
-  def getCharacterMeshes(self, char:str) -> List[str]:
-    asset_list = self.getPackageObjects(f'{Constants.PAK_TOP}{char}{Constants.MESH_PATH}*.uasset')
-    return [asset_file.path for asset_file in asset_list if asset_file.contains("SkeletalMesh")]
+    listing = parser.result()
+    self.cache.put(obj, listing.toRecords())
+    return listing
+
+  def getCharacterListing(self, char:str, cancel:Optional[threading.Event]=None) -> AssetListing:
+    return self.getPackageObjects(f'{Constants.PAK_TOP}{char}{Constants.MESH_PATH}*.uasset', cancel)
+
+  def getCharacterMeshes(self, char:str, cancel:Optional[threading.Event]=None) -> List[str]:
+    return self.getCharacterListing(char, cancel).withType("SkeletalMesh")
+
+  def getCharacterNames(self, cancel:Optional[threading.Event]=None) -> List[str]:
+    """ Discovery pass for sharding scans, read from the pak indexes when possible """
+    entries = self.getPackageEntries(f'{Constants.PAK_TOP}*{Constants.MESH_PATH}*.uasset')
+    if entries is not None:
+      return sorted(set(path.split("/")[4] for path in entries))
+
+    # every character has a body mesh, so listing only those is enough
+    listing = self.getPackageObjects(f'{Constants.PAK_TOP}*{Constants.MESH_PATH}*_body.uasset', cancel)
+    return sorted(set(path.split("/")[4] for path in listing.paths))
+
+  def getCharacterManifest(self, char:str, cancel:Optional[threading.Event]=None, index:Optional[AssetIndex]=None) -> CharManifest:
+    listing = self.getCharacterListing(char, cancel)
+    if index is not None:
+      index.addListing(listing)
+    manifest = CharManifest(char)
+    for mesh in listing.withType("SkeletalMesh"):
+      manifest.addMesh(mesh)
+    return manifest
 
   def getCharacterInfo(self) -> Dict[str, CharManifest]:
     asset_list = self.getCharacterMeshes('*')
@@ -89,13 +204,115 @@ class PackageManager:
   def dumpTarget(self, target:str):
     options = self.buildCommand('list', [target])
 
-    result = runProcess(options, True)
+    result = getScheduler().run(TOOL_UMODEL, options, True)
     stdout = result()
     if not result or stdout is None:
       raise Exception(EXPORT_MSG)
 
-  def exportTarget(self, out:Path, target:str):
-    options = self.buildCommand('export', ["-png", f"-out={out.as_posix()}", target])
+  def exportBatch(self, out:Path, batch:List[str], index:Optional[AssetIndex]=None, cancel:Optional[threading.Event]=None,
+                  onExported:Optional[ExportedFunc]=None) -> Dict[str,bool]:
+    """ One umodel run for every target in batch, their object names must be unique within it
+
+    onExported is called with each target as soon as its mesh is complete on disk,
+    while umodel is still working through the rest of the batch.
+    """
+    # umodel writes into a private staging dir, finished files are then moved into out
+    self.staging.mkdir(parents=True, exist_ok=True)
+    stage = Path(tempfile.mkdtemp(prefix="batch_", dir=self.staging))
+    options = self.buildCommand('export', EXPORT_OPTIONS + [f"-out={stage.as_posix()}", batch[0]] + [f"-pkg={target}" for target in batch[1:]])
+
+    by_name = { targetName(target): target for target in batch }
+    exported:Dict[str, List[Tuple[str,str]]] = { target: [] for target in batch }
+    written:Dict[str, List[Tuple[str,str]]] = { target: [] for target in batch }
+    status = { target: False for target in batch }
+    current:Optional[str] = None
+
+    def land(target:str):
+      if not exportedMesh(stage, target).exists(): return
+      for name, directory in written[target]:
+        self.placeExported(stage, out, name, directory)
+      status[target] = True
+      if index is not None: index.addReferences(target, exported[target])
+      if onExported is not None: onExported(target)
+
+    # umodel exports each mesh followed by what it references, e.g. its textures
+    def onLine(line:str):
+      nonlocal current
+      if (match := EXPORTED_LINE.match(line)) is None: return
+      type_name, name, directory = match.group(1), match.group(2), match.group(3)
+      if name in by_name:
+        if current is not None: land(current)
+        current = by_name[name]
+      elif current is not None:
+        exported[current].append((type_name, name))
+      if current is not None:
+        written[current].append((name, directory))
+
+    try:
+      result = getScheduler().run(TOOL_UMODEL, options, False, onStdout=onLine, cancel=cancel)
+      if result:
+        if current is not None: land(current)
+        # anything umodel wrote without reporting it
+        for file in [file for file in stage.rglob("*") if file.is_file()]:
+          self.placeFile(stage, out, file)
+      else:
+        # the mesh umodel was on when it died may be partial
+        logger.error(f"umodel export of {len(batch)} target(s) failed, keeping the ones it finished")
+    finally:
+      shutil.rmtree(stage, ignore_errors=True)
+    return status
+
+  def placeFile(self, stage:Path, out:Path, file:Path):
+    dest = out.joinpath(file.relative_to(stage))
+    if file.suffix.lower() in MESH_SUFFIXES:
+      dest.parent.mkdir(parents=True, exist_ok=True)
+      os.replace(file, dest)
+    else:
+      self.store.place(file, dest)
+
+  def placeExported(self, stage:Path, out:Path, name:str, directory:str):
+    """ Moves the files umodel reported for one object from stage into out """
+    folder = Path(directory.strip())
+    try:
+      folder.relative_to(stage)
+      files = folder.glob(glob.escape(name) + ".*")
+    except ValueError:
+      # not a path we recognise, look for the object anywhere in the batch
+      files = stage.rglob(glob.escape(name) + ".*")
+    for file in list(files):
+      if file.is_file():
+        self.placeFile(stage, out, file)
+
+  def exportTargets(self, out:Path, targets:List[str], index:Optional[AssetIndex]=None, cancel:Optional[threading.Event]=None,
+                    onExported:Optional[ExportedFunc]=None) -> Dict[str,bool]:
+    """ Exports targets in as few umodel runs as possible, returning per target success
+
+    Each run mounts the paks once for up to EXPORT_BATCH_SIZE targets. Targets a
+    batch failed to produce are retried alone, so one bad asset can't sink the others.
+    """
+    batches:List[List[str]] = []
+    for target in targets:
+      name = targetName(target)
+      home = next((batch for batch in batches if len(batch) < EXPORT_BATCH_SIZE and all(targetName(other) != name for other in batch)), None)
+      if home is None:
+        batches.append([target])
+      else:
+        home.append(target)
+
+    status:Dict[str,bool] = {}
+    for batch in batches:
+      if cancel is not None and cancel.is_set(): break
+      batch_status = self.exportBatch(out, batch, index, cancel, onExported)
+      status.update(batch_status)
+      if len(batch) == 1: continue
+      for target in [target for target, ok in batch_status.items() if not ok]:
+        if cancel is not None and cancel.is_set(): break
+        logger.info(f"Retrying export of {target} on its own")
+        status.update(self.exportBatch(out, [target], index, cancel, onExported))
+
+    for target in targets:
+      status.setdefault(target, False)
+    return status
 
-    result = runProcess(options)
-    return result.success
\ No newline at end of file
+  def exportTarget(self, out:Path, target:str, index:Optional[AssetIndex]=None) -> bool:
+    return self.exportTargets(out, [target], index)[target]
@@ -0,0 +1,188 @@
+from typing import Optional, List, Dict, Union
+import subprocess, threading, socket, json, logging, atexit, time
+
+from .Process import LineFunc
+from .Scheduler import getScheduler
+
+logger = logging.getLogger(__name__)
+
+PORT_TAG = "WORKER_PORT:"
+STARTUP_TIMEOUT = 300.0
+SHUTDOWN_TIMEOUT = 10.0
+# how often a job waiting on the worker checks for cancellation
+CANCEL_POLL = 0.5
+# a job without an answer for this long is taken as a hung tool
+JOB_TIMEOUT = 3600.0
+
+class WorkerError(Exception):
+  pass
+
+class WorkerCancelled(WorkerError):
+  pass
+
+class HookWorker:
+  """ A long lived tool process running one of our hooks in worker mode
+
+  The hook logs WORKER_PORT:<port> once it is listening on localhost, after which
+  jobs are exchanged as one json object per line. Everything else the tool prints is
+  relayed to the line callback of the job in flight.
+
+  Starting the worker and each job take a scheduler slot of its tool, so they are
+  admitted like a cold launch would be. An idle worker holds no slot but is listed
+  with the scheduler's running jobs.
+  """
+  def __init__(self, name:str, tool:str, command:Union[List[str],str]):
+    self.name, self.tool, self.command = name, tool, command
+    self.lock = threading.Lock()
+    self.proc:Optional[subprocess.Popen] = None
+    self.conn:Optional[socket.socket] = None
+    # received but not yet read, the socket is read with a timeout so cancels are seen
+    self.received = bytearray()
+    self.port:Optional[int] = None
+    self.port_ready = threading.Event()
+    self.on_line:Optional[LineFunc] = None
+
+  def alive(self) -> bool:
+    return self.proc is not None and self.proc.poll() is None
+
+  def relay(self, proc:subprocess.Popen):
+    assert proc.stdout is not None
+    for raw in iter(proc.stdout.readline, b''):
+      line = raw.decode(errors="replace").rstrip("\r\n")
+      # tools may prefix their log lines, so the tag can appear anywhere
+      if (tag_idx := line.find(PORT_TAG)) > -1:
+        self.port = int(line[tag_idx+len(PORT_TAG):].split()[0])
+        self.port_ready.set()
+        continue
+      logger.debug(f"{self.name} worker: {line}")
+      on_line = self.on_line
+      if on_line is None: continue
+      try:
+        on_line(line)
+      except Exception as error:
+        logger.error(f"Line callback failed: {error}")
+    # unblock a start() still waiting on a worker that died during startup
+    self.port_ready.set()
+
+  def start(self):
+    logger.info(f"Starting {self.name} worker: {self.command}")
+    self.port, self.port_ready = None, threading.Event()
+    self.proc = subprocess.Popen(self.command, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, stdin=subprocess.DEVNULL)
+    getScheduler().addResident(id(self), self.tool, f"{self.name} worker")
+    threading.Thread(target=self.relay, args=(self.proc,), daemon=True).start()
+
+    if not self.port_ready.wait(STARTUP_TIMEOUT) or self.port is None:
+      self.stop()
+      raise WorkerError(f"{self.name} worker failed to start")
+    self.conn = socket.create_connection(("127.0.0.1", self.port))
+    self.conn.settimeout(CANCEL_POLL)
+    self.received = bytearray()
+
+  def stop(self, kill:bool=False):
+    """ Asks the worker to shut down, or kills it straight away when it may be stuck in a job """
+    proc, self.proc = self.proc, None
+    if self.conn is not None:
+      if not kill:
+        try:
+          self.conn.sendall(b'{"shutdown": true}\n')
+        except OSError:
+          pass
+      self.conn.close()
+    self.conn = None
+    if proc is None: return
+    getScheduler().removeResident(id(self))
+    try:
+      if kill: proc.kill()
+      proc.wait(SHUTDOWN_TIMEOUT)
+    except subprocess.TimeoutExpired:
+      proc.kill()
+      proc.wait()
+
+  def readLine(self, cancel:Optional[threading.Event]) -> bytes:
+    assert self.conn is not None
+    deadline = time.monotonic() + JOB_TIMEOUT
+    while (end := self.received.find(b"\n")) < 0:
+      if cancel is not None and cancel.is_set():
+        raise WorkerCancelled(f"{self.name} worker job was cancelled")
+      if time.monotonic() > deadline:
+        raise WorkerError(f"{self.name} worker did not answer within {JOB_TIMEOUT:.0f} seconds")
+      try:
+        data = self.conn.recv(65536)
+      except socket.timeout:
+        continue
+      if len(data) == 0:
+        raise WorkerError(f"{self.name} worker closed the connection")
+      self.received += data
+    line = bytes(self.received[:end])
+    del self.received[:end+1]
+    return line
+
+  def exchange(self, job:dict, cancel:Optional[threading.Event]) -> dict:
+    assert self.conn is not None
+    self.conn.sendall((json.dumps(job) + "\n").encode())
+    return json.loads(self.readLine(cancel))
+
+  def acquireSlot(self, cancel:Optional[threading.Event]):
+    slot = getScheduler().acquire(self.tool, f"{self.name} worker", cancel=cancel)
+    if slot is None:
+      raise WorkerCancelled(f"{self.name} worker job was cancelled")
+    return slot
+
+  def warm(self, cancel:Optional[threading.Event]=None):
+    """ Starts the worker ahead of its first job, e.g. while inputs for that job are still being made """
+    with self.lock:
+      if self.alive() and self.conn is not None: return
+      slot = self.acquireSlot(cancel)
+      try:
+        self.start()
+      finally:
+        getScheduler().release(slot)
+
+  def request(self, job:dict, on_line:Optional[LineFunc]=None, cancel:Optional[threading.Event]=None) -> dict:
+    """ Runs one job, restarting the worker once if it crashed or hung up
+
+    Setting cancel kills the worker, a job can't be interrupted any other way.
+    """
+    with self.lock:
+      slot = self.acquireSlot(cancel)
+      self.on_line = on_line
+      try:
+        for attempt in range(2):
+          try:
+            if not self.alive() or self.conn is None:
+              self.start()
+            return self.exchange(job, cancel)
+          except WorkerCancelled:
+            self.stop(kill=True)
+            raise
+          except (OSError, ValueError, WorkerError) as error:
+            logger.error(f"{self.name} worker failed on attempt {attempt+1}: {error}")
+            self.stop()
+        raise WorkerError(f"{self.name} worker failed repeatedly, check the error log for details")
+      finally:
+        self.on_line = None
+        getScheduler().release(slot)
+
+workers:Dict[str, HookWorker] = {}
+workers_lock = threading.Lock()
+
+def getWorker(name:str, tool:str, command:Union[List[str],str]) -> HookWorker:
+  """ One shared worker per distinct command """
+  key = name + "\0" + (command if isinstance(command, str) else "\0".join(command))
+  with workers_lock:
+    if key not in workers:
+      workers[key] = HookWorker(name, tool, command)
+    return workers[key]
+
+@atexit.register
+def stopWorkers():
+  with workers_lock:
+    for worker in workers.values():
+      if worker.lock.acquire(timeout=SHUTDOWN_TIMEOUT):
+        try:
+          worker.stop()
+        finally:
+          worker.lock.release()
+      elif worker.proc is not None:
+        worker.proc.kill()
+    workers.clear()
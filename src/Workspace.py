@@ -0,0 +1,95 @@
+""" Per build working directories, so Fast Package builds can run side by side """
+from pathlib import Path
+from typing import Dict, Set, Optional
+import shutil, threading, logging
+
+from . import Constants
+from .Scheduler import getScheduler, TOOL_UNREAL
+
+logger = logging.getLogger(__name__)
+
+ACQUIRE_POLL = 0.5
+
+class Workspace:
+  """ Everything a build writes besides the caches and the dump: FBXs, Unreal project, pak staging and filelist """
+  def __init__(self, root:Path, slot:int):
+    self.root, self.slot = root, slot
+
+  def blenderRoot(self) -> Path:
+    return self.root.joinpath(Constants.FAST_BLENDER_OUT)
+  def unrealRoot(self) -> Path:
+    return self.root.joinpath(Constants.FAST_UE_OUT)
+  def unrealUproj(self) -> Path:
+    return self.root.joinpath(Constants.FAST_UE_OUT, f"{Constants.FAST_UE_OUT}.uproject")
+  def unrealContent(self) -> Path:
+    return self.root.joinpath(Constants.FAST_UE_OUT, "Content")
+  def unrealCooked(self) -> Path:
+    return self.root.joinpath(Constants.FAST_UE_OUT, f"Saved/Cooked/WindowsNoEditor/{Constants.FAST_UE_OUT}/Content")
+  def restoredRoot(self) -> Path:
+    """ Cooked files restored from the build cache, kept apart from the iterative cook's own output """
+    return self.root.joinpath("restored")
+  def pakRoot(self) -> Path:
+    return self.root.joinpath("paks")
+  def filelist(self) -> Path:
+    return self.root.joinpath("filelist.txt")
+  def infoRoot(self) -> Path:
+    """ Ue4Export dumps and asset info before it is published to the shared dump """
+    return self.root.joinpath("info")
+
+  def clean(self):
+    """ Drops what the previous build left, the Unreal project is kept since its derived data speeds up cooks """
+    for leftover in (self.blenderRoot(), self.restoredRoot(), self.pakRoot(), self.infoRoot()):
+      if leftover.exists(): shutil.rmtree(leftover)
+    self.filelist().unlink(missing_ok=True)
+
+class WorkspacePool:
+  """ Numbered workspaces under root, a build takes the lowest free one and hands it back when done
+
+  Workspaces are only cleaned when taken again, a finished build's files stay for inspection.
+  Every workspace keeps an Unreal editor resident, so no more are handed out at once than
+  the scheduler runs Unreal instances, further builds wait for one to be released.
+  """
+  def __init__(self, root:Path, capacity:int):
+    self.root, self.capacity = root, capacity
+    self.cond = threading.Condition()
+    self.in_use:Set[int] = set()
+
+  def acquire(self, cancel:Optional[threading.Event]=None) -> Optional[Workspace]:
+    """ The lowest free workspace, None if cancelled while waiting for one """
+    with self.cond:
+      while len(self.in_use) >= self.capacity:
+        if cancel is not None and cancel.is_set(): return None
+        self.cond.wait(ACQUIRE_POLL)
+      slot = 0
+      while slot in self.in_use: slot += 1
+      self.in_use.add(slot)
+    workspace = Workspace(self.root.joinpath(str(slot)), slot)
+    try:
+      workspace.clean()
+      workspace.root.mkdir(parents=True, exist_ok=True)
+    except OSError:
+      self.release(workspace)
+      raise
+    logger.info(f"Build workspace {slot} taken, {len(self.in_use)} in use")
+    return workspace
+
+  def release(self, workspace:Workspace):
+    with self.cond:
+      self.in_use.discard(workspace.slot)
+      self.cond.notify_all()
+
+pools:Dict[Path, WorkspacePool] = {}
+pools_lock = threading.Lock()
+
+def getWorkspacePool(work:Path) -> WorkspacePool:
+  """ One pool per working dir, shared by every build using it, capped at the current Unreal slot count """
+  root = work.joinpath(Constants.WORKSPACES)
+  capacity = getScheduler().slots.get(TOOL_UNREAL, 1)
+  with pools_lock:
+    if root not in pools:
+      pools[root] = WorkspacePool(root, capacity)
+    pool = pools[root]
+  with pool.cond:
+    pool.capacity = capacity
+    pool.cond.notify_all()
+  return pool
@@ -1,11 +1,16 @@
-import bpy, bmesh, sys, addon_utils
+import bpy, bmesh, sys, addon_utils, socket, json
 from pathlib import Path
-from typing import List, Set
+from typing import List, Set, Tuple
 
 # These need to match Constants, but packaging makes that annoying
 DUMP_SUBDIR="dump/"
 FAST_BLENDER_OUT="Blender_Fast_Build"
 INFO_SFX="_details.txt"
+WORKER_PORT_TAG="WORKER_PORT:"
+JOB_RESULT_TAG="JOB_RESULT:"
+
+class HookFailure(Exception):
+  pass
 
 def getMesh() -> bpy.types.Object:
   all_aramatures:List[bpy.types.Object] = []
@@ -14,8 +19,7 @@ def getMesh() -> bpy.types.Object:
       all_aramatures.append(obj)
 
   if len(all_aramatures) == 0:
-    print("FAIL: Target project contains 0 armatures")
-    exit(0)
+    raise HookFailure("Target project contains 0 armatures")
 
   target_armature = None
   
@@ -26,8 +30,7 @@ def getMesh() -> bpy.types.Object:
         break
 
     if target_armature is None:
-      print("FAIL: Multiple armatures, can't disambiguate based on name 'Armature'")
-      exit(0)
+      raise HookFailure("Multiple armatures, can't disambiguate based on name 'Armature'")
   else:
     target_armature = all_aramatures[0]
     target_armature.name = "Armature"
@@ -40,8 +43,7 @@ def getMesh() -> bpy.types.Object:
         mesh_list.append(obj)
 
   if len(mesh_list) != 1:
-    print(f"FAIL: Expected to find one child mesh on Armature, found {len(mesh_list)}")
-    exit(0)
+    raise HookFailure(f"Expected to find one child mesh on Armature, found {len(mesh_list)}")
   
   return mesh_list[0]
 
@@ -164,8 +166,7 @@ def fixMaterialOrdering(target:bpy.types.Object, real_name_order:List[str]):
           all_matches[real_idx].append(old_idx)
           break
       if not found:
-        print(f"FAIL: Unknown material name '{old_name}', valid names are: {' '.join(real_name_order)}")
-        exit(0)
+        raise HookFailure(f"Unknown material name '{old_name}', valid names are: {' '.join(real_name_order)}")
 
     # migrate all material assignments into the new properly ordered materials
     for real_idx, real_name in enumerate(real_name_order):
@@ -214,11 +215,11 @@ def fixMaterialOrdering(target:bpy.types.Object, real_name_order:List[str]):
     assert mat.name == real_name_order[actual_idx]
 
   chunks_needed = guessChunks(target)
-  print(f"CHUNKING:" + ",".join(str(chunk) for chunk in chunks_needed))
+  chunks_raw = ",".join(str(chunk) for chunk in chunks_needed)
+  print(f"CHUNKING:" + chunks_raw)
 
-  return True
+  return chunks_raw
 
-  return True
 def selectMesh(target:bpy.types.Object):
   bpy.ops.object.mode_set(mode='OBJECT')
   for obj in bpy.context.selected_objects:
@@ -229,15 +230,12 @@ def selectMesh(target:bpy.types.Object):
   target.select_set(True)
   target.parent.select_set(True)
 
-def main():
-  print("Starting Python Export Hook")
+def meshStats(target:bpy.types.Object) -> dict:
+  """ Sizes of what was exported, kept in the build history """
+  return { "vertices": len(target.data.vertices), "bones": len(target.parent.data.bones) }
 
-  # arg parsing
-  argv = sys.argv
-  py_args = argv[argv.index("--") + 1:]  # get all args after "--"
-  assert len(py_args) == 2, "arg count is wrong"
-  work_dir = Path(py_args[0])
-  asset_path = py_args[1]
+def exportProject(work_dir:Path, asset_path:str, export_dir:Path) -> Tuple[str, dict]:
+  print("Starting Python Export Hook")
   asset_name = asset_path.split("/")[-1]
 
   # load dumped info
@@ -248,18 +246,69 @@ def main():
   target.hide_set(False)
   target.parent.hide_set(False)
 
-  fixMaterialOrdering(target, slot_order)
+  chunks_raw = fixMaterialOrdering(target, slot_order)
 
   selectMesh(target)
   
   # do export
   #addon_utils.enable("io_scene_fbx", default_set=True, persistent=False, handle_error=None)
-  export_path = work_dir.joinpath(FAST_BLENDER_OUT)
-  export_path.mkdir(exist_ok=True)
-  export_path = export_path.joinpath(f"{asset_name}.fbx")
+  export_dir.mkdir(parents=True, exist_ok=True)
+  export_path = export_dir.joinpath(f"{asset_name}.fbx")
   bpy.ops.export_scene.fbx(filepath=export_path.as_posix(), check_existing=False, use_selection=True, bake_anim=False, add_leaf_bones=False)
 
-  exit(0)
+  return chunks_raw, meshStats(target)
+
+def runJob(job:dict) -> dict:
+  result = {"fails": [], "chunks": None, "stats": {}}
+  try:
+    bpy.ops.wm.open_mainfile(filepath=job["blend"], load_ui=False)
+    # builds run in their own workspaces, so the FBX dir comes with the job
+    export_dir = Path(job["out"]) if "out" in job else Path(job["work"]).joinpath(FAST_BLENDER_OUT)
+    result["chunks"], result["stats"] = exportProject(Path(job["work"]), job["asset"], export_dir)
+  except HookFailure as fail:
+    print(f"FAIL: {fail}")
+    result["fails"].append(str(fail))
+  except Exception as e:
+    print("FAIL: unknown exception, check error.log")
+    print(e)
+    result["fails"].append(f"unknown exception: {e}")
+  finally:
+    # drop everything the job loaded so the next one starts clean
+    bpy.ops.wm.read_homefile(use_empty=True)
+  return result
+
+def serve():
+  sys.stdout.reconfigure(line_buffering=True)
+  server = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+  server.bind(("127.0.0.1", 0))
+  server.listen(1)
+  print(f"{WORKER_PORT_TAG}{server.getsockname()[1]}")
+
+  while True:
+    conn, _ = server.accept()
+    with conn, conn.makefile('rb') as reader:
+      for raw in reader:
+        job = json.loads(raw)
+        if job.get("shutdown"): return
+        conn.sendall((json.dumps(runJob(job)) + "\n").encode())
+
+def runJobs(jobs_path:Path):
+  """ Every job of a batch in this one session, each result printed as a tagged json line """
+  with open(jobs_path) as jobs_file:
+    jobs = json.load(jobs_file)
+  for job in jobs:
+    print(JOB_RESULT_TAG + json.dumps(runJob(job)))
+
+def main():
+  # arg parsing
+  argv = sys.argv
+  py_args = argv[argv.index("--") + 1:]  # get all args after "--"
+  if py_args == ["--worker"]:
+    serve()
+    return
+
+  assert len(py_args) == 2 and py_args[0] == "--jobs", "arg count is wrong"
+  runJobs(Path(py_args[1]))
 
 try:
   main()
@@ -1,5 +1,8 @@
 import unreal
-import sys
+import sys, socket, json
+
+WORKER_PORT_TAG="WORKER_PORT:"
+JOB_RESULT_TAG="JOB_RESULT:"
 
 def buildImportOptions():
   fbx_options = unreal.FbxImportUI()
@@ -79,14 +82,54 @@ def SetOutline(dest_path, info_path, chunks_raw):
       
     unreal.EditorAssetLibrary.save_asset(assetPath)
 
-src_path = sys.argv[1]
-dest_path = "/Game/" + sys.argv[2]
-info_path = sys.argv[3]
-chunks_raw = sys.argv[4]
-
-try:
-  ImportAssets(src_path, dest_path)
-  SetOutline(dest_path, info_path, chunks_raw)
-  unreal.log_warning("Successfully exported")
-except Exception as error:
-  unreal.log_warning("FAIL: " + str(error))
\ No newline at end of file
+def CleanDirectory(clean_path):
+  EAL = unreal.EditorAssetLibrary()
+  if EAL.does_directory_exist(clean_path) and not EAL.delete_directory(clean_path):
+    unreal.log_warning("Failed to clean " + clean_path + ", assets will be replaced in place")
+
+def RunJob(job):
+  try:
+    if job.get("clean"):
+      CleanDirectory(job["clean"])
+    if "fbx" not in job:
+      return { "success": True, "fails": [] }
+    dest_path = "/Game/" + job["stub"]
+    ImportAssets(job["fbx"], dest_path)
+    SetOutline(dest_path, job["info"], job["chunks"])
+    unreal.log_warning("Successfully exported")
+    return { "success": True, "fails": [] }
+  except Exception as error:
+    unreal.log_warning("FAIL: " + str(error))
+    return { "success": False, "fails": [str(error)] }
+
+def Serve():
+  # blocks the editor here, imports and saves run synchronously so nothing needs to tick
+  server = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+  server.bind(("127.0.0.1", 0))
+  server.listen(1)
+  unreal.log(WORKER_PORT_TAG + str(server.getsockname()[1]))
+
+  while True:
+    conn, _ = server.accept()
+    reader = conn.makefile('rb')
+    try:
+      while True:
+        raw = reader.readline()
+        if not raw: break
+        job = json.loads(raw)
+        if job.get("shutdown"): return
+        conn.sendall((json.dumps(RunJob(job)) + "\n").encode())
+    finally:
+      reader.close()
+      conn.close()
+
+def RunJobs(jobs_path):
+  with open(jobs_path) as jobs_file:
+    jobs = json.load(jobs_file)
+  for job in jobs:
+    unreal.log(JOB_RESULT_TAG + json.dumps(RunJob(job)))
+
+if sys.argv[1] == "--worker":
+  Serve()
+elif sys.argv[1] == "--jobs":
+  RunJobs(sys.argv[2])
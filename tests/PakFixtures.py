@@ -0,0 +1,99 @@
+""" Writers for synthetic paks and packages in the older layouts PakWriter doesn't produce """
+import hashlib, struct, zlib
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from src import Aes
+from src.PakReader import PAK_MAGIC, COMPRESSION_NAME_LEN, ENTRY_FLAG_DELETED
+
+AES_KEY = bytes(range(32))
+AES_HEX = "0x" + AES_KEY.hex()
+BLOCK_SIZE = 64 * 1024
+
+def fstring(value:str) -> bytes:
+  raw = value.encode("latin-1") + b"\0"
+  return struct.pack("<i", len(raw)) + raw
+
+def entryBytes(version:int, offset:int, size:int, uncompressed_size:int, method:int, sha:bytes, blocks:List[Tuple[int,int]], flags:int) -> bytes:
+  raw = struct.pack("<qqqI", offset, size, uncompressed_size, method)
+  if version <= 1: raw += bytes(8)
+  raw += sha
+  if version >= 3:
+    if method != 0:
+      raw += struct.pack("<i", len(blocks)) + b"".join(struct.pack("<qq", start, end) for start, end in blocks)
+    raw += bytes([flags]) + struct.pack("<I", BLOCK_SIZE if method != 0 else 0)
+  return raw
+
+def footer(version:int, encrypted:bool, index_offset:int, index:bytes, name_slots:int, frozen:bool) -> bytes:
+  raw = b"" if version < 7 else bytes(16)
+  raw += struct.pack("<BIiqq", int(encrypted), PAK_MAGIC, version, index_offset, len(index)) + hashlib.sha1(index).digest()
+  if version == 9: raw += bytes([int(frozen)])
+  if version >= 8:
+    raw += b"".join(name.ljust(COMPRESSION_NAME_LEN, b"\0") for name in [b"Zlib"] + [b""] * (name_slots - 1))
+  return raw
+
+def writeFixturePak(path:Path, files:Dict[str, bytes], version:int=8, compress:bool=False, aes_key:Optional[bytes]=None,
+                    deleted:Iterable[str]=(), name_slots:int=5, frozen:bool=False, mount_point:str="../../../"):
+  """ files are written in order, deleted lists paths only present as deleted entries """
+  out = bytearray()
+  index = [fstring(mount_point), struct.pack("<i", len(files) + len(list(deleted)))]
+  for name, data in files.items():
+    offset = len(out)
+    if compress and len(data) > 0:
+      # zlib is a flag before version 8, an index into the footer's names after
+      method = 1
+      parts = [zlib.compress(data[start:start + BLOCK_SIZE]) for start in range(0, len(data), BLOCK_SIZE)]
+      payload = b"".join(parts)
+      header_size = len(entryBytes(version, 0, 0, 0, method, bytes(20), [(0, 0)] * len(parts), 0))
+      # block offsets are relative to the entry from version 5, absolute before
+      start = header_size if version >= 5 else offset + header_size
+      blocks = []
+      for part in parts:
+        blocks.append((start, start + len(part)))
+        start += len(part)
+    else:
+      method, payload, blocks = 0, data, []
+    sha = hashlib.sha1(payload).digest()
+    out += entryBytes(version, 0, len(payload), len(data), method, sha, blocks, 0)
+    out += payload
+    index.append(fstring(name) + entryBytes(version, offset, len(payload), len(data), method, sha, blocks, 0))
+  for name in deleted:
+    index.append(fstring(name) + entryBytes(version, 0, 0, 0, 0, bytes(20), [], ENTRY_FLAG_DELETED))
+
+  index_data = b"".join(index)
+  if aes_key is not None:
+    index_data += bytes(-len(index_data) % Aes.BLOCK_SIZE)
+    index_data = Aes.encryptECB(aes_key, index_data)
+  index_offset = len(out)
+  out += index_data
+  out += footer(version, aes_key is not None, index_offset, index_data, name_slots, frozen)
+  path.parent.mkdir(parents=True, exist_ok=True)
+  path.write_bytes(bytes(out))
+
+# ----- Packages -----
+def makePackage(exports:List[Tuple[str, str, int, int]], version:int=518) -> bytes:
+  """ A cooked .uasset header holding exports of (class name, object name, serial size, serial offset) """
+  names = sorted({ "/Script/Engine", "Class", "None" } | { class_name for class_name, *_ in exports } | { name for _, name, *_ in exports })
+  name_idx = { name: idx for idx, name in enumerate(names) }
+  classes = sorted({ class_name for class_name, *_ in exports })
+
+  name_map = b"".join(fstring(name) + bytes(4) for name in names)
+  import_map = b"".join(
+    struct.pack("<iiiiiii", name_idx["/Script/Engine"], 0, name_idx["Class"], 0, 0, name_idx[class_name], 0) for class_name in classes
+  )
+  export_map = b"".join(
+    struct.pack("<iiiiiiIqqiii16xIiiiiiii", -(classes.index(class_name) + 1), 0, 0, 0, name_idx[name], 0, 0, size, offset, 0, 0, 0, 0, 0, 1, -1, 0, 0, 0, 0)
+    for class_name, name, size, offset in exports
+  )
+
+  def summary(name_offset:int, export_offset:int, import_offset:int) -> bytes:
+    return (
+      struct.pack("<Iiiiii", 0x9E2A83C1, -7, 864, version, 0, 0) + struct.pack("<i", 0) + fstring("None")
+      + struct.pack("<Iii", 0x80000000, len(names), name_offset) + struct.pack("<ii", 0, 0)
+      + struct.pack("<iiiii", len(exports), export_offset, len(classes), import_offset, 0)
+    )
+  base = len(summary(0, 0, 0))
+  name_offset = base
+  import_offset = name_offset + len(name_map)
+  export_offset = import_offset + len(import_map)
+  return summary(name_offset, export_offset, import_offset) + name_map + import_map + export_map
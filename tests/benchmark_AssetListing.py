@@ -0,0 +1,82 @@
+""" ListingParser against the string split listing it replaced, run as python -m tests.benchmark_AssetListing """
+from pathlib import Path
+from typing import List
+import re
+
+from src.AssetListing import AssetListing, parseListing
+
+def writeSyntheticListing(path:Path, file_count:int, exports_per_file:int):
+  """ Shaped like umodel -list output over character meshes, banner and summary included """
+  types = ["SkeletalMesh", "Skeleton", "PhysicsAsset", "MaterialInstanceConstant", "Texture2D", "AnimSequence", "MorphTarget", "BodySetup"]
+  with open(path, 'w') as listing:
+    listing.write("UModel viewer, version 1485\nCompiled Jul 25 2021\n\n")
+    for file_idx in range(file_count):
+      listing.write(f"/RED/Content/Chara/C{file_idx % 60:03}/Costume{file_idx % 8:02}/Mesh/mesh_{file_idx}.uasset\n")
+      for export_idx in range(exports_per_file):
+        # one file in eight holds a skeletal mesh
+        type_name = types[0] if export_idx == 0 and file_idx % 8 == 0 else types[1 + (export_idx + file_idx) % (len(types) - 1)]
+        listing.write(f"  {export_idx:4} {0x400 + export_idx * 0x1000:8X} {0x80 + export_idx * 0x10:8X} {type_name} obj_{file_idx}_{export_idx}\n")
+      listing.write("\n")
+    listing.write(f"Found {file_count} packages\n")
+
+# ----- The Split Listing -----
+CLEAN_WHITESPACE = re.compile(r'\s+')
+
+class SplitAsset:
+  def __init__(self, desc:str):
+    parts = CLEAN_WHITESPACE.sub(" ", desc).strip(" ").split(" ")
+    self.index, self.offset, self.size, self.type, self.name = int(parts[0]), int(parts[1],16), int(parts[2],16), parts[3], parts[4]
+  def toRecord(self) -> list:
+    return [self.index, self.offset, self.size, self.type, self.name]
+
+class SplitFile:
+  def __init__(self, desc:str):
+    lines = desc.split("\n")
+    self.path = lines[0]
+    self.contents = [SplitAsset(line) for line in lines[1:] if len(line) > 1]
+  def toRecord(self) -> list:
+    return [self.path, [child.toRecord() for child in self.contents]]
+
+def loadSplit(path:Path) -> List[SplitFile]:
+  # umodel's whole stdout was returned as one string before being split
+  with open(path) as handle:
+    stdout = handle.read()
+  return [SplitFile(chunk) for chunk in stdout.split("\n\n") if chunk[0:5] == "/RED/"]
+
+def loadStream(path:Path) -> AssetListing:
+  with open(path) as handle:
+    return parseListing(handle)
+
+def querySplit(asset_files:List[SplitFile]) -> List[str]:
+  return [asset_file.path for asset_file in asset_files if any(child.type == "SkeletalMesh" for child in asset_file.contents)]
+
+def queryStream(listing:AssetListing) -> List[str]:
+  return listing.withType("SkeletalMesh")
+
+if __name__ == "__main__":
+  import tempfile, time, tracemalloc, gc
+
+  print(f"{'files':>8}{'exports':>10}{'size':>10}{'':>8}{'parse':>10}{'peak':>12}{'retained':>12}{'query':>12}")
+  with tempfile.TemporaryDirectory() as temp:
+    for file_count in (5_000, 20_000, 40_000):
+      listing_path = Path(temp).joinpath(f"listing_{file_count}.txt")
+      writeSyntheticListing(listing_path, file_count, 8)
+      for label, loader, query in (("split", loadSplit, querySplit), ("stream", loadStream, queryStream)):
+        # timed untraced, tracemalloc slows allocation heavy code several times over
+        start = time.perf_counter()
+        loader(listing_path)
+        elapsed = time.perf_counter() - start
+        gc.collect()
+        tracemalloc.start()
+        loaded = loader(listing_path)
+        retained, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        start = time.perf_counter()
+        for _ in range(10):
+          query(loaded)
+        query_time = (time.perf_counter() - start) / 10
+        del loaded
+        print(
+          f"{file_count:>8}{file_count * 8:>10}{listing_path.stat().st_size / (1024*1024):>8.1f}MB{label:>8}"
+          f"{elapsed:>9.2f}s{peak / (1024*1024):>10.1f}MB{retained / (1024*1024):>10.1f}MB{query_time * 1000:>10.2f}ms"
+        )
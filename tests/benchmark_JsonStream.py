@@ -0,0 +1,53 @@
+""" json.load against extractPaths on growing Ue4Export shaped dumps, run as python -m tests.benchmark_JsonStream """
+import json
+from pathlib import Path
+
+from src.JsonStream import extractPaths
+
+def writeSyntheticDump(path:Path, vertex_count:int):
+  """ Shaped like a Ue4Export skeletal mesh dump, the vertex and index data written as it is generated """
+  with open(path, 'w') as dump:
+    dump.write('{"Materials": [')
+    dump.write(",".join(json.dumps({ "ObjectName": f"MaterialInstanceConstant'mat_{idx}'", "ObjectPath": f"/Game/mat_{idx}.0" }) for idx in range(6)))
+    dump.write('], "Properties": {"LODInfo": [{"OutlineMaterialIndex": [0, 1, 1, 0, 2, 1], "ScreenSize": {"Default": 1.0}}]},')
+    dump.write(' "LODModels": [{"Sections": [')
+    dump.write(",".join(json.dumps({ "MaterialIndex": idx, "NumTriangles": vertex_count // 6 }) for idx in range(6)))
+    dump.write('], "VertexBufferGPUSkin": {"VertsFloat": [')
+    for idx in range(vertex_count):
+      if idx > 0: dump.write(",")
+      dump.write(
+        f'{{"Pos": {{"X": {idx * 0.37:.6f}, "Y": {idx * 1.13:.6f}, "Z": {idx * 0.71:.6f}}}, '
+        f'"Normal": [{idx % 255}, {(idx * 7) % 255}, {(idx * 13) % 255}, 255], '
+        f'"UV": [{{"U": {(idx % 1000) / 1000:.6f}, "V": {(idx % 777) / 777:.6f}}}], '
+        f'"Infs": {{"BoneIndex": [{idx % 200}, {(idx + 1) % 200}, 0, 0], "BoneWeight": [200, 55, 0, 0]}}}}'
+      )
+    dump.write(']}, "Indices": {"Indices32": [')
+    dump.write(",".join(str(idx % vertex_count) for idx in range(vertex_count * 3)))
+    dump.write(']}}]}')
+
+if __name__ == "__main__":
+  import tempfile, time, tracemalloc
+
+  from src.ExportDriver import MATERIAL_NAMES, OUTLINE_INDICES, SECTION_MATERIALS
+  def loadFull(path:Path):
+    with open(path) as handle:
+      raw_json = json.load(handle)
+    return [mat["ObjectName"] for mat in raw_json["Materials"]]
+  def loadStream(path:Path):
+    return extractPaths(path, [MATERIAL_NAMES, OUTLINE_INDICES, SECTION_MATERIALS])[MATERIAL_NAMES]
+
+  print(f"{'vertices':>10}{'size':>10}{'json.load':>22}{'extractPaths':>22}")
+  with tempfile.TemporaryDirectory() as temp:
+    for vertex_count in (10_000, 50_000, 200_000):
+      dump_path = Path(temp).joinpath(f"mesh_{vertex_count}.json")
+      writeSyntheticDump(dump_path, vertex_count)
+      cells = []
+      for loader in (loadFull, loadStream):
+        tracemalloc.start()
+        start = time.perf_counter()
+        loader(dump_path)
+        elapsed = time.perf_counter() - start
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        cells.append(f"{elapsed:.2f}s {peak / (1024*1024):.1f} MB")
+      print(f"{vertex_count:>10}{dump_path.stat().st_size / (1024*1024):>8.1f}MB{cells[0]:>22}{cells[1]:>22}")
@@ -0,0 +1,5 @@
+import sys
+from pathlib import Path
+
+# the modules import each other relatively, so they're imported as the src package
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
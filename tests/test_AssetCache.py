@@ -0,0 +1,38 @@
+""" ListingCache rows are kept per pak fingerprint and pruned by age and size """
+import os, time
+
+from src import AssetCache
+from src.AssetCache import ListingCache, connectDatabase
+
+def test_fingerprints_keep_each_others_rows(tmp_path):
+  path = tmp_path.joinpath("cache.sqlite")
+  ListingCache(path, "game_a").put("/RED/*", [["a", []]])
+  ListingCache(path, "game_b").put("/RED/*", [["b", []]])
+  assert ListingCache(path, "game_a").get("/RED/*") == [["a", []]]
+  assert ListingCache(path, "game_b").get("/RED/*") == [["b", []]]
+  assert ListingCache(path, "game_c").get("/RED/*") is None
+
+def test_unused_rows_are_pruned(tmp_path, monkeypatch):
+  path = tmp_path.joinpath("cache.sqlite")
+  cache = ListingCache(path, "game_a")
+  cache.put("old", [])
+  cache.put("recent", [])
+  with connectDatabase(path) as db:
+    db.execute("UPDATE package_listings SET used = ? WHERE query = 'old'", (time.time() - 31 * 86400,))
+  cache = ListingCache(path, "game_a")
+  assert cache.get("old") is None
+  assert cache.get("recent") == []
+
+def test_size_budget_drops_least_recently_used(tmp_path, monkeypatch):
+  monkeypatch.setattr(AssetCache, "LISTING_MAX_MB", 0.5)
+  path = tmp_path.joinpath("cache.sqlite")
+  cache = ListingCache(path, "game_a")
+  # random data so each row stays near 200 KB compressed, two fit the budget and three don't
+  for query in ("first", "second", "third"):
+    cache.put(query, [os.urandom(180_000).hex()])
+    time.sleep(0.01)
+  cache.get("first")
+  cache = ListingCache(path, "game_a")
+  assert cache.get("first") is not None
+  assert cache.get("third") is not None
+  assert cache.get("second") is None
@@ -0,0 +1,27 @@
+""" ListingParser against the string split listing it replaced """
+from src.AssetListing import AssetListing, ListingParser, parseListing
+from benchmark_AssetListing import writeSyntheticListing, loadSplit, loadStream, querySplit, queryStream
+
+def test_matches_split_listing(tmp_path):
+  listing_path = tmp_path.joinpath("listing.txt")
+  writeSyntheticListing(listing_path, 200, 5)
+  split, stream = loadSplit(listing_path), loadStream(listing_path)
+  assert stream.toRecords() == [asset_file.toRecord() for asset_file in split]
+  assert queryStream(stream) == querySplit(split)
+  assert len(queryStream(stream)) == 25
+
+def test_cache_records_round_trip(tmp_path):
+  listing_path = tmp_path.joinpath("listing.txt")
+  writeSyntheticListing(listing_path, 20, 3)
+  listing = loadStream(listing_path)
+  restored = AssetListing.fromRecords(listing.toRecords())
+  assert restored.toRecords() == listing.toRecords()
+  assert restored.withType("SkeletalMesh") == listing.withType("SkeletalMesh")
+
+def test_malformed_rows_are_counted():
+  parser = ListingParser()
+  for line in ["/RED/Content/a.uasset", "  0 400 80 SkeletalMesh a", "  1 zz 80 Skeleton b", "  2 400", ""]:
+    parser.feed(line)
+  assert parser.malformed == 2
+  assert parser.result().withType("SkeletalMesh") == ["/RED/Content/a.uasset"]
+  assert parseListing(["banner", "", "/Other/x.uasset", "  0 1 1 T x"]).toRecords() == []
@@ -0,0 +1,29 @@
+""" ExportManifest appends one line per target and compacts on load """
+from src.ExportManifest import ExportManifest
+
+def test_records_survive_reload(tmp_path):
+  output = tmp_path.joinpath("ram_body.fbx")
+  output.write_bytes(b"fbx")
+  manifest = ExportManifest(tmp_path.joinpath("manifest.jsonl"))
+  manifest.record("ram_body", "source", "settings", [output])
+  manifest.record("ram_face", "source", "settings", [output])
+  manifest.record("ram_body", "changed", "settings", [output])
+  manifest.forget("ram_face")
+  # four records and the header, appended rather than rewritten
+  assert len(tmp_path.joinpath("manifest.jsonl").read_text().splitlines()) == 5
+
+  reloaded = ExportManifest(tmp_path.joinpath("manifest.jsonl"))
+  assert reloaded.isValid("ram_body", "changed", "settings")
+  assert not reloaded.isValid("ram_face", "source", "settings")
+  assert len(tmp_path.joinpath("manifest.jsonl").read_text().splitlines()) == 2
+
+def test_torn_last_line_is_ignored(tmp_path):
+  output = tmp_path.joinpath("ram_body.fbx")
+  output.write_bytes(b"fbx")
+  path = tmp_path.joinpath("manifest.jsonl")
+  ExportManifest(path).record("ram_body", "source", "settings", [output])
+  with open(path, "a") as handle:
+    handle.write('{"target": "ram_face", "ent')
+  reloaded = ExportManifest(path)
+  assert reloaded.isValid("ram_body", "source", "settings")
+  assert list(reloaded.targets) == ["ram_body"]
@@ -0,0 +1,81 @@
+""" extractPaths against json.load on small documents, odd chunk sizes and bulk data """
+import json
+from pathlib import Path
+import pytest
+
+from src import JsonStream
+from src.JsonStream import extractPaths, WILDCARD
+from benchmark_JsonStream import writeSyntheticDump
+
+def expected(document, path:tuple) -> list:
+  """ Every value at path in document order, from the loaded document """
+  values = [document]
+  for part in path:
+    found = []
+    for value in values:
+      if isinstance(value, dict) and isinstance(part, str) and part in value:
+        found.append(value[part])
+      elif isinstance(value, list) and part == WILDCARD:
+        found.extend(value)
+      elif isinstance(value, list) and isinstance(part, int) and part < len(value):
+        found.append(value[part])
+    values = found
+  return values
+
+def check(tmp_path:Path, text:str, paths:list, chunk_sizes=(1, 2, 3, 7, 64, 1 << 16)):
+  json_path = tmp_path.joinpath("dump.json")
+  json_path.write_text(text, encoding="utf-8")
+  document = json.loads(text)
+  for chunk_size in chunk_sizes:
+    assert extractPaths(json_path, paths, chunk_size) == { path: expected(document, path) for path in paths }, chunk_size
+
+DOCUMENT = {
+  "Name": "ram \"body\" \\ {not a bracket} [nor this]",
+  "Escapes": ["\\", "\\\"", "\"]", "tab\there", "é中😀", "\\u0041"],
+  "Materials": [{ "ObjectName": f"mat_{idx}", "Skip": { "deep": [[idx], { "x": "]}" }] } } for idx in range(5)],
+  "Empty": { "list": [], "object": {} },
+  "Scalars": [0, -1.5e3, True, False, None, "end"],
+}
+
+@pytest.mark.parametrize("paths", [
+  [("Name",), ("Escapes",)],
+  [("Materials", WILDCARD, "ObjectName")],
+  [("Materials", 3, "Skip", "deep", 1, "x"), ("Materials", 9, "ObjectName")],
+  [("Scalars", WILDCARD), ("Scalars", 5), ("Scalars", 0, "below")],
+  [("Empty", "list", WILDCARD), ("Empty", "object"), ("Missing",)],
+  # a value captured for one path is still searched for the longer ones through it
+  [("Materials",), ("Materials", WILDCARD, "ObjectName"), ("Materials", 1, "Skip", "deep", 0)],
+  [("Escapes", WILDCARD), ("Escapes",)],
+])
+def test_small_documents(tmp_path, paths):
+  check(tmp_path, json.dumps(DOCUMENT), paths)
+  check(tmp_path, json.dumps(DOCUMENT, indent=2, ensure_ascii=False), paths)
+
+def test_bulk_containers(tmp_path, monkeypatch):
+  # small windows so strings and containers straddle window and chunk boundaries many times over
+  monkeypatch.setattr(JsonStream, "FAST_SKIP", 16)
+  monkeypatch.setattr(JsonStream, "BULK_WINDOW", 37)
+  bulk = [{ "s": "x" * (idx % 50) + "]}[{" + '"' * (idx % 2), "n": [idx, [idx]], "e": "\\" * (idx % 3) } for idx in range(400)]
+  document = { "Before": [1, [2]], "Bulk": bulk, "Strings": ["y" * 100, "z" * 41], "After": { "value": "done" } }
+  check(tmp_path, json.dumps(document), [("Before",), ("Strings", 1), ("After", "value"), ("Bulk", 399, "n", 1)], (5, 64, 1000))
+
+def test_default_window_sizes(tmp_path):
+  bulk = [[idx, "]" * (idx % 7), { "k": "\\\"" if idx % 1000 == 0 else "plain" }] for idx in range(20_000)]
+  document = { "Bulk": bulk, "Tail": ["a" * 70_000, 1] }
+  check(tmp_path, json.dumps(document), [("Bulk", 19_999), ("Tail", 1)], (1000, 1 << 16))
+
+def test_synthetic_dump(tmp_path):
+  dump_path = tmp_path.joinpath("mesh.json")
+  writeSyntheticDump(dump_path, 20_000)
+  paths = [("Materials", WILDCARD, "ObjectName"), ("Properties", "LODInfo", 0, "OutlineMaterialIndex"), ("LODModels", 0, "Sections", WILDCARD, "MaterialIndex")]
+  with open(dump_path) as handle:
+    document = json.load(handle)
+  assert extractPaths(dump_path, paths) == { path: expected(document, path) for path in paths }
+
+@pytest.mark.parametrize("text", ['{"A": 1} x', '{"A": 1}}', '[1] [2]', '{"A": [1, 2}', '{"A": "open', '{"A" 1}', '{"A": [1 2]}'])
+def test_bad_json(tmp_path, text):
+  json_path = tmp_path.joinpath("dump.json")
+  json_path.write_text(text)
+  for chunk_size in (1, 4, 1 << 16):
+    with pytest.raises(ValueError):
+      extractPaths(json_path, [("A",), ("B", 0)], chunk_size)
@@ -0,0 +1,121 @@
+""" PakReader against synthetic paks in every footer layout up to 4.25 """
+import pytest
+
+from src import Aes
+from src.PakReader import PakFile, PakError, listGameFiles
+from src.PackageReader import readExports, PackageError
+from PakFixtures import writeFixturePak, makePackage, AES_KEY, AES_HEX
+
+FILES = {
+  "RED/Content/Chara/RAM/Costume01/Mesh/ram_body.uasset": b"body header " * 50,
+  "RED/Content/Chara/RAM/Costume01/Mesh/ram_body.uexp": bytes(range(256)) * 700,
+  "RED/Content/empty.txt": b"",
+}
+
+@pytest.fixture(params=["python", "pycryptodome"])
+def aes_backend(request, monkeypatch):
+  if request.param == "python":
+    monkeypatch.setattr(Aes, "_NativeAES", None)
+  else:
+    native = pytest.importorskip("Crypto.Cipher.AES")
+    monkeypatch.setattr(Aes, "_NativeAES", native)
+  return request.param
+
+def readAll(pak:PakFile) -> dict:
+  return { entry.path: pak.read(entry) for entry in pak.entries }
+
+@pytest.mark.parametrize("version", [3, 4, 5, 6, 7, 8, 9])
+@pytest.mark.parametrize("compress", [False, True])
+def test_footer_versions(tmp_path, version, compress):
+  pak_path = tmp_path.joinpath("game.pak")
+  writeFixturePak(pak_path, FILES, version=version, compress=compress)
+  pak = PakFile(pak_path)
+  assert pak.info.version == version
+  assert readAll(pak) == { f"/{name}": data for name, data in FILES.items() }
+  uexp = next(entry for entry in pak.entries if entry.path.endswith(".uexp"))
+  assert uexp.compression == ("Zlib" if compress else None)
+  assert len(uexp.blocks) == (3 if compress else 0)
+
+def test_version_8_with_four_compression_names(tmp_path):
+  pak_path = tmp_path.joinpath("game.pak")
+  writeFixturePak(pak_path, FILES, version=8, compress=True, name_slots=4)
+  pak = PakFile(pak_path)
+  assert pak.info.compression == ["Zlib"]
+  assert readAll(pak) == { f"/{name}": data for name, data in FILES.items() }
+
+def test_newer_versions_are_rejected(tmp_path):
+  pak_path = tmp_path.joinpath("game.pak")
+  writeFixturePak(pak_path, FILES, version=9)
+  raw = bytearray(pak_path.read_bytes())
+  # the version follows the guid, encrypted flag and magic in the 222 byte footer
+  raw[-222 + 21] = 10
+  pak_path.write_bytes(bytes(raw))
+  with pytest.raises(PakError):
+    PakFile(pak_path)
+
+def test_frozen_index_is_rejected(tmp_path):
+  pak_path = tmp_path.joinpath("game.pak")
+  writeFixturePak(pak_path, FILES, version=9, frozen=True)
+  with pytest.raises(PakError, match="frozen"):
+    PakFile(pak_path)
+
+def test_not_a_pak(tmp_path):
+  pak_path = tmp_path.joinpath("game.pak")
+  pak_path.write_bytes(bytes(1000))
+  with pytest.raises(PakError):
+    PakFile(pak_path)
+
+# ----- Encryption -----
+def test_aes_known_answer(aes_backend):
+  # FIPS-197 appendix C.3
+  plain = bytes.fromhex("00112233445566778899aabbccddeeff")
+  cipher = bytes.fromhex("8ea2b7ca516745bfeafc49904b496089")
+  assert Aes.encryptECB(AES_KEY, plain) == cipher
+  assert Aes.decryptECB(AES_KEY, cipher) == plain
+
+@pytest.mark.parametrize("version", [4, 8, 9])
+def test_encrypted_index(tmp_path, aes_backend, version):
+  pak_path = tmp_path.joinpath("game.pak")
+  writeFixturePak(pak_path, FILES, version=version, compress=True, aes_key=AES_KEY)
+  pak = PakFile(pak_path, Aes.parseKey(AES_HEX))
+  assert pak.info.encrypted_index
+  assert readAll(pak) == { f"/{name}": data for name, data in FILES.items() }
+
+def test_encrypted_index_needs_a_key(tmp_path):
+  pak_path = tmp_path.joinpath("game.pak")
+  writeFixturePak(pak_path, FILES, aes_key=AES_KEY)
+  with pytest.raises(PakError, match="AES"):
+    PakFile(pak_path)
+
+# ----- Game Wide Listing -----
+def test_patch_paks_override_by_suffix(tmp_path):
+  # the patch sorts before the base by name, the _P suffix must still put it on top
+  writeFixturePak(tmp_path.joinpath("b_game.pak"), { "RED/Content/a.uasset": b"base", "RED/Content/b.uasset": b"base" })
+  writeFixturePak(tmp_path.joinpath("a_patch_P.pak"), { "RED/Content/a.uasset": b"patched" })
+  files = listGameFiles(tmp_path, AES_HEX, "/RED/Content/*")
+  assert { path: pak.read(entry) for path, (pak, entry) in files.items() } == {
+    "/RED/Content/a.uasset": b"patched", "/RED/Content/b.uasset": b"base"
+  }
+
+def test_deleted_entries_hide_earlier_paks(tmp_path):
+  writeFixturePak(tmp_path.joinpath("game.pak"), { "RED/Content/a.uasset": b"base", "RED/Content/b.uasset": b"base" })
+  writeFixturePak(tmp_path.joinpath("game_P.pak"), {}, deleted=["RED/Content/a.uasset"])
+  assert sorted(listGameFiles(tmp_path, AES_HEX)) == ["/RED/Content/b.uasset"]
+
+def test_listing_pattern_is_case_insensitive(tmp_path):
+  writeFixturePak(tmp_path.joinpath("game.pak"), FILES)
+  files = listGameFiles(tmp_path, AES_HEX, "/red/content/chara/*/mesh/*.uasset")
+  assert sorted(files) == ["/RED/Content/Chara/RAM/Costume01/Mesh/ram_body.uasset"]
+
+# ----- Package Headers -----
+def test_package_exports(tmp_path):
+  exports = [("SkeletalMesh", "ram_body", 0x1234, 0x800), ("Skeleton", "ram_skeleton", 0x40, 0x2000), ("SkeletalMesh", "ram_body", 8, 0x2040)]
+  writeFixturePak(tmp_path.joinpath("game.pak"), { "RED/Content/ram_body.uasset": makePackage(exports) }, compress=True, aes_key=AES_KEY)
+  pak, entry = listGameFiles(tmp_path, AES_HEX)["/RED/Content/ram_body.uasset"]
+  assert readExports(pak.read(entry)) == [(idx, offset, size, class_name, name) for idx, (class_name, name, size, offset) in enumerate(exports)]
+
+def test_bad_package_header():
+  with pytest.raises(PackageError):
+    readExports(b"not a package")
+  with pytest.raises(PackageError):
+    readExports(makePackage([("SkeletalMesh", "ram_body", 1, 2)])[:-10])
@@ -0,0 +1,91 @@
+""" Round trips through PakWriter and PakReader on temporary trees """
+import os
+from pathlib import Path
+import pytest
+
+from src.PakReader import PakFile, PakError
+from src.PakWriter import writePak, checkPak, COMPRESSION_BLOCK_SIZE, MOUNT_POINT
+
+def makeTree(root:Path, files:dict) -> Path:
+  for name, data in files.items():
+    path = root.joinpath(name)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_bytes(data)
+  return root
+
+def roundTrip(tmp_path:Path, files:dict) -> PakFile:
+  root = makeTree(tmp_path.joinpath("mod"), files)
+  pak_path = tmp_path.joinpath("mod.pak")
+  writePak(root, pak_path)
+  checkPak(root, pak_path)
+  pak = PakFile(pak_path)
+  assert pak.mount_point == MOUNT_POINT
+  assert { entry.path: pak.read(entry) for entry in pak.entries } == { f"/{name}": data for name, data in files.items() }
+  return pak
+
+def entryFor(pak:PakFile, name:str):
+  return next(entry for entry in pak.entries if entry.path == f"/{name}")
+
+def test_small_file(tmp_path):
+  pak = roundTrip(tmp_path, { "RED/Content/Chara/mesh.uasset": b"uasset header " * 100 })
+  entry = entryFor(pak, "RED/Content/Chara/mesh.uasset")
+  assert entry.compression == "Zlib"
+  assert len(entry.blocks) == 1
+
+def test_multi_block_file(tmp_path):
+  data = b"".join(f"vertex {idx}\n".encode() for idx in range(3 * COMPRESSION_BLOCK_SIZE // 8))
+  pak = roundTrip(tmp_path, { "RED/Content/Chara/mesh.uexp": data })
+  entry = entryFor(pak, "RED/Content/Chara/mesh.uexp")
+  assert entry.compression == "Zlib"
+  assert len(entry.blocks) == (len(data) + COMPRESSION_BLOCK_SIZE - 1) // COMPRESSION_BLOCK_SIZE
+  assert entry.block_size == COMPRESSION_BLOCK_SIZE
+
+def test_incompressible_file_is_stored(tmp_path):
+  data = os.urandom(COMPRESSION_BLOCK_SIZE + 100)
+  pak = roundTrip(tmp_path, { "noise.bin": data })
+  entry = entryFor(pak, "noise.bin")
+  assert entry.compression is None
+  assert entry.size == entry.uncompressed_size == len(data)
+
+def test_empty_file(tmp_path):
+  pak = roundTrip(tmp_path, { "empty.txt": b"", "other.txt": b"not empty" * 50 })
+  entry = entryFor(pak, "empty.txt")
+  assert entry.compression is None
+  assert entry.size == 0
+
+def test_non_ascii_paths(tmp_path):
+  files = { "RED/Content/Chara/ラム/mesh_é.uasset": b"one" * 100, "RED/Content/emoji_😀.uexp": b"two" * 100, "RED/Content/plain.uexp": b"three" }
+  pak = roundTrip(tmp_path, files)
+  assert entryFor(pak, "RED/Content/Chara/ラム/mesh_é.uasset").uncompressed_size == 300
+
+def test_empty_tree(tmp_path):
+  tmp_path.joinpath("mod").mkdir()
+  writePak(tmp_path.joinpath("mod"), tmp_path.joinpath("mod.pak"))
+  assert PakFile(tmp_path.joinpath("mod.pak")).entries == []
+
+def test_output_is_deterministic(tmp_path):
+  files = { "a/one.uasset": b"one" * 1000, "b/two.uexp": bytes(range(256)) * 600, "c.txt": b"" }
+  root = makeTree(tmp_path.joinpath("mod"), files)
+  writePak(root, tmp_path.joinpath("first.pak"), max_workers=1)
+  writePak(root, tmp_path.joinpath("second.pak"), max_workers=4)
+  assert tmp_path.joinpath("first.pak").read_bytes() == tmp_path.joinpath("second.pak").read_bytes()
+
+def test_check_fails_on_corrupted_pak(tmp_path):
+  data = os.urandom(5000)
+  root = makeTree(tmp_path.joinpath("mod"), { "noise.bin": data })
+  pak_path = tmp_path.joinpath("mod.pak")
+  writePak(root, pak_path)
+  raw = bytearray(pak_path.read_bytes())
+  payload = raw.find(data[:64])
+  raw[payload + 100] ^= 0xFF
+  pak_path.write_bytes(bytes(raw))
+  with pytest.raises(PakError):
+    checkPak(root, pak_path)
+
+def test_check_fails_on_missing_file(tmp_path):
+  root = makeTree(tmp_path.joinpath("mod"), { "one.txt": b"one", "two.txt": b"two" })
+  pak_path = tmp_path.joinpath("mod.pak")
+  writePak(root, pak_path)
+  root.joinpath("three.txt").write_bytes(b"three")
+  with pytest.raises(PakError):
+    checkPak(root, pak_path)
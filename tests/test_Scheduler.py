@@ -0,0 +1,16 @@
+""" ToolScheduler admission with the slot taken """
+import sys, threading
+
+from src.Scheduler import ToolScheduler, TOOL_BLENDER
+
+def test_cancelled_queued_job_never_starts(tmp_path):
+  scheduler = ToolScheduler({ TOOL_BLENDER: 1 })
+  busy = scheduler.acquire(TOOL_BLENDER, "holding the slot")
+  marker = tmp_path.joinpath("started")
+  cancel = threading.Event()
+  queued = scheduler.submit(TOOL_BLENDER, [sys.executable, "-c", f"open({str(marker)!r}, 'w')"], cancel=cancel)
+  cancel.set()
+  assert not queued.result(10)
+  scheduler.release(busy)
+  assert scheduler.queueDepth() == 0
+  assert not marker.exists()